@@ -5,15 +5,25 @@ from soc.peripheral import Response as BusSlaveResponse, Peripheral
 
 
 class AxiLitePeripheralConnector(Elaboratable):
-    def __init__(self, peripheral: Peripheral, bundle_name="axi", timeout=1000):
+    def __init__(self, peripheral: Peripheral, bundle_name="axi", timeout=1000, check_range=True):
         """
-        A simple (low performance) axi lite `PeripheralConnector` for connecting `Peripheral`s to an AXI Lite Bus.
+        A pipelined axi lite `PeripheralConnector` for connecting `Peripheral`s to an AXI Lite Bus.
+
+        The read and the write path are independent pipelines: an address (and for writes the data) is accepted in the
+        same cycle it is presented, the peripheral logic runs in the next cycle and the response is presented from
+        registers in the cycle after that. A new address is accepted in the same cycle the previous response is taken,
+        so a peripheral that answers in one cycle (like a `CsrBank`) sustains one read and one write every two cycles.
+        The read and the write logic of the peripheral are never active in the same cycle.
+
         :param peripheral: The peripheral which this controller should handle
         :param timeout: the timeout after which an unsuccessful read attempt should fail (useful for not hanging everything)
+        :param check_range: only accept addresses in the range of the peripheral. Can be disabled if the interconnect
+                            already decoded the address.
         """
         assert callable(peripheral.handle_read) and callable(peripheral.handle_write)
         self.peripheral = peripheral
         self.timeout = timeout
+        self.check_range = check_range
 
         self.axi = AxiEndpoint(master=False, addr_bits=32, data_bits=32, lite=True, name=bundle_name)
 
@@ -25,73 +35,90 @@ class AxiLitePeripheralConnector(Elaboratable):
         assert address_range is not None
         assert address_range.start < address_range.stop
 
-        addr = Signal.like(self.axi.read_address.value)
-        read_out = Signal.like(self.axi.read_data.value)
-        resp_out = Signal.like(self.axi.read_data.resp)
-
-        read_write_done = Signal()
-        timeout_counter = Signal(range(self.timeout + 1))
-
-        def read_write_done_callback(error):
-            m.d.sync += read_write_done.eq(1)
-            if error == BusSlaveResponse.ERR:
-                m.d.sync += resp_out.eq(AxiResponse.SLVERR)
-            else:
-                m.d.sync += resp_out.eq(AxiResponse.OKAY)
-
-        with m.FSM():
-            with m.State("IDLE"):
-                def in_range(signal):
-                    return (signal >= address_range.start) & (signal < address_range.stop)
-
-                with m.If(self.axi.read_address.valid & in_range(self.axi.read_address.value)):
-                    m.next = "FETCH_READ_ADDRESS"
-                with m.Elif(self.axi.write_address.valid & in_range(self.axi.write_address.value)):
-                    m.next = "FETCH_WRITE_ADDRESS"
-
-            with m.State("FETCH_READ_ADDRESS"):
-                m.d.sync += addr.eq(self.axi.read_address.value - address_range.start)
-                m.d.comb += self.axi.read_address.ready.eq(1)
-                m.next = "READ"
-                m.d.sync += timeout_counter.eq(0)
-            with m.State("READ"):
-                # Only write read and resp if we are in the READ state. Otherwise all bits are '0'.
-                # This allows us to simply or the data output of multiple axi slaves together.
-                m.d.sync += timeout_counter.eq(timeout_counter + 1)
-                self.peripheral.handle_read(m, addr, read_out, read_write_done_callback)
-                with m.If(read_write_done):
-                    m.d.sync += read_write_done.eq(0)
-                    m.next = "READ_DONE"
-                with m.If(timeout_counter == self.timeout):
-                    m.d.sync += read_write_done.eq(1)
-                    m.d.sync += resp_out.eq(AxiResponse.DECERR)
-            with m.State("READ_DONE"):
-                m.d.comb += self.axi.read_data.value.eq(read_out)
-                m.d.comb += self.axi.read_data.resp.eq(resp_out)
-                m.d.comb += self.axi.read_data.valid.eq(1)
-                with m.If(self.axi.read_data.ready):
-                    m.next = "IDLE"
-
-            with m.State("FETCH_WRITE_ADDRESS"):
-                m.d.sync += addr.eq(self.axi.write_address.value - address_range.start)
-                m.d.comb += self.axi.write_address.ready.eq(1)
-                m.next = "WRITE"
-                m.d.sync += timeout_counter.eq(0)
-            with m.State("WRITE"):
-                with m.If(self.axi.write_data.valid):
-                    self.peripheral.handle_write(m, addr, self.axi.write_data.value, read_write_done_callback)
-                    m.d.sync += timeout_counter.eq(timeout_counter + 1)
-                    with m.If(read_write_done):
-                        m.d.sync += read_write_done.eq(0)
-                        m.next = "WRITE_DONE"
-                    with m.If(timeout_counter == self.timeout):
-                        m.d.sync += read_write_done.eq(1)
-                        m.d.sync += resp_out.eq(AxiResponse.DECERR)
-            with m.State("WRITE_DONE"):
-                m.d.comb += self.axi.write_response.resp.eq(resp_out)
-                m.d.comb += self.axi.write_response.valid.eq(1)
-                m.d.comb += self.axi.write_data.ready.eq(1)
-                with m.If(self.axi.write_response.ready):
-                    m.next = "IDLE"
+        axi = self.axi
+
+        def in_range(signal):
+            if not self.check_range:
+                return Const(1)
+            return (signal >= address_range.start) & (signal < address_range.stop)
+
+        # read path
+        read_addr = Signal.like(axi.read_address.value)
+        read_busy = Signal()
+        read_data = Signal.like(axi.read_data.value)
+        read_resp = Signal.like(axi.read_data.resp)
+        read_valid = Signal()
+        read_timeout = Signal(range(self.timeout + 1))
+
+        # write path
+        write_addr = Signal.like(axi.write_address.value)
+        write_addr_pending = Signal()
+        write_data = Signal.like(axi.write_data.value)
+        write_busy = Signal()
+        write_resp = Signal.like(axi.write_response.resp)
+        write_valid = Signal()
+        write_timeout = Signal(range(self.timeout + 1))
+
+        # the responses come straight from registers. They are zero while they are not valid, so that the responses
+        # of multiple slaves can simply be or-ed together.
+        m.d.comb += [
+            axi.read_data.valid.eq(read_valid),
+            axi.read_data.value.eq(read_data),
+            axi.read_data.resp.eq(read_resp),
+            axi.write_response.valid.eq(write_valid),
+            axi.write_response.resp.eq(write_resp),
+        ]
+        with m.If(read_valid & axi.read_data.ready):
+            m.d.sync += [read_valid.eq(0), read_data.eq(0), read_resp.eq(0)]
+        with m.If(write_valid & axi.write_response.ready):
+            m.d.sync += [write_valid.eq(0), write_resp.eq(0)]
+
+        # a new transaction can start when the response register is free at the end of this cycle
+        read_slot_free = ~read_busy & (~read_valid | axi.read_data.ready)
+        write_slot_free = ~write_busy & (~write_valid | axi.write_response.ready)
+
+        read_start = Signal()
+        m.d.comb += axi.read_address.ready.eq(read_slot_free & ~write_busy & in_range(axi.read_address.value))
+        m.d.comb += read_start.eq(axi.read_address.valid & axi.read_address.ready)
+        with m.If(read_start):
+            m.d.sync += read_addr.eq(axi.read_address.value - address_range.start)
+            m.d.sync += read_busy.eq(1)
+            m.d.sync += read_timeout.eq(0)
+
+        # the write address can be accepted before the data or in the same cycle
+        m.d.comb += axi.write_address.ready.eq(
+            ~write_addr_pending & write_slot_free & in_range(axi.write_address.value)
+        )
+        with m.If(axi.write_address.valid & axi.write_address.ready):
+            m.d.sync += write_addr.eq(axi.write_address.value - address_range.start)
+            m.d.sync += write_addr_pending.eq(1)
+        write_addr_available = write_addr_pending | (axi.write_address.valid & axi.write_address.ready)
+        m.d.comb += axi.write_data.ready.eq(write_addr_available & write_slot_free & ~read_busy & ~read_start)
+        with m.If(axi.write_data.valid & axi.write_data.ready):
+            m.d.sync += write_data.eq(axi.write_data.value)
+            m.d.sync += write_addr_pending.eq(0)
+            m.d.sync += write_busy.eq(1)
+            m.d.sync += write_timeout.eq(0)
+
+        def response(error):
+            return AxiResponse.SLVERR if error == BusSlaveResponse.ERR else AxiResponse.OKAY
+
+        def read_done_callback(error):
+            m.d.sync += [read_busy.eq(0), read_valid.eq(1), read_resp.eq(response(error))]
+
+        def write_done_callback(error):
+            m.d.sync += [write_busy.eq(0), write_valid.eq(1), write_resp.eq(response(error))]
+
+        with m.If(read_busy):
+            m.d.sync += read_timeout.eq(read_timeout + 1)
+            with m.If(read_timeout == self.timeout):
+                m.d.sync += [read_busy.eq(0), read_valid.eq(1), read_resp.eq(AxiResponse.DECERR)]
+            self.peripheral.handle_read(m, read_addr, read_data, read_done_callback)
+
+        with m.If(write_busy):
+            m.d.sync += write_timeout.eq(write_timeout + 1)
+            with m.If(write_timeout == self.timeout):
+                m.d.sync += [write_busy.eq(0), write_valid.eq(1), write_resp.eq(AxiResponse.DECERR)]
+            self.peripheral.handle_write(m, write_addr, write_data, write_done_callback)
 
         return m
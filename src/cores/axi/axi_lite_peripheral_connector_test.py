@@ -0,0 +1,85 @@
+import unittest
+
+from nmigen import *
+
+from cores.axi.axi_endpoint import Response as AxiResponse
+from cores.axi.axi_lite_peripheral_connector import AxiLitePeripheralConnector
+from cores.axi.sim_util import axil_read, axil_write, write_to_axi_channel, read_from_axi_channel, RegisterPeripheral
+from util.sim import SimPlatform
+
+
+class ConnectorDut(Elaboratable):
+    def __init__(self, registers: RegisterPeripheral):
+        self.registers = registers
+        self.connector = AxiLitePeripheralConnector(registers.peripheral)
+        self.axi = self.connector.axi
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.registers = self.registers.peripheral
+        m.submodules.connector = self.connector
+        return m
+
+
+class TestAxiLitePeripheralConnector(unittest.TestCase):
+    def make_dut(self, **kwargs):
+        dut = ConnectorDut(RegisterPeripheral(4, **kwargs))
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        return platform, dut
+
+    def test_read_write(self):
+        for latency in [1, 3]:
+            platform, dut = self.make_dut(latency=latency)
+
+            def testbench():
+                for i in range(4):
+                    yield from axil_write(dut.axi, 0x4000_0000 + i * 4, 0x1000 + i)
+                for i in range(4):
+                    self.assertEqual(0x1000 + i, (yield from axil_read(dut.axi, 0x4000_0000 + i * 4)))
+
+                yield from write_to_axi_channel(dut.axi.read_address, 0x4000_0010)
+                _, response = yield from read_from_axi_channel(dut.axi.read_data)
+                self.assertEqual(AxiResponse.SLVERR.value, response)
+
+            platform.sim(dut, testbench)
+
+    def test_write_address_and_data_in_one_cycle(self):
+        platform, dut = self.make_dut()
+
+        def testbench():
+            axi = dut.axi
+            yield axi.write_address.value.eq(0x4000_0004)
+            yield axi.write_data.value.eq(42)
+            yield axi.write_address.valid.eq(1)
+            yield axi.write_data.valid.eq(1)
+            yield
+            self.assertTrue((yield axi.write_address.ready))
+            self.assertTrue((yield axi.write_data.ready))
+            yield axi.write_address.valid.eq(0)
+            yield axi.write_data.valid.eq(0)
+            _, response = yield from read_from_axi_channel(axi.write_response)
+            self.assertEqual(AxiResponse.OKAY.value, response)
+            self.assertEqual(42, (yield from axil_read(axi, 0x4000_0004)))
+
+        platform.sim(dut, testbench)
+
+    def test_read_throughput(self, n_reads=20):
+        platform, dut = self.make_dut()
+
+        def testbench():
+            axi = dut.axi
+            yield axi.read_address.value.eq(0x4000_0000)
+            yield axi.read_address.valid.eq(1)
+            yield axi.read_data.ready.eq(1)
+            responses = 0
+            cycles = 0
+            while responses < n_reads:
+                yield
+                cycles += 1
+                if (yield axi.read_data.valid):
+                    responses += 1
+            # one read every two cycles plus the latency of the first one
+            self.assertLessEqual(cycles, 2 * n_reads + 1)
+
+        platform.sim(dut, testbench)
@@ -1,27 +1,59 @@
-# TODO: figure out api
-# TODO: implement
-
 from nmigen import *
 
 from cores.csr_bank import StatusSignal
+from cores.stream.fifo import SyncStreamFifo
 from . import AxiEndpoint
-from .axi_endpoint import Response
+from .axi_endpoint import Response, BurstType
+from util.nmigen_misc import nMax, mul_by_pot, log2
 from util.stream import StreamEndpoint
 
 
+def descriptor(base_address, length, addr_bits=32):
+    """Build the payload of a descriptor for the `AxiBufferReader` (the length is in words of the axi data width)"""
+    if isinstance(base_address, int):
+        base_address = Const(base_address, addr_bits)
+    assert len(base_address) == addr_bits
+    return Cat(base_address, length)
+
+
 class AxiBufferReader(Elaboratable):
     def __init__(
             self,
-            address_source: StreamEndpoint,
-            axi_slave=None, axi_data_width=64
+            descriptor_source: StreamEndpoint,
+            axi_slave=None, axi_data_width=64, addr_bits=32,
+            max_burst_length=16, max_outstanding_bursts=4, bandwidth_window=2 ** 20
     ):
-        assert address_source.has_last is False
-        self.address_source = address_source
+        """
+        A DMA reader that reads the memory regions described by a stream of descriptors into a stream of words.
+
+        Every descriptor (see `descriptor()`) consists of a base address (in the lower `addr_bits` bits) and a length
+        in words (in the remaining bits). The regions are read with INCR bursts of up to `max_burst_length` beats that
+        never cross a 4 KiB boundary. The data fifo has room for `max_outstanding_bursts` full bursts and a burst is
+        only issued if the room for all its data is reserved (credit based flow control), so the read data channel is
+        always ready and several bursts can be in flight to hide the latency of the memory.
+
+        :param max_burst_length: the maximum number of beats per burst (at most 16 for AXI3 ports like the HP ports)
+        :param bandwidth_window: the number of cycles over which `window_words` is counted
+        """
+        assert descriptor_source.is_sink is False
+        assert descriptor_source.has_last is False
+        assert len(descriptor_source.payload) > addr_bits, "the descriptors need room for the length"
+        assert 1 <= max_burst_length <= 16
+        self.descriptor_source = descriptor_source
         self.axi_slave = axi_slave
+        self.addr_bits = addr_bits
+        self.max_burst_length = max_burst_length
+        self.max_outstanding_bursts = max_outstanding_bursts
+        self.bandwidth_window = bandwidth_window
         self.output = StreamEndpoint(axi_data_width, is_sink=False, has_last=False)
 
         self.last_resp = StatusSignal(Response)
         self.error_count = StatusSignal(32)
+        self.bursts_issued = StatusSignal(32)
+        self.words_read = StatusSignal(32)
+        # the words that were read in the last complete `bandwidth_window`; the bandwidth in bytes per second is
+        # window_words * (axi_data_width / 8) * f_clk / bandwidth_window
+        self.window_words = StatusSignal(32)
 
     def elaborate(self, platform):
         m = Module()
@@ -38,24 +70,71 @@ class AxiBufferReader(Elaboratable):
         m.d.comb += axi.connect_slave(axi_slave)
 
         assert len(self.output.payload) == axi.data_bits
+        assert axi.addr_bits == self.addr_bits
+
+        descriptors = StreamEndpoint.like(self.descriptor_source, is_sink=True, name="descriptor_sink")
+        m.d.comb += descriptors.connect(self.descriptor_source)
 
-        address_stream = StreamEndpoint.like(self.address_source, is_sink=True, name="address_sink")
-        m.d.comb += address_stream.connect(self.address_source)
-        assert len(address_stream.payload) == axi.addr_bits
+        # the data fifo and its credits: every word of room in the fifo is reserved before the burst is issued
+        fifo_depth = self.max_burst_length * self.max_outstanding_bursts
+        read_data = StreamEndpoint(axi.data_bits, is_sink=False, has_last=False, name="read_data")
+        data_fifo = m.submodules.data_fifo = SyncStreamFifo(read_data, depth=fifo_depth)
+        m.d.comb += self.output.connect(data_fifo.output, allow_back_to_back=True)
+        credits = Signal(range(fifo_depth + 1), reset=fifo_depth)
 
-        # we dont generate bursts for now
-        m.d.comb += axi.read_address.valid.eq(address_stream.valid)
-        m.d.comb += axi.read_address.value.eq(address_stream.payload)
-        m.d.comb += address_stream.ready.eq(axi.read_address.ready)
-        m.d.comb += axi.read_address.burst_len.eq(0)
+        # the burst generator
+        address = Signal(self.addr_bits)
+        remaining = Signal(len(descriptors.payload) - self.addr_bits)
+        active = Signal()
 
-        m.d.comb += axi.read_data.ready.eq(self.output.ready)
-        m.d.comb += axi.read_data.last.eq(1)
-        m.d.comb += self.output.valid.eq(axi.read_data.valid)
-        m.d.comb += self.output.payload.eq(axi.read_data.value)
+        beats_to_boundary = Signal(range(4096 // axi.data_bytes + 1))
+        m.d.comb += beats_to_boundary.eq((4096 - address[:12]) >> log2(axi.data_bytes))
+        burst_length = Signal(range(self.max_burst_length + 1))
+        m.d.comb += burst_length.eq(nMax(nMax(remaining, self.max_burst_length), beats_to_boundary))
 
-        m.d.sync += self.last_resp.eq(axi.read_data.resp)
-        with m.If(axi.read_data.valid & (axi.read_data.resp != Response.OKAY)):
-            m.d.sync += self.error_count.eq(self.error_count + 1)
+        m.d.comb += [
+            axi.read_address.value.eq(address),
+            axi.read_address.burst_len.eq(burst_length - 1),
+            axi.read_address.burst_type.eq(BurstType.INCR),
+            axi.read_address.valid.eq(active & (credits >= burst_length)),
+        ]
+        burst_issued = axi.read_address.valid & axi.read_address.ready
+        with m.If(burst_issued):
+            m.d.sync += address.eq(address + mul_by_pot(burst_length, axi.data_bytes))
+            m.d.sync += remaining.eq(remaining - burst_length)
+            m.d.sync += self.bursts_issued.eq(self.bursts_issued + 1)
+            with m.If(remaining == burst_length):
+                m.d.sync += active.eq(0)
+
+        # the next descriptor is taken while the last burst of the current one is issued
+        m.d.comb += descriptors.ready.eq(~active | (burst_issued & (remaining == burst_length)))
+        with m.If(descriptors.valid & descriptors.ready):
+            m.d.sync += address.eq(descriptors.payload[:self.addr_bits])
+            m.d.sync += remaining.eq(descriptors.payload[self.addr_bits:])
+            m.d.sync += active.eq(descriptors.payload[self.addr_bits:] != 0)
+
+        word_taken = data_fifo.output.valid & data_fifo.output.ready
+        m.d.sync += credits.eq(credits + word_taken - Mux(burst_issued, burst_length, 0))
+
+        # the read data: there is always room for it in the fifo
+        m.d.comb += axi.read_data.ready.eq(1)
+        m.d.comb += read_data.valid.eq(axi.read_data.valid)
+        m.d.comb += read_data.payload.eq(axi.read_data.value)
+
+        with m.If(axi.read_data.valid):
+            m.d.sync += self.last_resp.eq(axi.read_data.resp)
+            m.d.sync += self.words_read.eq(self.words_read + 1)
+            with m.If(axi.read_data.resp != Response.OKAY):
+                m.d.sync += self.error_count.eq(self.error_count + 1)
+
+        window_counter = Signal(range(self.bandwidth_window))
+        window_words = Signal(32)
+        m.d.sync += window_counter.eq(window_counter + 1)
+        m.d.sync += window_words.eq(window_words + axi.read_data.valid)
+        with m.If(window_counter == self.bandwidth_window - 1):
+            m.d.sync += window_counter.eq(0)
+            m.d.sync += self.window_words.eq(window_words + axi.read_data.valid)
+            m.d.sync += window_words.eq(0)
 
         return m
+
@@ -0,0 +1,111 @@
+import unittest
+
+from nmigen.sim import Passive
+
+from cores.axi.axi_endpoint import AxiEndpoint, Response, BurstType
+from cores.axi.buffer_reader import AxiBufferReader, descriptor
+from util.sim import SimPlatform
+from util.stream import StreamEndpoint
+
+
+def pipelined_memory(axi: AxiEndpoint, latency, bursts):
+    """Sim processes for a read only memory (the data is the address) that answers the bursts after `latency` cycles"""
+    pending = []
+
+    def addresses():
+        yield Passive()
+        yield axi.read_address.ready.eq(1)
+        cycle = 0
+        while True:
+            yield
+            cycle += 1
+            if (yield axi.read_address.valid):
+                burst = ((yield axi.read_address.value), (yield axi.read_address.burst_len) + 1)
+                assert (yield axi.read_address.burst_type) == BurstType.INCR.value
+                bursts.append(burst)
+                pending.append((cycle + latency, burst))
+
+    def data():
+        yield Passive()
+        cycle = 0
+        while True:
+            if pending and pending[0][0] <= cycle:
+                _, (address, length) = pending.pop(0)
+                for beat in range(length):
+                    yield axi.read_data.value.eq(address + beat * axi.data_bytes)
+                    yield axi.read_data.last.eq(beat == length - 1)
+                    yield axi.read_data.resp.eq(Response.OKAY)
+                    yield axi.read_data.valid.eq(1)
+                    yield
+                    cycle += 1
+                    assert (yield axi.read_data.ready)
+            else:
+                yield axi.read_data.valid.eq(0)
+                yield
+                cycle += 1
+
+    return addresses, data
+
+
+class TestAxiBufferReader(unittest.TestCase):
+    def run_reader(self, regions, latency=30, output_ready=lambda cycle: True):
+        axi = AxiEndpoint(addr_bits=32, data_bits=64, master=False, lite=False, id_bits=12)
+        descriptor_source = StreamEndpoint(32 + 16, is_sink=False, has_last=False)
+        dut = AxiBufferReader(descriptor_source, axi, bandwidth_window=64)
+
+        bursts = []
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        for process in pipelined_memory(axi, latency, bursts):
+            platform.add_process(process, "sync")
+
+        def descriptors():
+            for base, length in regions:
+                yield descriptor_source.payload.eq(descriptor(base, length))
+                yield descriptor_source.valid.eq(1)
+                yield
+                while not (yield descriptor_source.ready):
+                    yield
+            yield descriptor_source.valid.eq(0)
+        platform.add_process(descriptors, "sync")
+
+        result = {"words": [], "cycles": 0}
+        n_words = sum(length for _, length in regions)
+
+        def testbench():
+            while len(result["words"]) < n_words:
+                ready = output_ready(result["cycles"])
+                yield dut.output.ready.eq(ready)
+                yield
+                result["cycles"] += 1
+                if ready and (yield dut.output.valid):
+                    result["words"].append((yield dut.output.payload))
+            yield dut.output.ready.eq(0)
+            for _ in range(latency + 20):
+                yield
+            self.assertEqual(0, (yield dut.error_count))
+            self.assertEqual(n_words, (yield dut.words_read))
+            self.assertEqual(len(bursts), (yield dut.bursts_issued))
+
+        platform.sim(dut, testbench)
+        expected = [base + i * 8 for base, length in regions for i in range(length)]
+        self.assertEqual(expected, result["words"])
+        return bursts, result["cycles"]
+
+    def test_bursts_respect_4k_boundaries(self):
+        regions = [(0x1000_0F80, 40), (0x2000_0000, 3), (0x3000_0FF8, 1), (0x3000_1000, 17)]
+        bursts, _ = self.run_reader(regions)
+        for address, length in bursts:
+            self.assertLessEqual(length, 16)
+            self.assertEqual(address // 4096, (address + length * 8 - 1) // 4096, hex(address))
+        # 0x1000_0F80 has 16 words until the boundary
+        self.assertEqual([(0x1000_0F80, 16), (0x1000_1000, 16), (0x1000_1080, 8)], bursts[:3])
+
+    def test_latency_is_hidden(self, latency=30, n_words=512):
+        _, cycles = self.run_reader([(0x1000_0000, n_words)], latency=latency)
+        # with several bursts in flight the memory latency is only paid once
+        self.assertLessEqual(cycles, n_words + 2 * latency)
+
+    def test_backpressure(self):
+        # the consumer takes one word every 4 cycles (like the hdmi reader); nothing may get lost
+        self.run_reader([(0x1000_0000, 100), (0x1000_2000, 50)], output_ready=lambda cycle: cycle % 4 == 3)
@@ -0,0 +1,306 @@
+from functools import reduce
+
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.utils import bits_for
+
+from cores.csr_bank import StatusSignal
+from util.nmigen_misc import iterator_with_if_elif
+from .axi_endpoint import AxiEndpoint, Response
+
+
+def _any(signals):
+    return reduce(lambda a, b: a | b, signals, Const(0))
+
+
+def _round_robin(m, requests, handshake):
+    """
+    Grant one of the `requests` in round robin order. A grant is held until `handshake` is asserted (AXI requires the
+    payload to stay stable while valid is asserted).
+    :return: the index of the granted request and whether it is valid
+    """
+    n = len(requests)
+    index = Signal(range(n))
+    valid = Signal()
+    last = Signal(range(n), reset=n - 1)
+    locked = Signal()
+    locked_index = Signal(range(n))
+
+    with m.If(locked):
+        m.d.comb += index.eq(locked_index)
+    with m.Else():
+        with m.Switch(last):
+            for l in range(n):
+                with m.Case(l):
+                    for conditional, i in iterator_with_if_elif([(l + 1 + k) % n for k in range(n)], m):
+                        with conditional(requests[i]):
+                            m.d.comb += index.eq(i)
+    m.d.comb += valid.eq(Cat(*requests).bit_select(index, 1))
+
+    with m.If(valid & ~handshake):
+        m.d.sync += locked.eq(1)
+        m.d.sync += locked_index.eq(index)
+    with m.If(handshake):
+        m.d.sync += locked.eq(0)
+        m.d.sync += last.eq(index)
+
+    return index, valid
+
+
+class _DecodeErrorSlave(Elaboratable):
+    def __init__(self, model):
+        """An AXI slave that answers every transaction with DECERR (with the right amount of read beats)."""
+        self.axi = AxiEndpoint.like(model, master=False, name="decode_error_slave")
+
+    def elaborate(self, platform):
+        m = Module()
+        axi = self.axi
+
+        read_busy = Signal()
+        read_remaining = Signal.like(axi.read_address.burst_len)
+        read_id = Signal.like(axi.read_address.id)
+        m.d.comb += axi.read_address.ready.eq(~read_busy)
+        with m.If(axi.read_address.valid & ~read_busy):
+            m.d.sync += read_busy.eq(1)
+            m.d.sync += read_remaining.eq(axi.read_address.burst_len)
+            m.d.sync += read_id.eq(axi.read_address.id)
+        m.d.comb += [
+            axi.read_data.valid.eq(read_busy),
+            axi.read_data.resp.eq(Response.DECERR),
+            axi.read_data.id.eq(read_id),
+            axi.read_data.last.eq(read_remaining == 0),
+        ]
+        with m.If(read_busy & axi.read_data.ready):
+            m.d.sync += read_remaining.eq(read_remaining - 1)
+            with m.If(read_remaining == 0):
+                m.d.sync += read_busy.eq(0)
+
+        write_busy = Signal()
+        write_respond = Signal()
+        write_id = Signal.like(axi.write_address.id)
+        m.d.comb += axi.write_address.ready.eq(~write_busy)
+        with m.If(axi.write_address.valid & ~write_busy):
+            m.d.sync += [write_busy.eq(1), write_id.eq(axi.write_address.id)]
+        m.d.comb += axi.write_data.ready.eq(write_busy & ~write_respond)
+        with m.If(axi.write_data.valid & axi.write_data.ready & axi.write_data.last):
+            m.d.sync += write_respond.eq(1)
+        m.d.comb += [
+            axi.write_response.valid.eq(write_respond),
+            axi.write_response.resp.eq(Response.DECERR),
+            axi.write_response.id.eq(write_id),
+        ]
+        with m.If(write_respond & axi.write_response.ready):
+            m.d.sync += [write_busy.eq(0), write_respond.eq(0)]
+
+        return m
+
+
+class AxiCrossbar(Elaboratable):
+    def __init__(self, addr_bits=32, data_bits=64, master_id_bits=4, max_outstanding=8):
+        """
+        A N masters x M slaves AXI (full) crossbar. It can for example share a single HP port between multiple DMA
+        engines.
+
+        Every slave has a round robin arbiter for its read and its write address channel. Bursts are routed as a whole:
+        the write data follows the write addresses in the order they were granted at every slave. The ids of the
+        masters are extended by the index of the master (in the upper bits), so that the responses can be routed back.
+        Transactions to unmapped addresses are answered with DECERR.
+
+        To keep the responses of a master in order, a master can only have outstanding transactions (per direction) to a
+        single slave at a time; a transaction to another slave is stalled until the outstanding ones are answered.
+
+        :param master_id_bits: the width of the id signals of the master ports. The slaves need at least
+                               `master_id_bits + bits_for(n_masters - 1)` id bits.
+        :param max_outstanding: the maximum number of outstanding transactions per master and direction
+        """
+        self.addr_bits = addr_bits
+        self.data_bits = data_bits
+        self.master_id_bits = master_id_bits
+        self.max_outstanding = max_outstanding
+
+        self._master_ports = []
+        self._slaves = []
+        self._address_ranges = []
+
+        self.read_beats = []
+        self.write_beats = []
+
+    def get_port(self):
+        """
+        Gets a new AXI slave port to which a master (e.g. an `AxiBufferWriter`) can be connected.
+        The number of read and written beats of the port are counted in `read_beats[i]` and `write_beats[i]`.
+        """
+        i = len(self._master_ports)
+        port = AxiEndpoint(
+            addr_bits=self.addr_bits, data_bits=self.data_bits, lite=False, id_bits=self.master_id_bits, master=False,
+            name="crossbar_master{}".format(i)
+        )
+        self._master_ports.append(port)
+        self.read_beats.append(StatusSignal(32, name="master{}_read_beats".format(i)))
+        self.write_beats.append(StatusSignal(32, name="master{}_write_beats".format(i)))
+        return port
+
+    def add_slave(self, axi_slave: AxiEndpoint, address_range=None):
+        """
+        Connects a slave (e.g. a HP port) to the crossbar.
+        :param address_range: the (absolute) addresses that are routed to the slave. Defaults to all addresses.
+        """
+        assert not axi_slave.is_master and not axi_slave.is_lite
+        assert axi_slave.addr_bits == self.addr_bits and axi_slave.data_bits == self.data_bits
+        if address_range is None:
+            address_range = range(0, 2 ** self.addr_bits)
+        for other in self._address_ranges:
+            assert address_range.stop <= other.start or other.stop <= address_range.start, \
+                "the address range {!r} overlaps with {!r}".format(address_range, other)
+        self._slaves.append(axi_slave)
+        self._address_ranges.append(address_range)
+
+    def _decode(self, m, address):
+        """:return: the index of the slave that is responsible for `address` (`len(self._slaves)` if there is none)"""
+        index = Signal(range(len(self._slaves) + 1), reset=len(self._slaves))
+        for conditional, (i, address_range) in iterator_with_if_elif(enumerate(self._address_ranges), m):
+            with conditional((address >= address_range.start) & (address < address_range.stop)):
+                m.d.comb += index.eq(i)
+        return index
+
+    def elaborate(self, platform):
+        m = Module()
+
+        masters = self._master_ports
+        assert masters and self._slaves
+        index_bits = bits_for(len(masters) - 1)
+        downstream_id_bits = self.master_id_bits + index_bits
+        for slave in self._slaves:
+            assert slave.id_bits >= downstream_id_bits, "the slaves need at least {} id bits".format(downstream_id_bits)
+
+        error_slave = m.submodules.decode_error_slave = _DecodeErrorSlave(AxiEndpoint(
+            addr_bits=self.addr_bits, data_bits=self.data_bits, lite=False, id_bits=downstream_id_bits, master=False
+        ))
+        slaves = []
+        for i, slave in enumerate([*self._slaves, error_slave.axi]):
+            downstream = AxiEndpoint.like(slave, master=True, name="crossbar_slave{}".format(i))
+            m.d.comb += downstream.connect_slave(slave)
+            slaves.append(downstream)
+
+        def master_index(id_signal):
+            return id_signal[self.master_id_bits:self.master_id_bits + index_bits]
+
+        # the bookkeeping of every master: the slave its outstanding transactions went to and how many there are
+        read_target, write_target = [], []
+        read_requests = [[] for _ in slaves]
+        write_requests = [[] for _ in slaves]
+        for i, master in enumerate(masters):
+            read_count = Signal(range(self.max_outstanding + 1), name="master{}_read_count".format(i))
+            write_count = Signal(range(self.max_outstanding + 1), name="master{}_write_count".format(i))
+            read_target.append(Signal(range(len(slaves)), name="master{}_read_target".format(i)))
+            write_target.append(Signal(range(len(slaves)), name="master{}_write_target".format(i)))
+
+            read_decoded = self._decode(m, master.read_address.value)
+            read_stall = ((read_count != 0) & (read_target[i] != read_decoded)) | (read_count == self.max_outstanding)
+            write_decoded = self._decode(m, master.write_address.value)
+            write_stall = ((write_count != 0) & (write_target[i] != write_decoded)) \
+                | (write_count == self.max_outstanding)
+            for s in range(len(slaves)):
+                read_requests[s].append(master.read_address.valid & (read_decoded == s) & ~read_stall)
+                write_requests[s].append(master.write_address.valid & (write_decoded == s) & ~write_stall)
+
+            read_issued = master.read_address.valid & master.read_address.ready
+            read_done = master.read_data.valid & master.read_data.ready & master.read_data.last
+            m.d.sync += read_count.eq(read_count + read_issued - read_done)
+            with m.If(read_issued):
+                m.d.sync += read_target[i].eq(read_decoded)
+
+            write_issued = master.write_address.valid & master.write_address.ready
+            write_done = master.write_response.valid & master.write_response.ready
+            m.d.sync += write_count.eq(write_count + write_issued - write_done)
+            with m.If(write_issued):
+                m.d.sync += write_target[i].eq(write_decoded)
+
+            with m.If(master.read_data.valid & master.read_data.ready):
+                m.d.sync += self.read_beats[i].eq(self.read_beats[i] + 1)
+            with m.If(master.write_data.valid & master.write_data.ready):
+                m.d.sync += self.write_beats[i].eq(self.write_beats[i] + 1)
+
+        # the address channels: arbitrate between the masters at every slave
+        read_grants, write_grants = [], []
+        for s, slave in enumerate(slaves):
+            for channel, requests, grants in [
+                ("read_address", read_requests[s], read_grants),
+                ("write_address", write_requests[s], write_grants),
+            ]:
+                downstream = getattr(slave, channel)
+                handshake = Signal(name="slave{}_{}_handshake".format(s, channel))
+                index, valid = _round_robin(m, requests, handshake)
+                upstream = [getattr(master, channel) for master in masters]
+                m.d.comb += handshake.eq(valid & downstream.ready)
+                m.d.comb += [
+                    downstream.valid.eq(valid),
+                    downstream.value.eq(Array(c.value for c in upstream)[index]),
+                    downstream.id.eq(Cat(Array(c.id for c in upstream)[index], index)),
+                    downstream.burst_type.eq(Array(c.burst_type for c in upstream)[index]),
+                    downstream.burst_len.eq(Array(c.burst_len for c in upstream)[index]),
+                    downstream.beat_size_bytes.eq(Array(c.beat_size_bytes for c in upstream)[index]),
+                    downstream.protection_type.eq(Array(c.protection_type for c in upstream)[index]),
+                ]
+                grants.append((index, handshake))
+
+        for i, master in enumerate(masters):
+            m.d.comb += master.read_address.ready.eq(_any(handshake & (index == i) for index, handshake in read_grants))
+            m.d.comb += master.write_address.ready.eq(
+                _any(handshake & (index == i) for index, handshake in write_grants)
+            )
+
+        # the write data: every slave takes the bursts in the order in which it granted the write addresses
+        write_data_ready = [[] for _ in masters]
+        for s, ((index, handshake), slave) in enumerate(zip(write_grants, slaves)):
+            order = m.submodules["slave{}_write_order".format(s)] = SyncFIFO(
+                width=index_bits, depth=len(masters) * self.max_outstanding
+            )
+            m.d.comb += order.w_data.eq(index)
+            m.d.comb += order.w_en.eq(handshake)
+
+            head = order.r_data
+            upstream = [master.write_data for master in masters]
+            m.d.comb += [
+                slave.write_data.valid.eq(order.r_rdy & Array(c.valid for c in upstream)[head]),
+                slave.write_data.value.eq(Array(c.value for c in upstream)[head]),
+                slave.write_data.byte_strobe.eq(Array(c.byte_strobe for c in upstream)[head]),
+                slave.write_data.last.eq(Array(c.last for c in upstream)[head]),
+                slave.write_data.id.eq(Cat(Array(c.id for c in upstream)[head], head)),
+            ]
+            m.d.comb += order.r_en.eq(slave.write_data.valid & slave.write_data.ready & slave.write_data.last)
+            for i in range(len(masters)):
+                write_data_ready[i].append(order.r_rdy & (head == i) & slave.write_data.ready)
+        for i, master in enumerate(masters):
+            m.d.comb += master.write_data.ready.eq(_any(write_data_ready[i]))
+
+        # the responses: the master index is part of the id
+        for i, master in enumerate(masters):
+            def read_data(field):
+                return Array(getattr(slave.read_data, field) for slave in slaves)[read_target[i]]
+            m.d.comb += [
+                master.read_data.valid.eq(read_data("valid") & (master_index(read_data("id")) == i)),
+                master.read_data.value.eq(read_data("value")),
+                master.read_data.resp.eq(read_data("resp")),
+                master.read_data.id.eq(read_data("id")[:self.master_id_bits]),
+                master.read_data.last.eq(read_data("last")),
+            ]
+
+            def write_response(field):
+                return Array(getattr(slave.write_response, field) for slave in slaves)[write_target[i]]
+            m.d.comb += [
+                master.write_response.valid.eq(
+                    write_response("valid") & (master_index(write_response("id")) == i)
+                ),
+                master.write_response.resp.eq(write_response("resp")),
+                master.write_response.id.eq(write_response("id")[:self.master_id_bits]),
+            ]
+        for slave in slaves:
+            m.d.comb += slave.read_data.ready.eq(
+                Array(master.read_data.ready for master in masters)[master_index(slave.read_data.id)]
+            )
+            m.d.comb += slave.write_response.ready.eq(
+                Array(master.write_response.ready for master in masters)[master_index(slave.write_response.id)]
+            )
+
+        return m
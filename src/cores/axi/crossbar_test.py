@@ -0,0 +1,312 @@
+import unittest
+
+from nmigen.sim import Passive
+
+from cores.axi.axi_endpoint import AxiEndpoint, Response, BurstType
+from cores.axi.crossbar import AxiCrossbar
+from cores.axi.sim_util import write_to_axi_channel, read_from_axi_channel
+from util.sim import SimPlatform
+
+
+def memory_slave(axi: AxiEndpoint, memory):
+    """Sim processes that implement an AXI slave with the given memory dict (one transaction at a time)"""
+    def reads():
+        yield Passive()
+        while True:
+            address, burst_len, id = yield from read_from_axi_channel(
+                axi.read_address, "value", "burst_len", "id", timeout=10000
+            )
+            for i in range(burst_len + 1):
+                yield from write_to_axi_channel(
+                    axi.read_data, value=memory.get(address + i * axi.data_bytes, 0), id=id, last=i == burst_len,
+                    resp=Response.OKAY
+                )
+
+    def writes():
+        yield Passive()
+        while True:
+            address, id = yield from read_from_axi_channel(axi.write_address, "value", "id", timeout=10000)
+            i = 0
+            while True:
+                value, last = yield from read_from_axi_channel(axi.write_data, "value", "last")
+                memory[address + i * axi.data_bytes] = value
+                i += 1
+                if last:
+                    break
+            yield from write_to_axi_channel(axi.write_response, id=id, resp=Response.OKAY)
+
+    return reads, writes
+
+
+def pipelined_slave(axi: AxiEndpoint, memory, latency):
+    """
+    Sim processes that implement an AXI slave with the given memory dict which accepts every address immediately and
+    answers it `latency` cycles later (in order). Reads of addresses that were never written return the address.
+    """
+    now = [0]
+    reads, writes, write_responses = [], [], []
+
+    def clock():
+        yield Passive()
+        while True:
+            yield
+            now[0] += 1
+
+    def read_addresses():
+        yield Passive()
+        yield axi.read_address.ready.eq(1)
+        while True:
+            yield
+            if (yield axi.read_address.valid):
+                burst = (yield axi.read_address.value), (yield axi.read_address.burst_len), (yield axi.read_address.id)
+                reads.append((now[0] + latency, burst))
+
+    def read_data():
+        yield Passive()
+        while True:
+            if not reads or reads[0][0] > now[0]:
+                yield
+                continue
+            _, (address, burst_len, id) = reads.pop(0)
+            for beat in range(burst_len + 1):
+                beat_address = address + beat * axi.data_bytes
+                yield from write_to_axi_channel(
+                    axi.read_data, value=memory.get(beat_address, beat_address), id=id, last=beat == burst_len,
+                    resp=Response.OKAY
+                )
+
+    def write_addresses():
+        yield Passive()
+        yield axi.write_address.ready.eq(1)
+        while True:
+            yield
+            if (yield axi.write_address.valid):
+                writes.append(((yield axi.write_address.value), (yield axi.write_address.burst_len),
+                               (yield axi.write_address.id)))
+
+    def write_data():
+        yield Passive()
+        while True:
+            if not writes:
+                yield
+                continue
+            address, burst_len, id = writes.pop(0)
+            for beat in range(burst_len + 1):
+                value, last = yield from read_from_axi_channel(axi.write_data, "value", "last", timeout=10000)
+                assert last == (beat == burst_len)
+                memory[address + beat * axi.data_bytes] = value
+            write_responses.append((now[0] + latency, id))
+
+    def write_response():
+        yield Passive()
+        while True:
+            if not write_responses or write_responses[0][0] > now[0]:
+                yield
+                continue
+            _, id = write_responses.pop(0)
+            yield from write_to_axi_channel(axi.write_response, id=id, resp=Response.OKAY)
+
+    return clock, read_addresses, read_data, write_addresses, write_data, write_response
+
+
+class TestAxiCrossbar(unittest.TestCase):
+    def test_masters_share_slaves(self, n_masters=3, burst_len=4, n_rounds=3):
+        dut = AxiCrossbar(addr_bits=32, data_bits=64, master_id_bits=4)
+        # the master ports are driven directly by the testbench
+        ports = [dut.get_port() for _ in range(n_masters)]
+        slaves = [AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12, master=False) for _ in range(2)]
+        memories = [{}, {}]
+        dut.add_slave(slaves[0], range(0x0000, 0x1000))
+        dut.add_slave(slaves[1], range(0x1000, 0x2000))
+
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        for slave, memory in zip(slaves, memories):
+            for process in memory_slave(slave, memory):
+                platform.add_process(process, "sync")
+
+        finished = []
+
+        def master_process(i):
+            port = ports[i]
+
+            def process():
+                for round in range(n_rounds):
+                    for slave in range(2):
+                        address = slave * 0x1000 + i * 0x100 + round * burst_len * 8
+                        yield from write_to_axi_channel(
+                            port.write_address, value=address, id=i, burst_len=burst_len - 1,
+                            burst_type=BurstType.INCR
+                        )
+                        for beat in range(burst_len):
+                            yield from write_to_axi_channel(
+                                port.write_data, value=address + beat, last=beat == burst_len - 1
+                            )
+                        id, resp = yield from read_from_axi_channel(port.write_response, "id", "resp")
+                        self.assertEqual((i, Response.OKAY.value), (id, resp))
+
+                        yield from write_to_axi_channel(
+                            port.read_address, value=address, id=i, burst_len=burst_len - 1,
+                            burst_type=BurstType.INCR
+                        )
+                        for beat in range(burst_len):
+                            value, id, last = yield from read_from_axi_channel(port.read_data, "value", "id", "last")
+                            self.assertEqual((address + beat, i, beat == burst_len - 1), (value, id, last))
+                finished.append(i)
+            return process
+
+        for i in range(n_masters):
+            platform.add_process(master_process(i), "sync")
+
+        def testbench():
+            while len(finished) < n_masters:
+                yield
+            yield  # the counters are registered
+            for i in range(n_masters):
+                self.assertEqual(2 * n_rounds * burst_len, (yield dut.read_beats[i]))
+                self.assertEqual(2 * n_rounds * burst_len, (yield dut.write_beats[i]))
+            for slave, memory in enumerate(memories):
+                for i in range(n_masters):
+                    for beat in range(n_rounds * burst_len):
+                        burst_address = slave * 0x1000 + i * 0x100 + (beat // burst_len) * burst_len * 8
+                        offset = beat % burst_len
+                        self.assertEqual(burst_address + offset, memory[burst_address + offset * 8])
+
+        platform.sim(dut, testbench)
+
+    def test_back_to_back_transactions(
+            self, n_masters=3, burst_len=4, pattern=(0, 0, 0, 1, 1, 0), max_outstanding=2, master_id_bits=4
+    ):
+        dut = AxiCrossbar(addr_bits=32, data_bits=64, master_id_bits=master_id_bits, max_outstanding=max_outstanding)
+        ports = [dut.get_port() for _ in range(n_masters)]
+        slaves = [AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12, master=False) for _ in range(2)]
+        memories = [{}, {}]
+        dut.add_slave(slaves[0], range(0x0000, 0x1000))
+        dut.add_slave(slaves[1], range(0x1000, 0x2000))
+
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        # slave 0 answers late, so the masters run into the outstanding limit and stall when they switch the slave
+        for slave, memory, latency in zip(slaves, memories, [30, 2]):
+            for process in pipelined_slave(slave, memory, latency):
+                platform.add_process(process, "sync")
+
+        # the transactions every master has outstanding at every slave (seen at the slaves)
+        outstanding = {direction: [[0, 0] for _ in range(n_masters)] for direction in ["read", "write"]}
+        most_outstanding = {"read": 0, "write": 0}
+
+        def monitor(s, axi):
+            def process():
+                yield Passive()
+                while True:
+                    yield
+                    for direction, address, done in [
+                        ("read", axi.read_address, axi.read_data),
+                        ("write", axi.write_address, axi.write_response),
+                    ]:
+                        if (yield address.valid) and (yield address.ready):
+                            counts = outstanding[direction][(yield address.id) >> master_id_bits]
+                            # the responses of a master stay in order because it only talks to one slave at a time
+                            assert counts[1 - s] == 0, "a master has outstanding {}s at both slaves".format(direction)
+                            counts[s] += 1
+                            assert counts[s] <= max_outstanding
+                            most_outstanding[direction] = max(most_outstanding[direction], counts[s])
+                        if (yield done.valid) and (yield done.ready) and (direction == "write" or (yield done.last)):
+                            outstanding[direction][(yield done.id) >> master_id_bits][s] -= 1
+            return process
+
+        for s, slave in enumerate(slaves):
+            platform.add_process(monitor(s, slave), "sync")
+
+        def address(i, k, write):
+            return pattern[k] * 0x1000 + write * 0x800 + i * 0x100 + k * burst_len * 8
+
+        finished = []
+
+        def master_processes(i):
+            port = ports[i]
+
+            def read_addresses():
+                for k in range(len(pattern)):
+                    yield from write_to_axi_channel(
+                        port.read_address, value=address(i, k, False), id=k, burst_len=burst_len - 1,
+                        burst_type=BurstType.INCR, timeout=10000
+                    )
+
+            def read_data():
+                for k in range(len(pattern)):
+                    for beat in range(burst_len):
+                        value, id, last, resp = yield from read_from_axi_channel(
+                            port.read_data, "value", "id", "last", "resp", timeout=10000
+                        )
+                        self.assertEqual(
+                            (address(i, k, False) + beat * 8, k, beat == burst_len - 1, Response.OKAY.value),
+                            (value, id, last, resp)
+                        )
+                finished.append(("read", i))
+
+            def write_addresses():
+                for k in range(len(pattern)):
+                    yield from write_to_axi_channel(
+                        port.write_address, value=address(i, k, True), id=k, burst_len=burst_len - 1,
+                        burst_type=BurstType.INCR, timeout=10000
+                    )
+
+            def write_data():
+                for k in range(len(pattern)):
+                    for beat in range(burst_len):
+                        yield from write_to_axi_channel(
+                            port.write_data, value=(i << 16) | (k << 8) | beat, last=beat == burst_len - 1,
+                            timeout=10000
+                        )
+
+            def write_responses():
+                for k in range(len(pattern)):
+                    id, resp = yield from read_from_axi_channel(port.write_response, "id", "resp", timeout=10000)
+                    self.assertEqual((k, Response.OKAY.value), (id, resp))
+                finished.append(("write", i))
+
+            return read_addresses, read_data, write_addresses, write_data, write_responses
+
+        for i in range(n_masters):
+            for process in master_processes(i):
+                platform.add_process(process, "sync")
+
+        def testbench():
+            while len(finished) < 2 * n_masters:
+                yield
+            self.assertEqual({"read": max_outstanding, "write": max_outstanding}, most_outstanding)
+            for i in range(n_masters):
+                for k, slave in enumerate(pattern):
+                    for beat in range(burst_len):
+                        # the write data of the interleaved bursts ended up in the right bursts
+                        self.assertEqual(
+                            (i << 16) | (k << 8) | beat, memories[slave][address(i, k, True) + beat * 8]
+                        )
+
+        platform.sim(dut, testbench)
+
+    def test_decode_error(self):
+        dut = AxiCrossbar(addr_bits=32, data_bits=64, master_id_bits=4)
+        port = dut.get_port()
+        dut.add_slave(AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12, master=False), range(0, 0x1000))
+
+        def testbench():
+            yield from write_to_axi_channel(
+                port.read_address, value=0x2000, id=3, burst_len=2, burst_type=BurstType.INCR
+            )
+            for beat in range(3):
+                id, resp, last = yield from read_from_axi_channel(port.read_data, "id", "resp", "last")
+                self.assertEqual((3, Response.DECERR.value, beat == 2), (id, resp, last))
+
+            yield from write_to_axi_channel(
+                port.write_address, value=0x2000, id=5, burst_len=1, burst_type=BurstType.INCR
+            )
+            yield from write_to_axi_channel(port.write_data, value=1, last=0)
+            yield from write_to_axi_channel(port.write_data, value=2, last=1)
+            id, resp = yield from read_from_axi_channel(port.write_response, "id", "resp")
+            self.assertEqual((5, Response.DECERR.value), (id, resp))
+
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        platform.sim(dut, testbench)
@@ -1,12 +1,37 @@
 from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
 
 from . import AxiEndpoint
+from .axi_endpoint import BurstType
+
+
+def _next_address(address, burst_type, beat_bytes, wrap_mask):
+    """The address of the next beat of a burst (beat_bytes and wrap_mask are in bytes)"""
+    incremented = address + beat_bytes
+    return Mux(
+        burst_type == BurstType.FIXED, address,
+        Mux(
+            burst_type == BurstType.WRAP, address - (address & wrap_mask) + (incremented & wrap_mask),
+            incremented
+        )
+    )
 
 
 class AxiFullToLiteBridge(Elaboratable):
-    def __init__(self, full_master: AxiEndpoint):
+    def __init__(self, full_master: AxiEndpoint, max_outstanding=4):
+        """
+        Converts the transactions of an AXI full master into AXI lite transactions.
+
+        Bursts are split into one lite transaction per beat. The id and the position in the burst of every lite
+        transaction that was issued are kept in a fifo, so that up to `max_outstanding` reads (and writes) can be in
+        flight and the responses get the right id and `last` flag. The responses of the beats of a write burst are
+        combined into a single write response (with the worst response of all beats).
+
+        :param max_outstanding: the number of lite transactions per direction that can be in flight
+        """
         assert full_master.is_master and not full_master.is_lite
         self._full_master = full_master
+        self.max_outstanding = max_outstanding
         self.lite_master = AxiEndpoint.like(full_master, lite=True, name="axi_lite_bridge_master")
 
     def elaborate(self, platform):
@@ -17,46 +42,124 @@ class AxiFullToLiteBridge(Elaboratable):
 
         lite_master = self.lite_master
 
-        m.d.comb += [
-            lite_master.read_address.value.eq(full_slave.read_address.value),
-            lite_master.read_address.valid.eq(full_slave.read_address.valid),
-            full_slave.read_address.ready.eq(lite_master.read_address.ready),
+        # read path
+        read_busy = Signal()
+        read_address = Signal.like(full_slave.read_address.value)
+        read_remaining = Signal.like(full_slave.read_address.burst_len)
+        read_id = Signal.like(full_slave.read_address.id)
+        read_burst_type = Signal.like(full_slave.read_address.burst_type)
+        read_beat_bytes = Signal(8)
+        read_wrap_mask = Signal(12)
+
+        # the id and the last flag of every lite read that is in flight
+        read_beats = m.submodules.read_beats = SyncFIFO(width=len(read_id) + 1, depth=self.max_outstanding)
+        m.d.comb += lite_master.read_address.value.eq(read_address)
+        m.d.comb += lite_master.read_address.valid.eq(read_busy & read_beats.w_rdy)
+        read_issued = lite_master.read_address.valid & lite_master.read_address.ready
+        m.d.comb += read_beats.w_data.eq(Cat(read_id, read_remaining == 0))
+        m.d.comb += read_beats.w_en.eq(read_issued)
+        with m.If(read_issued):
+            m.d.sync += read_address.eq(_next_address(read_address, read_burst_type, read_beat_bytes, read_wrap_mask))
+            m.d.sync += read_remaining.eq(read_remaining - 1)
+            with m.If(read_remaining == 0):
+                m.d.sync += read_busy.eq(0)
+
+        # the next burst is accepted while the last beat of the current one is issued
+        m.d.comb += full_slave.read_address.ready.eq(~read_busy | (read_issued & (read_remaining == 0)))
+        with m.If(full_slave.read_address.valid & full_slave.read_address.ready):
+            self._start_burst(
+                m, full_slave.read_address,
+                read_busy, read_address, read_remaining, read_id, read_burst_type, read_beat_bytes, read_wrap_mask
+            )
 
+        m.d.comb += [
             full_slave.read_data.value.eq(lite_master.read_data.value),
             full_slave.read_data.valid.eq(lite_master.read_data.valid),
             full_slave.read_data.resp.eq(lite_master.read_data.resp),
+            full_slave.read_data.id.eq(read_beats.r_data[:len(read_id)]),
+            full_slave.read_data.last.eq(read_beats.r_data[-1]),
             lite_master.read_data.ready.eq(full_slave.read_data.ready),
+            read_beats.r_en.eq(lite_master.read_data.valid & lite_master.read_data.ready),
+        ]
 
-            lite_master.write_address.value.eq(full_slave.write_address.value),
-            lite_master.write_address.valid.eq(full_slave.write_address.valid),
-            full_slave.write_address.ready.eq(lite_master.write_address.ready),
+        # write path
+        write_busy = Signal()
+        write_address = Signal.like(full_slave.write_address.value)
+        write_remaining = Signal.like(full_slave.write_address.burst_len)
+        write_id = Signal.like(full_slave.write_address.id)
+        write_burst_type = Signal.like(full_slave.write_address.burst_type)
+        write_beat_bytes = Signal(8)
+        write_wrap_mask = Signal(12)
+        address_done = Signal()  # the lite write address of the current beat was handed out
+        data_done = Signal()  # the lite write data of the current beat was handed out
+
+        # the id and the last flag of every lite write that is in flight
+        write_beats = m.submodules.write_beats = SyncFIFO(width=len(write_id) + 1, depth=self.max_outstanding)
+        m.d.comb += lite_master.write_address.value.eq(write_address)
+        m.d.comb += lite_master.write_address.valid.eq(write_busy & ~address_done & write_beats.w_rdy)
+        address_handshake = lite_master.write_address.valid & lite_master.write_address.ready
+        m.d.comb += write_beats.w_data.eq(Cat(write_id, write_remaining == 0))
+        m.d.comb += write_beats.w_en.eq(address_handshake)
 
+        m.d.comb += [
             lite_master.write_data.value.eq(full_slave.write_data.value),
-            lite_master.write_data.valid.eq(full_slave.write_data.valid),
             lite_master.write_data.byte_strobe.eq(full_slave.write_data.byte_strobe),
-            full_slave.write_data.ready.eq(lite_master.write_data.ready),
-
-            full_slave.write_response.resp.eq(lite_master.write_response.resp),
-            full_slave.write_response.valid.eq(lite_master.write_response.valid),
-            lite_master.write_response.ready.eq(full_slave.write_response.ready),
+            lite_master.write_data.valid.eq(write_busy & ~data_done & full_slave.write_data.valid),
+            full_slave.write_data.ready.eq(write_busy & ~data_done & lite_master.write_data.ready),
         ]
-
-        # fake the id tracking
-        read_id = Signal.like(full_slave.read_data.id)
-        write_id = Signal.like(full_slave.write_data.id)
-
-        with m.If(full_slave.read_address.valid):
-            m.d.comb += full_slave.read_data.id.eq(full_slave.read_address.id)
-            m.d.sync += read_id.eq(full_slave.read_address.id)
+        data_handshake = lite_master.write_data.valid & lite_master.write_data.ready
+
+        beat_done = (address_done | address_handshake) & (data_done | data_handshake)
+        with m.If(beat_done):
+            m.d.sync += [address_done.eq(0), data_done.eq(0)]
+            m.d.sync += write_address.eq(
+                _next_address(write_address, write_burst_type, write_beat_bytes, write_wrap_mask)
+            )
+            m.d.sync += write_remaining.eq(write_remaining - 1)
+            with m.If(write_remaining == 0):
+                m.d.sync += write_busy.eq(0)
         with m.Else():
-            m.d.comb += full_slave.read_data.id.eq(read_id)
-
-        with m.If(full_slave.write_address.valid):
-            m.d.comb += full_slave.write_response.id.eq(full_slave.write_address.id)
-            m.d.sync += write_id.eq(full_slave.write_address.id)
-        with m.Else():
-            m.d.comb += full_slave.write_response.id.eq(write_id)
-
-        m.d.comb += full_slave.read_data.last.eq(1)
+            with m.If(address_handshake):
+                m.d.sync += address_done.eq(1)
+            with m.If(data_handshake):
+                m.d.sync += data_done.eq(1)
+
+        m.d.comb += full_slave.write_address.ready.eq(~write_busy)
+        with m.If(full_slave.write_address.valid & full_slave.write_address.ready):
+            self._start_burst(
+                m, full_slave.write_address,
+                write_busy, write_address, write_remaining, write_id, write_burst_type, write_beat_bytes,
+                write_wrap_mask
+            )
+
+        # only the response of the last beat of a burst is passed on; it carries the worst response of the burst
+        worst_response = Signal.like(lite_master.write_response.resp)
+        response = Signal.like(lite_master.write_response.resp)
+        last_beat = write_beats.r_data[-1]
+        m.d.comb += response.eq(Mux(
+            lite_master.write_response.resp > worst_response, lite_master.write_response.resp, worst_response
+        ))
+        m.d.comb += [
+            full_slave.write_response.valid.eq(lite_master.write_response.valid & last_beat),
+            full_slave.write_response.resp.eq(response),
+            full_slave.write_response.id.eq(write_beats.r_data[:len(write_id)]),
+            lite_master.write_response.ready.eq(~last_beat | full_slave.write_response.ready),
+            write_beats.r_en.eq(lite_master.write_response.valid & lite_master.write_response.ready),
+        ]
+        with m.If(lite_master.write_response.valid & lite_master.write_response.ready):
+            m.d.sync += worst_response.eq(Mux(last_beat, 0, response))
 
         return m
+
+    @staticmethod
+    def _start_burst(m, address_channel, busy, address, remaining, id, burst_type, beat_bytes, wrap_mask):
+        m.d.sync += [
+            busy.eq(1),
+            address.eq(address_channel.value),
+            remaining.eq(address_channel.burst_len),
+            id.eq(address_channel.id),
+            burst_type.eq(address_channel.burst_type),
+            beat_bytes.eq(Const(1) << address_channel.beat_size_bytes),
+            # wrapping bursts have a power of two length, so the wrap boundary is (burst_len + 1) * beat_bytes
+            wrap_mask.eq(((address_channel.burst_len + 1) << address_channel.beat_size_bytes) - 1),
+        ]
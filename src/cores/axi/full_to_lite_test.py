@@ -0,0 +1,110 @@
+import unittest
+
+from nmigen import *
+
+from cores.axi.axi_endpoint import AxiEndpoint, Response, BurstType
+from cores.axi.axi_lite_peripheral_connector import AxiLitePeripheralConnector
+from cores.axi.full_to_lite import AxiFullToLiteBridge
+from cores.axi.sim_util import write_to_axi_channel, read_from_axi_channel, RegisterPeripheral
+from util.sim import SimPlatform
+
+
+class BridgeDut(Elaboratable):
+    def __init__(self, n_words=8):
+        self.axi = AxiEndpoint(addr_bits=32, data_bits=32, lite=False, id_bits=12, master=True)
+        self.bridge = AxiFullToLiteBridge(self.axi)
+        self.registers = RegisterPeripheral(n_words)
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.bridge = self.bridge
+        m.submodules.registers = self.registers.peripheral
+        connector = m.submodules.connector = AxiLitePeripheralConnector(self.registers.peripheral)
+        m.d.comb += self.bridge.lite_master.connect_slave(connector.axi)
+        return m
+
+
+class TestAxiFullToLiteBridge(unittest.TestCase):
+    def make_dut(self):
+        dut = BridgeDut()
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        return platform, dut
+
+    def write_burst(self, axi, address, values, id=0, burst_type=BurstType.INCR):
+        yield from write_to_axi_channel(
+            axi.write_address, value=address, id=id, burst_len=len(values) - 1, burst_type=burst_type
+        )
+        for i, value in enumerate(values):
+            yield from write_to_axi_channel(axi.write_data, value=value, last=i == len(values) - 1)
+        return (yield from read_from_axi_channel(axi.write_response, "id", "resp"))
+
+    def test_bursts(self):
+        platform, dut = self.make_dut()
+
+        def testbench():
+            axi = dut.axi
+            id, resp = yield from self.write_burst(axi, 0x4000_0004, [10, 11, 12, 13], id=7)
+            self.assertEqual((7, Response.OKAY.value), (id, resp))
+            for i in range(4):
+                self.assertEqual(10 + i, (yield dut.registers.regs[1 + i]))
+
+            yield from write_to_axi_channel(
+                axi.read_address, value=0x4000_0004, id=5, burst_len=3, burst_type=BurstType.INCR
+            )
+            for i in range(4):
+                value, id, last, resp = yield from read_from_axi_channel(axi.read_data, "value", "id", "last", "resp")
+                self.assertEqual((10 + i, 5, i == 3, Response.OKAY.value), (value, id, last, resp))
+
+            # a wrapping burst of 4 beats starting in the middle of a 16 byte block
+            yield from write_to_axi_channel(
+                axi.read_address, value=0x4000_0008, id=1, burst_len=3, burst_type=BurstType.WRAP
+            )
+            values = []
+            for i in range(4):
+                value, = yield from read_from_axi_channel(axi.read_data, "value")
+                values.append(value)
+            self.assertEqual([11, 12, 0, 10], values)
+
+        platform.sim(dut, testbench)
+
+    def test_write_error_is_reported_for_the_burst(self):
+        platform, dut = self.make_dut()
+
+        def testbench():
+            # the register file has 8 registers; the last beat is out of range
+            id, resp = yield from self.write_burst(dut.axi, 0x4000_0014, [1, 2, 3, 4], id=3)
+            self.assertEqual((3, Response.SLVERR.value), (id, resp))
+            id, resp = yield from self.write_burst(dut.axi, 0x4000_0000, [1], id=2)
+            self.assertEqual((2, Response.OKAY.value), (id, resp))
+
+        platform.sim(dut, testbench)
+
+    def test_outstanding_reads(self, n_bursts=4, burst_len=4):
+        platform, dut = self.make_dut()
+        axi = dut.axi
+
+        def issue():
+            for burst in range(n_bursts):
+                yield from write_to_axi_channel(
+                    axi.read_address, value=0x4000_0000 + burst * 4, id=burst, burst_len=burst_len - 1,
+                    burst_type=BurstType.INCR
+                )
+        platform.add_process(issue, "sync")
+
+        def testbench():
+            yield axi.read_data.ready.eq(1)
+            beats = []
+            cycles = 0
+            while len(beats) < n_bursts * burst_len:
+                yield
+                cycles += 1
+                if (yield axi.read_data.valid):
+                    beats.append(((yield axi.read_data.id), (yield axi.read_data.last)))
+            self.assertEqual(
+                [(burst, beat == burst_len - 1) for burst in range(n_bursts) for beat in range(burst_len)], beats
+            )
+            # the connector answers one read every two cycles; the bridge must not add bubbles between the bursts
+            self.assertLessEqual(cycles, 2 * n_bursts * burst_len + 4)
+
+        platform.sim(dut, testbench)
@@ -3,69 +3,178 @@ from functools import reduce
 from nmigen import *
 
 from . import AxiEndpoint
-from util.nmigen_misc import iterator_with_if_elif
+from .axi_endpoint import Response
+
+
+def _any(signals):
+    return reduce(lambda a, b: a | b, signals, Const(0))
 
 
 class AxiInterconnect(Elaboratable):
-    def __init__(self, uplink_axi_master):
+    def __init__(self, uplink_axi_master, registered=True, max_outstanding=3):
         """
-        A simple single master to many slaves AXI interconnect.
+        A single master to many slaves AXI lite interconnect that decodes the addresses centrally.
+
+        Every downstream port gets an address range. The address of every transaction is decoded once into a one-hot
+        select vector (optionally in a register slice) and only the selected port sees the transaction. Transactions
+        to unmapped addresses are answered with DECERR. The responses of the ports are or-ed together (the ports must
+        drive zeros while their responses are not valid), so there is no priority encoder. To keep the responses in
+        order, transactions to a different port than the outstanding ones are stalled until those are answered. The
+        write data is routed to the port of the preceding write address.
 
         :type uplink_axi_master: AxiEndpoint
         :param uplink_axi_master: The axi master to which the inteconnect is connected.
+        :param registered: decode the addresses in a register slice (cuts the timing path between the master and the
+                           address decoders for the cost of one cycle of latency)
+        :param max_outstanding: the maximum number of transactions per direction that are in flight downstream
         """
         self._uplink_axi_master = uplink_axi_master
         assert uplink_axi_master.is_lite, "AXI interconnect only supports AXI lite atm"
+        self.registered = registered
+        self.max_outstanding = max_outstanding
         self._downstream_ports = []
+        self._address_ranges = []
 
-    def get_port(self):
+    def get_port(self, address_range: range):
         """
         Gets a AXI master port connected to the master via this interconnect.
 
+        :param address_range: the (absolute) addresses that are routed to the port
         :return: A new AxiInterface shaped after the upstream port.
         """
+        assert address_range.start < address_range.stop
+        for other in self._address_ranges:
+            assert address_range.stop <= other.start or other.stop <= address_range.start, \
+                "the address range {!r} overlaps with {!r}".format(address_range, other)
         downstream_master = AxiEndpoint.like(self._uplink_axi_master, name="axi_interconnect_downstream")
         self._downstream_ports.append(downstream_master)
+        self._address_ranges.append(address_range)
         return downstream_master
 
+    def _decode(self, m, address):
+        """Return a one-hot vector of the selected port with the error slave as the last bit"""
+        decoded = Signal(len(self._downstream_ports) + 1)
+        for i, address_range in enumerate(self._address_ranges):
+            m.d.comb += decoded[i].eq((address >= address_range.start) & (address < address_range.stop))
+        m.d.comb += decoded[-1].eq(~decoded[:-1].any())
+        return decoded
+
+    def _address_stage(self, m, channel, release):
+        """
+        Decode the address of an address channel. `release` has to be asserted (combinatorially) when the transaction
+        in the stage was handed downstream.
+        :return: the valid, the address and the one-hot select vector of the transaction in the stage
+        """
+        valid = Signal()
+        address = Signal.like(channel.value)
+        select = Signal(len(self._downstream_ports) + 1)
+        decoded = self._decode(m, channel.value)
+        if self.registered:
+            with m.If(~valid | release):
+                m.d.sync += [valid.eq(channel.valid), address.eq(channel.value), select.eq(decoded)]
+            m.d.comb += channel.ready.eq(~valid | release)
+        else:
+            m.d.comb += [valid.eq(channel.valid), address.eq(channel.value), select.eq(decoded)]
+            m.d.comb += channel.ready.eq(release)
+        return valid, address, select
+
+    def _outstanding(self, m, issued, answered):
+        """Count the transactions that were issued downstream but not answered and remember the port they went to"""
+        count = Signal(range(self.max_outstanding + 1))
+        target = Signal(len(self._downstream_ports) + 1)
+        m.d.sync += count.eq(count + issued - answered)
+        return count, target
+
     def elaborate(self, platform):
         m = Module()
 
         uplink = AxiEndpoint.like(self._uplink_axi_master, master=False, name="uplink_slave")
         m.d.comb += self._uplink_axi_master.connect_slave(uplink)
 
-        # beware: the following works only for axi lite!
-
-        for downstream_port in self._downstream_ports:
-            m.d.comb += downstream_port.read_address.value.eq(uplink.read_address.value)
-            m.d.comb += downstream_port.read_address.valid.eq(uplink.read_address.valid)
-
-            m.d.comb += downstream_port.write_address.value.eq(uplink.write_address.value)
-            m.d.comb += downstream_port.write_address.valid.eq(uplink.write_address.valid)
-
-            m.d.comb += downstream_port.write_data.value.eq(uplink.write_data.value)
-            m.d.comb += downstream_port.write_data.valid.eq(uplink.write_data.valid)
-            m.d.comb += downstream_port.write_data.byte_strobe.eq(uplink.write_data.byte_strobe)
-
-        # wait until at least one peripherals is ready when writing the addresses
-        m.d.comb += uplink.read_address.ready.eq(reduce(lambda a, b: a | b, (d.read_address.ready for d in self._downstream_ports)))
-        m.d.comb += uplink.write_address.ready.eq(reduce(lambda a, b: a | b, (d.write_address.ready for d in self._downstream_ports)))
-
-        # only one peripheral has to accept written data
-        m.d.comb += uplink.write_data.ready.eq(reduce(lambda a, b: a | b, (d.write_data.ready for d in self._downstream_ports)))
-
-        # we are creating priority encoders here: When multiple peripherals want to answer, we take the answer of the
-        # first added peripheral
-        for conditional, downstream_port in iterator_with_if_elif(self._downstream_ports, m):
-            with conditional(downstream_port.read_data.valid):
-                m.d.comb += uplink.read_data.valid.eq(1)
-                m.d.comb += uplink.read_data.value.eq(downstream_port.read_data.value)
-                m.d.comb += uplink.read_data.resp.eq(downstream_port.read_data.resp)
-                m.d.comb += downstream_port.read_data.ready.eq(uplink.read_data.ready)
-        for conditional, downstream_port in iterator_with_if_elif(self._downstream_ports, m):
-            with conditional(downstream_port.write_response.valid):
-                m.d.comb += uplink.write_response.valid.eq(1)
-                m.d.comb += uplink.write_response.resp.eq(downstream_port.write_response.resp)
-                m.d.comb += downstream_port.write_response.ready.eq(uplink.write_response.ready)
+        ports = self._downstream_ports
+        error = len(ports)  # the index of the DECERR slave in the select vectors
+
+        # read path
+        read_release = Signal()
+        read_answered = uplink.read_data.valid & uplink.read_data.ready
+        ar_valid, ar_address, ar_select = self._address_stage(m, uplink.read_address, read_release)
+        read_count, read_target = self._outstanding(m, read_release, read_answered)
+        read_stall = ((read_count != 0) & (read_target != ar_select)) | (read_count == self.max_outstanding)
+
+        error_read_valid = Signal()
+        error_read_ready = ~error_read_valid | uplink.read_data.ready
+
+        for i, port in enumerate(ports):
+            m.d.comb += port.read_address.value.eq(ar_address)
+            m.d.comb += port.read_address.valid.eq(ar_valid & ar_select[i] & ~read_stall)
+            m.d.comb += port.read_data.ready.eq(uplink.read_data.ready)
+        m.d.comb += read_release.eq(ar_valid & ~read_stall & _any(
+            [ar_select[i] & port.read_address.ready for i, port in enumerate(ports)]
+            + [ar_select[error] & error_read_ready]
+        ))
+        with m.If(read_release):
+            m.d.sync += read_target.eq(ar_select)
+
+        with m.If(error_read_valid & uplink.read_data.ready):
+            m.d.sync += error_read_valid.eq(0)
+        with m.If(read_release & ar_select[error]):
+            m.d.sync += error_read_valid.eq(1)
+
+        m.d.comb += uplink.read_data.valid.eq(_any([port.read_data.valid for port in ports]) | error_read_valid)
+        m.d.comb += uplink.read_data.value.eq(_any([port.read_data.value for port in ports]))
+        m.d.comb += uplink.read_data.resp.eq(
+            _any([port.read_data.resp for port in ports]) | Mux(error_read_valid, Response.DECERR.value, 0)
+        )
+
+        # write path. Only one write address is waiting for its data at a time; the data follows it to the same port.
+        aw_release = Signal()
+        write_answered = uplink.write_response.valid & uplink.write_response.ready
+        aw_valid, aw_address, aw_select = self._address_stage(m, uplink.write_address, aw_release)
+        w_pending = Signal()
+        w_select = Signal.like(aw_select)
+        w_handshake = uplink.write_data.valid & uplink.write_data.ready
+        write_count, write_target = self._outstanding(m, w_handshake, write_answered)
+        write_stall = ((write_count != 0) & (write_target != aw_select)) | (write_count == self.max_outstanding)
+
+        error_write_valid = Signal()
+        error_write_ready = ~error_write_valid | uplink.write_response.ready
+
+        aw_active = aw_valid & ~w_pending & ~write_stall
+        w_active = w_pending | aw_active
+        w_target = Mux(w_pending, w_select, aw_select)
+        for i, port in enumerate(ports):
+            m.d.comb += port.write_address.value.eq(aw_address)
+            m.d.comb += port.write_address.valid.eq(aw_active & aw_select[i])
+            m.d.comb += port.write_data.value.eq(uplink.write_data.value)
+            m.d.comb += port.write_data.byte_strobe.eq(uplink.write_data.byte_strobe)
+            m.d.comb += port.write_data.valid.eq(uplink.write_data.valid & w_active & w_target[i])
+            m.d.comb += port.write_response.ready.eq(uplink.write_response.ready)
+
+        m.d.comb += aw_release.eq(aw_active & _any(
+            [aw_select[i] & port.write_address.ready for i, port in enumerate(ports)]
+            + [aw_select[error] & error_write_ready]
+        ))
+        m.d.comb += uplink.write_data.ready.eq(w_active & _any(
+            [w_target[i] & port.write_data.ready for i, port in enumerate(ports)]
+            + [w_target[error] & error_write_ready & (w_pending | aw_release)]
+        ))
+        with m.If(w_handshake):
+            m.d.sync += w_pending.eq(0)
+            m.d.sync += write_target.eq(w_target)
+        with m.Elif(aw_release):
+            m.d.sync += w_pending.eq(1)
+            m.d.sync += w_select.eq(aw_select)
+
+        with m.If(error_write_valid & uplink.write_response.ready):
+            m.d.sync += error_write_valid.eq(0)
+        with m.If(w_handshake & w_target[error]):
+            m.d.sync += error_write_valid.eq(1)
+
+        m.d.comb += uplink.write_response.valid.eq(
+            _any([port.write_response.valid for port in ports]) | error_write_valid
+        )
+        m.d.comb += uplink.write_response.resp.eq(
+            _any([port.write_response.resp for port in ports]) | Mux(error_write_valid, Response.DECERR.value, 0)
+        )
 
         return m
@@ -0,0 +1,107 @@
+import unittest
+
+from nmigen import *
+
+from cores.axi.axi_endpoint import AxiEndpoint, Response as AxiResponse
+from cores.axi.axi_lite_peripheral_connector import AxiLitePeripheralConnector
+from cores.axi.interconnect import AxiInterconnect
+from cores.axi.sim_util import axil_read, axil_write, write_to_axi_channel, read_from_axi_channel, RegisterPeripheral
+from util.sim import SimPlatform
+
+
+class InterconnectDut(Elaboratable):
+    def __init__(self, n_peripherals, latencies=(1,), **kwargs):
+        self.axi = AxiEndpoint(addr_bits=32, data_bits=32, master=True, lite=True)
+        self.interconnect = AxiInterconnect(self.axi, **kwargs)
+        self.connectors = []
+        for i in range(n_peripherals):
+            latency = latencies[i % len(latencies)]
+            registers = RegisterPeripheral(4, base_address=0x4000_0000 + i * 0x100, latency=latency)
+            connector = AxiLitePeripheralConnector(registers.peripheral, check_range=False)
+            self.connectors.append((self.interconnect.get_port(registers.peripheral.range()), connector))
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.interconnect = self.interconnect
+        for port, connector in self.connectors:
+            m.d.comb += port.connect_slave(connector.axi)
+            m.submodules += [connector, connector.peripheral]
+        return m
+
+
+class TestAxiInterconnect(unittest.TestCase):
+    def make_dut(self, n_peripherals=3, **kwargs):
+        dut = InterconnectDut(n_peripherals, **kwargs)
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        return platform, dut
+
+    def test_read_write(self):
+        for registered in [True, False]:
+            platform, dut = self.make_dut(latencies=(1, 3), registered=registered)
+
+            def testbench():
+                for p in range(3):
+                    for i in range(4):
+                        yield from axil_write(dut.axi, 0x4000_0000 + p * 0x100 + i * 4, (p << 8) | i)
+                for p in reversed(range(3)):
+                    for i in range(4):
+                        value = yield from axil_read(dut.axi, 0x4000_0000 + p * 0x100 + i * 4)
+                        self.assertEqual((p << 8) | i, value)
+
+            platform.sim(dut, testbench)
+
+    def test_decode_error(self):
+        platform, dut = self.make_dut()
+
+        def testbench():
+            for address in [0x3FFF_FFFC, 0x4000_0014, 0x5000_0000]:
+                yield from write_to_axi_channel(dut.axi.read_address, address)
+                _, response = yield from read_from_axi_channel(dut.axi.read_data)
+                self.assertEqual(AxiResponse.DECERR.value, response)
+
+                yield from write_to_axi_channel(dut.axi.write_address, address)
+                yield from write_to_axi_channel(dut.axi.write_data, 42)
+                _, response = yield from read_from_axi_channel(dut.axi.write_response)
+                self.assertEqual(AxiResponse.DECERR.value, response)
+
+            # the peripherals were not touched and still answer
+            yield from axil_write(dut.axi, 0x4000_0104, 42)
+            self.assertEqual(42, (yield from axil_read(dut.axi, 0x4000_0104)))
+
+        platform.sim(dut, testbench)
+
+    def test_responses_stay_in_order(self, n_reads=30):
+        # the peripherals have different latencies, so reordering would be visible
+        platform, dut = self.make_dut(latencies=(4, 1, 2))
+
+        axi = dut.axi
+
+        def issue():
+            for p in range(3):
+                yield from axil_write(axi, 0x4000_0000 + p * 0x100, p + 1)
+            for i in range(n_reads):
+                yield from write_to_axi_channel(axi.read_address, 0x4000_0000 + (i % 3) * 0x100)
+        platform.add_process(issue, "sync")
+
+        def testbench():
+            received = []
+            yield axi.read_data.ready.eq(1)
+            while len(received) < n_reads:
+                yield
+                if (yield axi.read_data.valid):
+                    received.append((yield axi.read_data.value))
+            self.assertEqual([(i % 3) + 1 for i in range(n_reads)], received)
+
+        platform.sim(dut, testbench)
+
+    def test_many_peripherals(self):
+        platform, dut = self.make_dut(n_peripherals=128)
+
+        def testbench():
+            for p in [0, 63, 127]:
+                yield from axil_write(dut.axi, 0x4000_0000 + p * 0x100 + 8, p)
+            for p in [127, 63, 0]:
+                self.assertEqual(p, (yield from axil_read(dut.axi, 0x4000_0000 + p * 0x100 + 8)))
+
+        platform.sim(dut, testbench)
@@ -1,17 +1,40 @@
+from nmigen import *
+
 from cores.axi.axi_endpoint import Response
+from soc.memorymap import MemoryMap, Address
+from soc.peripheral import Peripheral, Response as PeripheralResponse
 from util.sim import wait_for
 
 
-def write_to_axi_channel(channel, value):
-    yield channel.value.eq(value)
+def write_to_axi_channel(channel, value=None, timeout=100, **fields):
+    """
+    Do a single transfer on an axi channel.
+    :param fields: the values of the other fields of the channel (e.g. id=3, burst_len=15 or last=1)
+    """
+    if value is not None:
+        yield channel.value.eq(value)
+    for name, field_value in fields.items():
+        yield getattr(channel, name).eq(field_value)
     yield channel.valid.eq(1)
-    yield from wait_for(channel.ready)
+    yield from wait_for(channel.ready, timeout=timeout)
     yield channel.valid.eq(0)
 
 
-def read_from_axi_channel(channel):
-    yield from wait_for(channel.valid)
+def read_from_axi_channel(channel, *fields, timeout=100):
+    """
+    Take a single transfer from an axi channel.
+    :param fields: the names of the fields to return (e.g. "value", "id", "last"); if none are given a (value, resp)
+                   tuple is returned
+    """
+    yield from wait_for(channel.valid, timeout=timeout)
     yield channel.ready.eq(1)
+    if fields:
+        result = []
+        for name in fields:
+            result.append((yield getattr(channel, name)))
+        yield
+        yield channel.ready.eq(0)
+        return result
     if hasattr(channel, "value"):
         result = (yield channel.value)
     else:
@@ -33,4 +56,37 @@ def axil_write(axi, addr, data):
     yield from write_to_axi_channel(axi.write_address, addr)
     yield from write_to_axi_channel(axi.write_data, data)
     result, response = (yield from read_from_axi_channel(axi.write_response))
-    assert Response.OKAY.value == response
\ No newline at end of file
+    assert Response.OKAY.value == response
+
+
+class RegisterPeripheral:
+    def __init__(self, n_words, base_address=0x4000_0000, latency=1):
+        """A register file peripheral that answers after `latency` cycles. Addresses >= n_words * 4 fail."""
+        self.regs = Array(Signal(32, name="reg{}".format(i)) for i in range(n_words))
+        self.n_words = n_words
+        self.latency = latency
+
+        memorymap = MemoryMap()
+        for i in range(n_words + 1):  # one more word to provoke errors
+            memorymap.allocate("reg{}".format(i), writable=True, bits=32)
+        memorymap.top = True
+        memorymap.place_at = Address(base_address, 0, memorymap.byte_len * 8)
+        # like every peripheral, it has to be elaborated somewhere in the design (e.g. next to its connector)
+        self.peripheral = Peripheral(self.handle_read, self.handle_write, memorymap)
+
+    def _after_latency(self, m, addr, action, done):
+        counter = Signal(range(self.latency + 1))
+        m.d.sync += counter.eq(counter + 1)
+        with m.If(counter == self.latency - 1):
+            m.d.sync += counter.eq(0)
+            with m.If((addr >> 2) < self.n_words):
+                action()
+                done(PeripheralResponse.OK)
+            with m.Else():
+                done(PeripheralResponse.ERR)
+
+    def handle_read(self, m, addr, data, read_done):
+        self._after_latency(m, addr, lambda: m.d.sync.__iadd__(data.eq(self.regs[addr >> 2])), read_done)
+
+    def handle_write(self, m, addr, data, write_done):
+        self._after_latency(m, addr, lambda: m.d.sync.__iadd__(self.regs[addr >> 2].eq(data)), write_done)
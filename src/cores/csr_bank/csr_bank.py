@@ -12,14 +12,31 @@ from .csr_types import _Csr, StatusSignal, ControlSignal
 
 
 class CsrBank(Elaboratable):
-    def __init__(self):
-        self.memorymap = MemoryMap()
+    def __init__(self, packed=False):
+        """
+        A Peripheral that maps ControlSignals and StatusSignals into a memorymap.
+        :param packed: if True, the CSRs without an explicit address are packed densely into bus words (see
+                       MemoryMap.allocate_packed) when the memorymap is used. Otherwise each CSR is appended.
+        """
+        self._memorymap = MemoryMap()
+        self.packed = packed
+        self._to_pack = []
+
+    @property
+    def memorymap(self):
+        if self._to_pack:
+            self._memorymap.allocate_packed(self._to_pack)
+            self._to_pack = []
+        return self._memorymap
 
     def reg(self, name: str, signal: _Csr):
         assert isinstance(signal, _Csr)
         writable = not isinstance(signal, StatusSignal)
         bits = len(signal) if isinstance(signal, UserValue) else None
-        self.memorymap.allocate(name, writable, bits=bits, address=signal.address, obj=signal)
+        if self.packed and signal.address is None and bits is not None:
+            self._to_pack.append((name, writable, bits, signal))
+        else:
+            self._memorymap.allocate(name, writable, bits=bits, address=signal.address, obj=signal)
 
     def elaborate(self, platform):
         handled = Signal()
@@ -27,6 +44,8 @@ class CsrBank(Elaboratable):
         def handle_read(m, addr, data, read_done):
             for iter_addr in range(0, self.memorymap.byte_len + 1, self.memorymap.bus_word_width_bytes):
                 with m.If(iter_addr == addr):
+                    # bits that dont belong to any csr read as zero
+                    m.d.sync += data.eq(0)
                     for row in self.memorymap.normal_resources:
                         bits_of_word = row.address.bits_of_word(iter_addr)
                         if bits_of_word:
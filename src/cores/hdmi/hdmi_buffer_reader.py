@@ -1,19 +1,21 @@
 from nmigen import *
+from nmigen.utils import bits_for
 
-from cores.axi.buffer_reader import AxiBufferReader
+from cores.axi.buffer_reader import AxiBufferReader, descriptor
 from cores.csr_bank import ControlSignal, StatusSignal
 from cores.hdmi.hdmi import Hdmi
 from cores.ring_buffer_address_storage import RingBufferAddressStorage
 from util.stream import StreamEndpoint
-from util.nmigen_misc import log2
+from util.nmigen_misc import mul_by_pot
 
 
-class AddressGenerator(Elaboratable):
+class LineDescriptorGenerator(Elaboratable):
     def __init__(
             self,
             ringbuffer: RingBufferAddressStorage,
             max_line_width=5000, address_width=32, data_width=64,
     ):
+        """Generates one `AxiBufferReader` descriptor per line of the frame in the last written buffer."""
         self.next_frame = Signal()
         self.line_words_total = ControlSignal(32, reset=2304 // 4)
         self.line_words_read = StatusSignal(32)
@@ -23,31 +25,26 @@ class AddressGenerator(Elaboratable):
         self.data_width = data_width
         self.max_line_width = max_line_width
 
-        self.output = StreamEndpoint(address_width, is_sink=False, has_last=False)
+        self.output = StreamEndpoint(address_width + bits_for(max_line_width), is_sink=False, has_last=False)
 
     def elaborate(self, platform):
         m = Module()
 
-        line_ctr = Signal(range(self.max_line_width))
-        line_base = Signal(self.address_width)
-        with m.If(self.output.ready):
-            m.d.sync += self.output.valid.eq(1)
-            with m.If(line_ctr < self.line_words_read):
-                m.d.sync += self.output.payload.eq(self.output.payload + log2(self.data_width))
-                m.d.sync += line_ctr.eq(line_ctr + 1)
-            with m.Else():
-                m.d.sync += line_ctr.eq(0)
-                m.d.sync += self.output.payload.eq(line_base + self.line_words_total)
-                m.d.sync += line_base.eq(line_base + self.line_words_total)
+        read_buffer = Signal.like(self.ringbuffer.current_write_buffer)
+        with m.If(self.ringbuffer.current_write_buffer == 0):
+            m.d.comb += read_buffer.eq(len(self.ringbuffer.buffer_base_list) - 1)
+        with m.Else():
+            m.d.comb += read_buffer.eq(self.ringbuffer.current_write_buffer - 1)
 
+        line_base = Signal(self.address_width)
         with m.If(self.next_frame):
-            read_buffer = Signal.like(self.ringbuffer.current_write_buffer)
-            with m.If(self.ringbuffer.current_write_buffer == 0):
-                m.d.comb += read_buffer.eq(len(self.ringbuffer.buffer_base_list) - 1)
-            with m.Else():
-                m.d.comb += read_buffer.eq(self.ringbuffer.current_write_buffer - 1)
-            m.d.sync += self.output.payload.eq(self.ringbuffer.buffer_base_list[read_buffer])
+            # the descriptor that was not taken yet belongs to the old frame; the new frame starts after the vsync
+            m.d.sync += self.output.valid.eq(0)
             m.d.sync += line_base.eq(self.ringbuffer.buffer_base_list[read_buffer])
+        with m.Elif(~self.output.valid | self.output.ready):
+            m.d.sync += self.output.valid.eq(1)
+            m.d.sync += self.output.payload.eq(descriptor(line_base, self.line_words_read, self.address_width))
+            m.d.sync += line_base.eq(line_base + mul_by_pot(self.line_words_total, self.data_width // 8))
 
         return m
 
@@ -65,11 +62,11 @@ class HdmiBufferReader(Elaboratable):
 
         in_pix_domain = DomainRenamer("pix")
 
-        addr_gen = m.submodules.addr_gen = in_pix_domain(AddressGenerator(self.ring_buffer))
-        m.d.comb += addr_gen.next_frame.eq(hdmi.timing_generator.vsync)
-        m.d.comb += addr_gen.line_words_read.eq(hdmi.timing_generator.width)
+        line_descriptors = m.submodules.line_descriptors = in_pix_domain(LineDescriptorGenerator(self.ring_buffer))
+        m.d.comb += line_descriptors.next_frame.eq(hdmi.timing_generator.vsync)
+        m.d.comb += line_descriptors.line_words_read.eq(hdmi.timing_generator.width)
 
-        reader = m.submodules.reader = in_pix_domain(AxiBufferReader(addr_gen.output))
+        reader = m.submodules.reader = in_pix_domain(AxiBufferReader(line_descriptors.output))
         output = StreamEndpoint.like(reader.output, is_sink=True, name="hdmi_reader_output_sink")
         m.d.comb += output.connect(reader.output)
 
@@ -0,0 +1,55 @@
+import unittest
+
+from cores.hdmi.hdmi_buffer_reader import LineDescriptorGenerator
+from cores.ring_buffer_address_storage import RingBufferAddressStorage
+from util.sim import SimPlatform
+
+
+class TestLineDescriptorGenerator(unittest.TestCase):
+    def test_descriptors_across_vsync(self, line_words=3, line_stride_words=4):
+        ringbuffer = RingBufferAddressStorage(0x10_0000, 2, base_address=0x100_0000)
+        dut = LineDescriptorGenerator(ringbuffer)
+
+        def take(n):
+            descriptors = []
+            yield dut.output.ready.eq(1)
+            while len(descriptors) < n:
+                yield
+                if (yield dut.output.valid):
+                    payload = yield dut.output.payload
+                    descriptors.append((payload & 0xffff_ffff, payload >> 32))
+            yield dut.output.ready.eq(0)
+            return descriptors
+
+        def vsync(current_write_buffer):
+            yield ringbuffer.current_write_buffer.eq(current_write_buffer)
+            yield dut.next_frame.eq(1)
+            yield
+            # no descriptors are handed out during the vsync
+            for _ in range(3):
+                yield
+                self.assertEqual(0, (yield dut.output.valid))
+            yield dut.next_frame.eq(0)
+
+        def frame(base, n_lines):
+            return [(base + i * line_stride_words * 8, line_words) for i in range(n_lines)]
+
+        def testbench():
+            yield dut.line_words_read.eq(line_words)
+            yield dut.line_words_total.eq(line_stride_words)
+            # the descriptor of the old frame is pending (valid but not taken) when the vsync comes
+            for _ in range(5):
+                yield
+            self.assertEqual(1, (yield dut.output.valid))
+
+            # buffer 0 is written, so buffer 1 is read
+            yield from vsync(current_write_buffer=0)
+            self.assertEqual(frame(0x110_0000, 3), (yield from take(3)))
+
+            # a vsync in the middle of a frame restarts at the first line of the (new) last written buffer
+            yield from vsync(current_write_buffer=1)
+            self.assertEqual(frame(0x100_0000, 4), (yield from take(4)))
+
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        platform.sim(dut, testbench)
@@ -9,15 +9,25 @@ class JTAGPeripheralConnector(Elaboratable):
         """
         A simple `PeripheralConnector` implementation for querying `Peripheral`s via JTAG in debug situations.
         This code does not handle memorymap stuff. Use in combination with PeripheralsAggregator
+
+        Every transaction starts with a two bit command: the first bit selects read (0) or write (1), the second bit
+        selects burst mode. In burst mode the address is auto incremented by one word after every word and the
+        connector waits for the next word of the same direction until the jtag tap is reset. The command and
+        address are then only shifted once per block.
+
+        While a read or write is in flight, every shifted bit is a completion poll: the first shift after the
+        peripheral is done leaves the wait state. A host must therefore poll until it sees done before it shifts
+        the data or the status of the word (see JTAGAccessor).
         """
 
         assert callable(peripheral.handle_read) and callable(peripheral.handle_write)
         assert isinstance(peripheral.range, range)
         self.peripheral = peripheral
+        self.jtag = JTAG()
 
     def elaborate(self, platform):
         m = Module()
-        jtag = m.submodules.jtag = JTAG()
+        jtag = m.submodules.jtag = self.jtag
         m.submodules.in_jtag_domain = DomainRenamer("jtag")(self.elaborate_jtag_domain(platform, jtag))
         return m
 
@@ -26,6 +36,7 @@ class JTAGPeripheralConnector(Elaboratable):
         state = Signal(4)
 
         write = Signal()
+        burst = Signal()
         addr = Signal(32)
         data = Signal(32)
         status = Signal()
@@ -38,12 +49,10 @@ class JTAGPeripheralConnector(Elaboratable):
             m.d.sync += status.eq(error)
             m.d.sync += read_write_done.eq(1)
 
-        # jtag_fsm is a seperate domain so that when the jtag fsm is reset all the csrs keep their value
-        # (they are also implicitly part of the jtag domain because they are driven from it)
-        m.domains += ClockDomain("jtag_fsm")
-        m.d.comb += ClockSignal("jtag_fsm").eq(ClockSignal())
-        m.d.comb += ResetSignal("jtag_fsm").eq(jtag.reset)
-        with m.FSM(domain="jtag_fsm"):
+        # only the state of the fsm is reset with the jtag tap so that all the csrs keep their value
+        # (they are also implicitly part of the jtag domain because they are driven from it).
+        # this is not done with a derived clock domain because its edges would race the jtag domain in simulation
+        with m.FSM() as fsm:
             def next_on_jtag_shift(next_state, is_tdi):
                 with m.If(jtag.shift_read if is_tdi else jtag.shift_write):
                     m.next = next_state
@@ -51,8 +60,22 @@ class JTAGPeripheralConnector(Elaboratable):
             with m.State("CMD"):  # we recive one bit that indicates if we want to read (0) or write (1)
                 m.d.comb += state.eq(0)
                 m.d.sync += write.eq(jtag.tdi)
+                m.d.sync += read_write_done.eq(0)
+                next_on_jtag_shift("CMD_BURST", is_tdi=True)
+            with m.State("CMD_BURST"):  # and one bit that indicates if we want to do a burst (1) or not (0)
+                m.d.comb += state.eq(0)
+                m.d.sync += burst.eq(jtag.tdi)
                 next_on_jtag_shift("ADDR0", is_tdi=True)
 
+            def next_word_or_cmd(next_word_state, is_tdi):
+                with m.If(burst):
+                    with m.If(jtag.shift_read if is_tdi else jtag.shift_write):
+                        m.d.sync += addr.eq(addr + 4)
+                        m.d.sync += read_write_done.eq(0)
+                    next_on_jtag_shift(next_word_state, is_tdi)
+                with m.Else():
+                    next_on_jtag_shift("CMD", is_tdi)
+
             # address states
             for i in range(32):
                 with m.State("ADDR{}".format(i)):
@@ -84,7 +107,7 @@ class JTAGPeripheralConnector(Elaboratable):
             with m.State("READ_STATUS"):
                 m.d.comb += state.eq(6)
                 m.d.comb += jtag.tdo.eq(status)
-                next_on_jtag_shift("CMD", is_tdi=False)
+                next_word_or_cmd("READ_WAIT", is_tdi=False)
 
             # write states
             for i in range(32):
@@ -104,6 +127,8 @@ class JTAGPeripheralConnector(Elaboratable):
             with m.State("WRITE_STATUS"):
                 m.d.comb += state.eq(6)
                 m.d.comb += jtag.tdo.eq(status)
-                next_on_jtag_shift("CMD", is_tdi=False)
+                next_word_or_cmd("WRITE0", is_tdi=False)
+        with m.If(jtag.reset):
+            m.d.sync += fsm.state.eq(fsm.encoding["CMD"])
 
         return m
@@ -0,0 +1,138 @@
+import unittest
+from collections import deque
+
+from nmigen import *
+from nmigen.sim import Settle
+
+from cores.axi.sim_util import RegisterPeripheral
+from cores.jtag.jtag_peripheral_connector import JTAGPeripheralConnector
+from soc.peripherals_aggregator import PeripheralsAggregator
+from soc.platforms.jtag.memory_accessor_openocd import JTAGAccessor, TransactionNotSuccessfulException
+from soc.platforms.jtag.mock_openocd import MockOpenOCDServer
+from util.sim import SimPlatform
+
+
+class SimConnector(Elaboratable):
+    def __init__(self, n_words=16, latency=1):
+        """
+        A drop in replacement for the ConnectorModel of the MockOpenOCDServer that shifts every bit through the
+        JTAGPeripheralConnector RTL in a simulation. The jtag primitive itself is not simulated; tdi and shift are
+        driven like a BSCANE2 does it, so the accessor has to be used with `lattice_quirk=False`.
+        """
+        self.register = RegisterPeripheral(n_words, base_address=0, latency=latency)
+        aggregator = PeripheralsAggregator()
+        aggregator.add_peripheral(self.register.peripheral)
+        self.connector = JTAGPeripheralConnector(aggregator)
+
+        self._requests = deque()
+        self._responses = deque()
+        platform = SimPlatform()
+        platform.jtag_signals = Signal(11)
+        platform.add_sim_clock("jtag", 10e6)
+        platform.add_process(self._process, "tck_falling")
+        self.simulator = platform.build_simulator(platform.prepare(self))
+
+    def elaborate(self, platform):
+        m = Module()
+        m.domains += ClockDomain("jtag")
+        # like a BSCANE2 the bits are driven on the falling edge of tck and sampled on the rising edge
+        m.domains += ClockDomain("tck_falling", clk_edge="neg")
+        m.d.comb += ClockSignal("tck_falling").eq(ClockSignal("jtag"))
+        m.submodules.connector = self.connector
+        m.submodules.peripheral = self.register.peripheral
+        return m
+
+    def reset(self):
+        return self._bridge("reset")
+
+    def shift(self, tdi):
+        return self._bridge("shift", tdi)
+
+    def _bridge(self, *request, timeout=100):
+        self._requests.append(request)
+        for _ in range(timeout):
+            if self._responses:
+                return self._responses.popleft()
+            self.simulator.advance()
+        raise TimeoutError("the simulation did not answer {}".format(request))
+
+    def _process(self):
+        jtag = self.connector.jtag
+        while True:
+            if not self._requests:
+                yield
+                continue
+            kind, *args = self._requests.popleft()
+            if kind == "reset":
+                yield jtag.reset.eq(1)
+                yield
+                yield jtag.reset.eq(0)
+                self._responses.append(None)
+            else:
+                tdi, = args
+                yield jtag.tdi.eq(tdi)
+                yield jtag.shift_read.eq(1)
+                yield jtag.shift_write.eq(1)
+                yield Settle()
+                tdo = yield jtag.tdo
+                yield
+                # there is at least one cycle without shifting between two scans (e.g. in update-dr and capture-dr)
+                yield jtag.shift_read.eq(0)
+                yield jtag.shift_write.eq(0)
+                yield
+                self._responses.append(tdo)
+
+
+class TestJTAGPeripheralConnector(unittest.TestCase):
+    def run_accessor(self, connector, test):
+        with MockOpenOCDServer(None) as server:
+            server.connector = connector
+            test(JTAGAccessor(port=server.port, lattice_quirk=False))
+
+    def test_single(self):
+        connector = SimConnector()
+
+        def test(accessor):
+            accessor.write(0x8, 0xdeadbeef)
+            accessor.write(0xc, 0x1234_5678)
+            self.assertEqual(0xdeadbeef, accessor.read(0x8))
+            self.assertEqual(0x1234_5678, accessor.read(0xc))
+            self.assertEqual(0, accessor.read(0x4))
+
+        self.run_accessor(connector, test)
+
+    def test_burst(self):
+        connector = SimConnector()
+
+        def test(accessor):
+            accessor.write_burst(0x4, [0x100 + i for i in range(12)])
+            self.assertEqual([0x100 + i for i in range(12)], accessor.read_burst(0x4, 12))
+            self.assertEqual([0, 0x100, 0x101], accessor.read_burst(0x0, 3))
+            # single transactions still work after a burst
+            self.assertEqual(0x10b, accessor.read(0x4 + 11 * 4))
+
+        self.run_accessor(connector, test)
+
+    def test_slow_peripheral(self):
+        # the peripheral does not answer before the first completion poll, so the accessor has to fall back to polling
+        connector = SimConnector(latency=8)
+
+        def test(accessor):
+            accessor.write_burst(0x0, [1, 2, 3])
+            self.assertEqual([1, 2, 3], accessor.read_burst(0x0, 3))
+            self.assertEqual(2, accessor.read(0x4))
+
+        self.run_accessor(connector, test)
+
+    def test_error_status(self):
+        connector = SimConnector(n_words=4)
+
+        def test(accessor):
+            with self.assertRaises(TransactionNotSuccessfulException):
+                accessor.read(0x10)
+            with self.assertRaises(TransactionNotSuccessfulException):
+                accessor.write(0x10, 1)
+            accessor.write(0xc, 1)
+            self.assertEqual(1, accessor.read(0xc))
+
+        self.run_accessor(connector, test)
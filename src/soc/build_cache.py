@@ -0,0 +1,137 @@
+# A content addressed cache for build products. Every entry lives in build/cache/<key> where the key is derived from
+# the build plan and the toolchain that built it. Entries are evicted in least recently used order.
+
+import os
+import shutil
+from hashlib import sha256
+from json import dumps
+from os import path
+from shutil import which
+from uuid import uuid4
+
+from nmigen._toolchain import tool_env_var
+
+
+def hash_build_plan(build_plan_files):
+    build_plan_files = {k: v.decode("utf-8") if isinstance(v, bytes) else v for k, v in build_plan_files.items()}
+    json_repr = dumps(build_plan_files)
+    return sha256(json_repr.encode("utf-8")).hexdigest()
+
+
+def toolchain_fingerprint(platform):
+    """
+    A cheap stand-in for the toolchain version: the platform, the toolchain name and the location, size and mtime of
+    all the tools the platform needs. Updating (or switching) a tool changes the fingerprint.
+    """
+    parts = [type(platform).__name__, str(getattr(platform, "toolchain", None))]
+    for tool in getattr(platform, "required_tools", []):
+        executable = which(os.environ.get(tool_env_var(tool), tool))
+        if executable is None:
+            parts.append("{}:missing".format(tool))
+        else:
+            stat = os.stat(executable)
+            parts.append("{}:{}:{}:{}".format(tool, executable, stat.st_size, stat.st_mtime_ns))
+    return "\n".join(parts)
+
+
+class BuildCache:
+    size_file = ".cache_size"
+
+    def __init__(self, root=path.join("build", "cache"), max_bytes=20 * 1024 ** 3):
+        """
+        A content addressed store of build directories with LRU eviction by total size.
+
+        :param root: the directory that holds the cache entries
+        :param max_bytes: the total size of all the entries after which the least recently used ones are evicted
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(build_plan_files, toolchain_fingerprint):
+        return sha256("{}\n{}".format(hash_build_plan(build_plan_files), toolchain_fingerprint).encode("utf-8")) \
+            .hexdigest()
+
+    def entry_path(self, key):
+        return path.join(self.root, key)
+
+    def lookup(self, key):
+        """Return the path of the build products for `key` or None. A hit marks the entry as recently used."""
+        entry = self.entry_path(key)
+        try:
+            os.utime(path.join(entry, self.size_file))
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def is_valid_entry(self, entry):
+        """An entry is only complete if its size file was written and is intact."""
+        try:
+            with open(path.join(entry, self.size_file)) as f:
+                int(f.read())
+        except (FileNotFoundError, NotADirectoryError, ValueError):
+            return False
+        return True
+
+    def build(self, key, build_function):
+        """
+        Run `build_function(build_path)` in a fresh directory and store the result under `key` if it succeeds.
+        If the build fails, the directory is kept at `<key>.failed` for inspection and the exception is propagated.
+        :return: the path of the cache entry
+        """
+        os.makedirs(self.root, exist_ok=True)
+        partial = path.join(self.root, "{}.partial-{}".format(key, uuid4().hex))
+        try:
+            build_function(partial)
+        except BaseException:
+            failed = path.join(self.root, "{}.failed".format(key))
+            shutil.rmtree(failed, ignore_errors=True)
+            if path.exists(partial):
+                os.rename(partial, failed)
+            raise
+
+        size = sum(
+            path.getsize(path.join(directory, file))
+            for directory, _, files in os.walk(partial) for file in files
+        )
+        with open(path.join(partial, self.size_file), "w") as f:
+            f.write(str(size))
+
+        entry = self.entry_path(key)
+        try:
+            os.rename(partial, entry)
+        except OSError:
+            if self.is_valid_entry(entry):  # somebody else built the same thing concurrently; keep theirs
+                shutil.rmtree(partial, ignore_errors=True)
+            else:  # a leftover of an interrupted build or eviction; replace it with the fresh build
+                shutil.rmtree(entry, ignore_errors=True)
+                os.rename(partial, entry)
+        self.evict(keep=key)
+        return entry
+
+    def lookup_or_build(self, key, build_function):
+        """:return: a tuple of the path of the cache entry and whether it was a hit"""
+        entry = self.lookup(key)
+        if entry is not None:
+            return entry, True
+        return self.build(key, build_function), False
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until the cache is smaller than `max_bytes`."""
+        entries = []
+        for dir_entry in os.scandir(self.root):
+            try:
+                size_path = path.join(dir_entry.path, self.size_file)
+                with open(size_path) as f:
+                    entries.append((os.stat(size_path).st_mtime, int(f.read()), dir_entry.name))
+            except (FileNotFoundError, NotADirectoryError, ValueError):  # partial or failed builds
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(path.join(self.root, name), ignore_errors=True)
+            total -= size
@@ -0,0 +1,75 @@
+import os
+import unittest
+from os import path
+from subprocess import CalledProcessError
+from tempfile import TemporaryDirectory
+
+from soc.build_cache import BuildCache
+
+
+def build_function(size):
+    def build(build_path):
+        os.makedirs(build_path)
+        with open(path.join(build_path, "bitstream.bin"), "wb") as f:
+            f.write(bytes(size))
+    return build
+
+
+class TestBuildCache(unittest.TestCase):
+    def test_lookup(self):
+        with TemporaryDirectory() as directory:
+            cache = BuildCache(directory)
+            key = cache.key({"top.v": "module top(); endmodule"}, "toolchain 1")
+            self.assertNotEqual(key, cache.key({"top.v": "module top(); endmodule"}, "toolchain 2"))
+
+            self.assertIsNone(cache.lookup(key))
+            entry, hit = cache.lookup_or_build(key, build_function(10))
+            self.assertFalse(hit)
+            self.assertTrue(path.exists(path.join(entry, "bitstream.bin")))
+            self.assertEqual((entry, True), cache.lookup_or_build(key, None))
+
+    def test_failed_build(self):
+        def failing_build(build_path):
+            os.makedirs(build_path)
+            raise CalledProcessError(1, "build_top")
+
+        with TemporaryDirectory() as directory:
+            cache = BuildCache(directory)
+            with self.assertRaises(CalledProcessError):
+                cache.build("a", failing_build)
+            self.assertIsNone(cache.lookup("a"))
+            self.assertTrue(path.isdir(path.join(directory, "a.failed")))
+
+    def test_build_replaces_invalid_entry(self):
+        with TemporaryDirectory() as directory:
+            cache = BuildCache(directory)
+            # the leftover of an interrupted build: the directory exists but the size file was never written
+            os.makedirs(path.join(directory, "a"))
+            with open(path.join(directory, "a", "bitstream.bin"), "wb") as f:
+                f.write(b"stale")
+            entry = cache.build("a", build_function(10))
+            self.assertEqual(entry, cache.lookup("a"))
+            self.assertEqual(10, path.getsize(path.join(entry, "bitstream.bin")))
+            self.assertEqual(["a"], os.listdir(directory))
+
+    def test_build_keeps_valid_entry(self):
+        with TemporaryDirectory() as directory:
+            cache = BuildCache(directory)
+            cache.build("a", build_function(10))
+            # a concurrent build of the same key finishes later; the existing entry is kept
+            cache.build("a", build_function(20))
+            self.assertEqual(10, path.getsize(path.join(cache.lookup("a"), "bitstream.bin")))
+            self.assertEqual(["a"], os.listdir(directory))
+
+    def test_lru_eviction(self):
+        with TemporaryDirectory() as directory:
+            cache = BuildCache(directory, max_bytes=250)
+            for i, key in enumerate(["a", "b"]):
+                cache.build(key, build_function(100))
+                os.utime(path.join(directory, key, cache.size_file), (i, i))
+            cache.lookup("a")  # a is more recently used than b now
+            cache.build("c", build_function(100))
+
+            self.assertIsNotNone(cache.lookup("a"))
+            self.assertIsNone(cache.lookup("b"))
+            self.assertIsNotNone(cache.lookup("c"))
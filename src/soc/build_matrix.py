@@ -0,0 +1,213 @@
+# Elaborates and builds a matrix of experiments x devices x socs in parallel. Use it like
+# `python -m soc.build_matrix -j 8 -b experiments/*.py`
+
+import argparse
+import os
+import re
+import runpy
+import subprocess
+import sys
+import threading
+import traceback
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from glob import glob
+from multiprocessing import get_context
+from os import path
+from time import perf_counter
+
+from soc.build_cache import BuildCache, hash_build_plan
+from soc.cli import capture_build_plans, link_latest_build, write_build_plan
+
+BuildJob = namedtuple("BuildJob", ["experiment", "device", "soc"])
+Elaboration = namedtuple(
+    "Elaboration", ["job", "dir_basename", "build_plan", "extra_files", "toolchain", "hash", "seconds", "error"]
+)
+ToolchainRun = namedtuple("ToolchainRun", ["hash", "build_path", "returncode", "seconds", "cached"])
+MatrixResult = namedtuple("MatrixResult", ["elaborations", "toolchain_runs", "stage_seconds"])
+
+
+def _experiment_matrix(experiment):
+    """Find the devices and socs an experiment supports by parsing the usage that the Cli prints without arguments."""
+    # the experiment should find the same modules as we do
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    process = subprocess.run([sys.executable, experiment], stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    if process.returncode == 0:  # not an experiment that uses the Cli
+        return []
+    usage = process.stderr.decode("utf-8")
+    devices = re.search("-d\\W*{(.*?)}", usage)
+    if devices is None:
+        return []
+    socs = re.search("-s\\W*{(.*?)}", usage)
+    socs = socs.group(1).split(",") if socs else [None]
+    return [BuildJob(experiment, device, soc) for device in devices.group(1).split(",") for soc in socs]
+
+
+def discover_matrix(experiments, devices=None, socs=None, n_jobs=None):
+    """
+    Find all the (experiment, device, soc) combinations of the given experiment files.
+    :param devices: only keep the combinations for these devices (all if None)
+    :param socs: only keep the combinations for these socs (all if None)
+    """
+    with ThreadPoolExecutor(n_jobs or os.cpu_count()) as pool:
+        matrix = [job for jobs in pool.map(_experiment_matrix, experiments) for job in jobs]
+    return [
+        job for job in matrix
+        if (devices is None or job.device in devices) and (socs is None or job.soc in socs)
+    ]
+
+
+def _elaborate(job: BuildJob):
+    """Run an experiment in elaboration mode (in a worker process) and return its build plan."""
+    start = perf_counter()
+    argv = sys.argv
+    sys.argv = [job.experiment, "-e", "-d", job.device] + (["-s", job.soc] if job.soc else [])
+    try:
+        with capture_build_plans() as captured:
+            runpy.run_path(job.experiment, run_name="__main__")
+        [(dir_basename, build_plan, extra_files, toolchain)] = captured
+    except BaseException:  # argparse raises SystemExit for unsupported combinations
+        return Elaboration(job, None, None, None, None, None, perf_counter() - start, traceback.format_exc())
+    finally:
+        sys.argv = argv
+    return Elaboration(
+        job, dir_basename, build_plan, extra_files, toolchain, hash_build_plan(build_plan.files),
+        perf_counter() - start, None
+    )
+
+
+def _run_toolchain(build_plan, build_path):
+    with open(path.join(build_path, "toolchain.log"), "wb") as log:
+        return subprocess.call(
+            ["sh", "{}.sh".format(build_plan.script)], cwd=build_path, stdout=log, stderr=subprocess.STDOUT
+        )
+
+
+def run_matrix(matrix, n_jobs=None, build=False, build_root="build"):
+    """
+    Elaborate every combination of the matrix in a process pool and (if `build` is set) run the vendor toolchains
+    for all the distinct build plans concurrently. Combinations with identical build plans are only built once and
+    build plans that are in the build cache already are not built at all.
+    :param n_jobs: the maximum number of concurrent elaborations and toolchain invocations (defaults to the cpu count)
+    """
+    n_jobs = n_jobs or os.cpu_count()
+    stage_seconds = OrderedDict()
+
+    start = perf_counter()
+    # spawn instead of fork: the experiments change global state (e.g. sys.argv and the nmigen tracer state)
+    with ProcessPoolExecutor(n_jobs, mp_context=get_context("spawn")) as pool:
+        elaborations = list(pool.map(_elaborate, matrix))
+    stage_seconds["elaborate"] = perf_counter() - start
+
+    start = perf_counter()
+    unique = OrderedDict()
+    for elaboration in elaborations:
+        if elaboration.error is None and elaboration.hash not in unique:
+            unique[elaboration.hash] = elaboration
+    stage_seconds["deduplicate"] = perf_counter() - start
+
+    toolchain_runs = OrderedDict()
+    if build:
+        start = perf_counter()
+        # absolute paths because the working directory changes while build plans are written
+        build_root = path.abspath(build_root)
+        cache = BuildCache(path.join(build_root, "cache"))
+        write_lock = threading.Lock()
+
+        def build_one(elaboration: Elaboration):
+            build_start = perf_counter()
+            key = cache.key(elaboration.build_plan.files, elaboration.toolchain)
+            entry = cache.lookup(key)
+            if entry is not None:
+                return ToolchainRun(elaboration.hash, entry, 0, 0.0, True)
+
+            def build_function(build_path):
+                with write_lock:  # execute_local changes the working directory of the whole process
+                    write_build_plan(elaboration.build_plan, elaboration.extra_files, build_path)
+                returncode = _run_toolchain(elaboration.build_plan, build_path)
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, elaboration.build_plan.script)
+
+            try:
+                entry = cache.build(key, build_function)
+            except subprocess.CalledProcessError as e:
+                failed_path = cache.entry_path(key) + ".failed"
+                return ToolchainRun(elaboration.hash, failed_path, e.returncode, perf_counter() - build_start, False)
+            return ToolchainRun(elaboration.hash, entry, 0, perf_counter() - build_start, False)
+
+        # the toolchains run in their own processes, so threads are enough to run them concurrently
+        with ThreadPoolExecutor(n_jobs) as pool:
+            for run in pool.map(build_one, unique.values()):
+                toolchain_runs[run.hash] = run
+
+        for elaboration in elaborations:
+            run = toolchain_runs.get(elaboration.hash)
+            if run is not None and run.returncode == 0:
+                link_latest_build(elaboration.dir_basename, run.build_path, build_root)
+        stage_seconds["build"] = perf_counter() - start
+
+    return MatrixResult(elaborations, toolchain_runs, stage_seconds)
+
+
+def print_report(result: MatrixResult):
+    print("\n# BUILD MATRIX REPORT")
+    for elaboration in result.elaborations:
+        job = elaboration.job
+        if elaboration.error is not None:
+            status = "ELABORATION FAILED"
+        elif elaboration.hash in result.toolchain_runs:
+            run = result.toolchain_runs[elaboration.hash]
+            if run.returncode != 0:
+                status = "TOOLCHAIN FAILED ({})".format(path.join(run.build_path, "toolchain.log"))
+            elif run.cached:
+                status = "cached at {}".format(run.build_path)
+            else:
+                status = "built in {:.1f}s at {}".format(run.seconds, run.build_path)
+        else:
+            status = "elaborated"
+        print("{} -d {} -s {}: elaboration {:.1f}s, {} [{}]".format(
+            job.experiment, job.device, job.soc, elaboration.seconds, status, (elaboration.hash or "-")[:12]
+        ))
+
+    n_unique = len({elaboration.hash for elaboration in result.elaborations if elaboration.error is None})
+    print("\n{} combinations, {} distinct build plans".format(len(result.elaborations), n_unique))
+    for stage, seconds in result.stage_seconds.items():
+        print("    {}: {:.1f}s".format(stage, seconds))
+
+    for elaboration in result.elaborations:
+        if elaboration.error is not None:
+            print("\n{} -d {} -s {}:\n{}".format(*elaboration.job, elaboration.error))
+
+
+def succeeded(result: MatrixResult):
+    return all(elaboration.error is None for elaboration in result.elaborations) \
+           and all(run.returncode == 0 for run in result.toolchain_runs.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="elaborate and build a matrix of experiments x devices x socs")
+    parser.add_argument('experiments', nargs='*', help='the experiment files (defaults to experiments/*.py)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='the maximum number of concurrent elaborations and toolchain runs')
+    parser.add_argument('-d', '--device', action='append', help='only build for this device (can be repeated)')
+    parser.add_argument('-s', '--soc', action='append', help='only build for this soc platform (can be repeated)')
+    parser.add_argument('-b', '--build', action='store_true', help='run the vendor toolchains (otherwise only elaborate)')
+    args = parser.parse_args()
+
+    experiments = args.experiments or [
+        file for file in sorted(glob("experiments/*.py")) if not file.endswith("builds_test.py")
+    ]
+
+    start = perf_counter()
+    matrix = discover_matrix(experiments, args.device, args.soc, args.jobs)
+    discover_seconds = perf_counter() - start
+
+    result = run_matrix(matrix, n_jobs=args.jobs, build=args.build)
+    result.stage_seconds["discover"] = discover_seconds
+    result.stage_seconds.move_to_end("discover", last=False)
+    print_report(result)
+    sys.exit(0 if succeeded(result) else 1)
+
+
+if __name__ == "__main__":
+    main()
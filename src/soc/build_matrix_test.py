@@ -0,0 +1,49 @@
+import unittest
+from os import path
+from tempfile import TemporaryDirectory
+
+from soc.build_matrix import discover_matrix, run_matrix, succeeded
+
+# a stand-in for an experiment that has the same command line interface as the Cli but does not need any devices
+FAKE_EXPERIMENT = """
+import argparse
+from nmigen.build.run import BuildPlan
+import soc.cli
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-e', '--elaborate', action="store_true")
+parser.add_argument('-d', '--device', choices=["A", "B"], required=True)
+parser.add_argument('-s', '--soc', choices=["X", "Y"])
+args = parser.parse_args()
+
+plan = BuildPlan("build_top")
+plan.add_file("build_top.sh", "echo {} > product.txt\\n".format(args.soc))
+plan.add_file("top.v", "module top(); endmodule\\n")  # the device does not change the design
+soc.cli._captured_build_plans.append(("fake_{}_{}".format(args.device, args.soc), plan, {}, "fake toolchain"))
+"""
+
+
+class TestBuildMatrix(unittest.TestCase):
+    def test_build_matrix(self):
+        with TemporaryDirectory() as directory:
+            experiment = path.join(directory, "fake.py")
+            with open(experiment, "w") as f:
+                f.write(FAKE_EXPERIMENT)
+
+            matrix = discover_matrix([experiment])
+            self.assertEqual(4, len(matrix))
+            self.assertEqual(2, len(discover_matrix([experiment], devices=["A"])))
+
+            result = run_matrix(matrix, n_jobs=2, build=True, build_root=path.join(directory, "build"))
+            self.assertTrue(succeeded(result))
+            self.assertEqual(4, len(result.elaborations))
+            self.assertEqual(2, len(result.toolchain_runs))  # the plans for device A and B are identical
+            for run in result.toolchain_runs.values():
+                self.assertTrue(path.exists(path.join(run.build_path, "product.txt")))
+                self.assertTrue(path.exists(path.join(run.build_path, "extra_files.pickle")))
+            self.assertEqual(["elaborate", "deduplicate", "build"], list(result.stage_seconds))
+            self.assertTrue(path.exists(path.join(directory, "build", "fake_B_X", "product.txt")))
+
+            # everything is in the build cache now
+            result = run_matrix(matrix, n_jobs=2, build=True, build_root=path.join(directory, "build"))
+            self.assertTrue(all(run.cached for run in result.toolchain_runs.values()))
@@ -1,25 +1,51 @@
 import inspect
 import os
 import pickle
-from collections import OrderedDict
-from datetime import datetime
+from contextlib import contextmanager
 from glob import glob
-from hashlib import sha256
-from json import dumps
 from os import stat, path
 import argparse
-from os.path import exists, isdir
-from warnings import warn
+from os.path import isdir, islink
 
 from nmigen.build.run import LocalBuildProducts
 
+from soc.build_cache import BuildCache, hash_build_plan, toolchain_fingerprint
+from soc.elaboration_cache import ElaborationCache
+
 __all__ = ["cli"]
 
+# if not None, the Cli appends the (dir_basename, build_plan, extra_files, toolchain_fingerprint) of every elaboration
+# to this list instead of building (see capture_build_plans)
+_captured_build_plans = None
+
+
+@contextmanager
+def capture_build_plans():
+    """Collect the build plans of all the Cli invocations in the context instead of writing or building them."""
+    global _captured_build_plans
+    outer, _captured_build_plans = _captured_build_plans, []
+    try:
+        yield _captured_build_plans
+    finally:
+        _captured_build_plans = outer
+
 
-def hash_build_plan(build_plan_files):
-    build_plan_files = {k: v.decode("utf-8") if isinstance(v, bytes) else v for k, v in build_plan_files.items()}
-    json_repr = dumps(build_plan_files)
-    return sha256(json_repr.encode("utf-8")).hexdigest()
+def write_build_plan(build_plan, extra_files, build_path, run_script=False):
+    """Write the files of a build plan and the extra files that are needed for programming to `build_path`."""
+    products = build_plan.execute_local(build_path, run_script=run_script)
+    with open(path.join(build_path, 'extra_files.pickle'), 'wb') as f:
+        pickle.dump(extra_files, f)
+    return products
+
+
+def link_latest_build(dir_basename, build_path, build_root="build"):
+    """Point build/<dir_basename> to the build that was used last for this experiment, device and soc."""
+    link = path.join(build_root, dir_basename)
+    temporary_link = link + ".new"
+    if islink(temporary_link):
+        os.remove(temporary_link)
+    os.symlink(path.relpath(build_path, build_root), temporary_link)
+    os.replace(temporary_link, link)
 
 
 def get_previous_build_dir(basename):
@@ -40,6 +66,8 @@ class Cli:
                             action="store_true")
         parser.add_argument('-p', '--program', help='programs the board; programs the last build if used without -b',
                             action="store_true")
+        parser.add_argument('--force-elaborate', help='elaborate even if the sources did not change since the last '
+                                                      'elaboration', action="store_true")
         runs_on_choices = [plat.__name__.replace("Platform", "") for plat in runs_on]
         parser.add_argument('-d', '--device', help='specify the device to build for', choices=runs_on_choices,
                             required=True)
@@ -64,43 +92,49 @@ class Cli:
         return self.platform
 
     def __exit__(self, exc_type, exc_value, traceback):
-        name = inspect.stack()[1].filename.split("/")[-1].replace(".py", "")
+        experiment = inspect.currentframe().f_back.f_code.co_filename
+        name = experiment.split("/")[-1].replace(".py", "")
         dir_basename = "{}_{}_{}".format(name, self.args.device, self.args.soc)
 
         if self.args.elaborate or self.args.build:
-            build_plan = self.platform.build(
-                self.top_class(),
-                name=name,
-                do_build=False,
-            )
-
-            if self.args.build:
-                needs_rebuild = True
-                build_plan_hash = hash_build_plan(build_plan.files)
-                previous_build_dir = get_previous_build_dir(dir_basename)
-                if previous_build_dir:
-                    try:
-                        old_build_plan_files = OrderedDict(
-                            (k, open(path.join(previous_build_dir, k)).read())
-                            for k, v in build_plan.files.items()
-                        )
-                        old_build_plan_hash = hash_build_plan(old_build_plan_files)
-                        if old_build_plan_hash == build_plan_hash and exists(
-                                path.join(previous_build_dir, 'extra_files.pickle')):
-                            needs_rebuild = False
-                    except FileNotFoundError as e:
-                        warn("something went wrong while determining if a rebuild is nescessary :(. "
-                             "Rebuilding unconditionally ...\n" + str(e))
-
-                if needs_rebuild:
-                    build_subdir = dir_basename + datetime.now().strftime("__%d_%b_%Y__%H_%M_%S")
-                    build_path = path.join("build", build_subdir)
-                    build_plan.execute_local(build_path)
-                    with open(path.join(build_path, 'extra_files.pickle'), 'wb') as f:
-                        pickle.dump(self.platform.extra_files, f)
+            # skip the elaboration if none of the python sources it depends on changed
+            elaboration_cache = ElaborationCache()
+            elaboration_key = elaboration_cache.key(experiment, self.args.device, self.args.soc)
+            cached = None if self.args.force_elaborate else elaboration_cache.load(elaboration_key)
+            if cached is not None:
+                print("the sources did not change; reusing the previous elaboration")
+                build_plan, self.platform.extra_files = cached
+            else:
+                build_plan = self.platform.build(
+                    self.top_class(),
+                    name=name,
+                    do_build=False,
+                )
+                elaboration_cache.store(
+                    elaboration_key, build_plan, self.platform.extra_files, extra_sources=[experiment]
+                )
+
+            if _captured_build_plans is not None:
+                _captured_build_plans.append(
+                    (dir_basename, build_plan, self.platform.extra_files, toolchain_fingerprint(self.platform))
+                )
+            elif self.args.build:
+                # the build products are looked up by the hash of the build plan and the toolchain
+                cache = BuildCache()
+                key = cache.key(build_plan.files, toolchain_fingerprint(self.platform))
+                build_path, hit = cache.lookup_or_build(
+                    key, lambda build_path: write_build_plan(
+                        build_plan, self.platform.extra_files, build_path, run_script=True
+                    )
+                )
+                if hit:
+                    print("reusing the cached build {}".format(build_path))
+                link_latest_build(dir_basename, build_path)
 
         if self.args.program:
-            previous_build_dir = get_previous_build_dir(dir_basename)
+            previous_build_dir = path.join("build", dir_basename)
+            if not islink(previous_build_dir):  # a build from before the build cache
+                previous_build_dir = get_previous_build_dir(dir_basename)
             with open(path.join(previous_build_dir, 'extra_files.pickle'), 'rb') as f:
                 self.platform.extra_files = pickle.load(f)
             cwd = os.getcwd()
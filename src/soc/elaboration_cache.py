@@ -0,0 +1,133 @@
+# Caches the build plans of elaborations so that they can be reused as long as the python sources (and the arguments)
+# that produced them did not change. This makes `-e` (and `-b` without changes) cheap when only host side code is
+# iterated on.
+
+import os
+import pickle
+import sys
+from hashlib import sha256
+from importlib import metadata
+from os import path
+
+# the directory that contains the soc, cores, devices, ... packages
+project_root = path.dirname(path.dirname(path.abspath(__file__)))
+
+# the files (besides the python modules) that can be read during elaboration (e.g. templates or the pydriver sources)
+source_suffixes = (".py", ".txt", ".yml", ".yaml", ".json", ".v", ".sv", ".vhd", ".tcl", ".xdc", ".lpf")
+
+
+def _file_hash(filename):
+    with open(filename, "rb") as f:
+        return sha256(f.read()).hexdigest()
+
+
+def _file_stat(filename):
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def source_closure():
+    """
+    Return the source files that the current elaboration can depend on: all the files (with one of the
+    `source_suffixes`) in the directories of the loaded modules of this project.
+    """
+    directories = set()
+    for module in list(sys.modules.values()):
+        filename = getattr(module, "__file__", None)
+        if filename and path.abspath(filename).startswith(project_root + os.sep):
+            directories.add(path.dirname(path.abspath(filename)))
+
+    return sorted(
+        path.join(directory, file)
+        for directory in directories for file in os.listdir(directory)
+        if file.endswith(source_suffixes)
+    )
+
+
+def _library_versions():
+    versions = []
+    for distribution in ("nmigen", "amaranth", "nmigen-boards", "amaranth-boards"):
+        try:
+            versions.append("{}=={}".format(distribution, metadata.version(distribution)))
+        except metadata.PackageNotFoundError:
+            pass
+    return versions
+
+
+def _toolchain_environment():
+    """the environment variables that nmigen (or amaranth) reads during elaboration (e.g. NMIGEN_verbose)"""
+    return [
+        "{}={}".format(name, value) for name, value in sorted(os.environ.items())
+        if name.startswith(("NMIGEN_", "AMARANTH_"))
+    ]
+
+
+class ElaborationCache:
+    def __init__(self, root=path.join("build", "elaboration_cache")):
+        """
+        Stores the build plan (and the extra files) of an elaboration together with the hashes of its source closure.
+        A lookup only stats the sources and hashes the ones whose size or mtime changed.
+
+        :param root: the directory that holds the cached elaborations
+        """
+        self.root = root
+
+    @staticmethod
+    def key(experiment, *args):
+        """
+        :param experiment: the file of the experiment that is elaborated
+        :param args: everything else that changes the elaboration result (e.g. the device and the soc)
+        """
+        parts = [
+            path.abspath(experiment), sys.version, *_library_versions(), *_toolchain_environment(), *map(repr, args)
+        ]
+        return sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return path.join(self.root, "{}.pickle".format(key))
+
+    def load(self, key):
+        """
+        Return the cached (build_plan, extra_files) for `key` if none of the sources changed since or None.
+        Sources that were only touched (i.e. their hash still matches) get their new stat stored, so that they are not
+        hashed again on the next lookup.
+        """
+        try:
+            with open(self._path(key), "rb") as f:
+                entry = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        touched = {}
+        for filename, (stat, file_hash) in entry["sources"].items():
+            try:
+                current_stat = _file_stat(filename)
+                if current_stat != stat:
+                    if _file_hash(filename) != file_hash:
+                        return None
+                    touched[filename] = (current_stat, file_hash)
+            except FileNotFoundError:
+                return None
+
+        if touched:
+            entry["sources"].update(touched)
+            self._write(key, entry)
+        return entry["build_plan"], entry["extra_files"]
+
+    def store(self, key, build_plan, extra_files, extra_sources=()):
+        """
+        Cache the result of an elaboration that just happened (the source closure is taken from sys.modules).
+        :param extra_sources: files that the elaboration depends on in addition to the source closure
+        """
+        sources = {
+            filename: (_file_stat(filename), _file_hash(filename))
+            for filename in {*source_closure(), *map(path.abspath, extra_sources)}
+        }
+        self._write(key, dict(sources=sources, build_plan=build_plan, extra_files=extra_files))
+
+    def _write(self, key, entry):
+        os.makedirs(self.root, exist_ok=True)
+        temporary_path = "{}.{}".format(self._path(key), os.getpid())
+        with open(temporary_path, "wb") as f:
+            pickle.dump(entry, f)
+        os.replace(temporary_path, self._path(key))
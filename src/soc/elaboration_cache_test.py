@@ -0,0 +1,51 @@
+import os
+import unittest
+from os import path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from nmigen.build.run import BuildPlan
+
+from soc.elaboration_cache import ElaborationCache, source_closure
+
+
+class TestElaborationCache(unittest.TestCase):
+    def test_source_closure(self):
+        closure = source_closure()
+        self.assertIn(path.abspath(__file__.replace("_test.py", ".py")), closure)
+        self.assertFalse(any("site-packages" in filename for filename in closure))
+
+    def test_key_depends_on_the_toolchain_environment(self):
+        with patch.dict(os.environ):
+            os.environ.pop("NMIGEN_verbose", None)
+            key = ElaborationCache.key("experiment.py", "Zybo")
+            os.environ["NMIGEN_verbose"] = "1"
+            self.assertNotEqual(key, ElaborationCache.key("experiment.py", "Zybo"))
+
+    def test_reuse(self):
+        with TemporaryDirectory() as directory:
+            experiment = path.join(directory, "experiment.py")
+            with open(experiment, "w") as f:
+                f.write("top = 1\n")
+
+            cache = ElaborationCache(path.join(directory, "cache"))
+            key = cache.key(experiment, "Zybo", "Zynq")
+            self.assertNotEqual(key, cache.key(experiment, "Zybo", "JTAG"))
+            self.assertIsNone(cache.load(key))
+
+            build_plan = BuildPlan("build_top")
+            build_plan.add_file("top.v", "module top(); endmodule")
+            cache.store(key, build_plan, {"extra": "file"}, extra_sources=[experiment])
+            cached_plan, extra_files = cache.load(key)
+            self.assertEqual(build_plan.files, cached_plan.files)
+            self.assertEqual({"extra": "file"}, extra_files)
+
+            os.utime(experiment, ns=(0, 0))  # touching the sources does not invalidate the elaboration
+            self.assertIsNotNone(cache.load(key))
+            # but the new stat is stored, so the touched source is not hashed again
+            with patch("soc.elaboration_cache._file_hash", side_effect=AssertionError("hashed again")):
+                self.assertIsNotNone(cache.load(key))
+
+            with open(experiment, "w") as f:
+                f.write("top = 2\n")
+            self.assertIsNone(cache.load(key))
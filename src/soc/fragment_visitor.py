@@ -0,0 +1,127 @@
+from collections import defaultdict
+from time import perf_counter
+
+from nmigen import Fragment
+
+from soc.tracing_elaborate import ElaboratableSames
+
+
+class FragmentVisitor:
+    # the names (class names) of the visitors that have to run before this one (if they are present)
+    after = ()
+    # if True, the fragments that are injected by the visitors of the same traversal are visited as well
+    visit_injected = False
+
+    def __init__(self):
+        """
+        A prepare hook that looks at every fragment of the design. Consecutive visitors in the `prepare_hooks` of a
+        SocPlatform share a single traversal of the fragment tree instead of walking the tree once per hook.
+        """
+        pass
+
+    @property
+    def __name__(self):
+        return type(self).__name__
+
+    def enter(self, platform, fragment: Fragment, name, sames: ElaboratableSames):
+        """
+        Called for every fragment before its subfragments are visited.
+        :return: False if the subfragments (and `leave` of this fragment) should be skipped for this visitor
+        """
+        pass
+
+    def leave(self, platform, fragment: Fragment, name, sames: ElaboratableSames):
+        """Called for every fragment after all of its subfragments were visited."""
+        pass
+
+    def done(self, platform, top_fragment: Fragment, sames: ElaboratableSames):
+        """Called once after the whole tree (and the injected fragments) were visited."""
+        pass
+
+
+def order_visitors(visitors):
+    """Order the visitors so that every visitor comes after the visitors it depends on. Otherwise keep the order."""
+    by_name = {visitor.__name__: visitor for visitor in visitors}
+    ordered = []
+    visiting = set()
+
+    def add(visitor):
+        if visitor in ordered:
+            return
+        if visitor.__name__ in visiting:
+            raise ValueError("circular dependency between prepare hooks involving {}".format(visitor.__name__))
+        visiting.add(visitor.__name__)
+        for dependency in visitor.after:
+            if dependency in by_name:
+                add(by_name[dependency])
+        ordered.append(visitor)
+
+    for visitor in visitors:
+        add(visitor)
+    return ordered
+
+
+def visit_fragments(platform, fragment, sames, visitors, timings, name=None):
+    """Traverse the fragment tree once and call `enter` and `leave` of all the given visitors."""
+    active = []
+    for visitor in visitors:
+        start = perf_counter()
+        if visitor.enter(platform, fragment, name, sames) is not False:
+            active.append(visitor)
+        timings[visitor.__name__] += perf_counter() - start
+
+    if active:
+        for subfragment, subfragment_name in fragment.subfragments:
+            visit_fragments(platform, subfragment, sames, active, timings, subfragment_name)
+
+    for visitor in active:
+        start = perf_counter()
+        visitor.leave(platform, fragment, name, sames)
+        timings[visitor.__name__] += perf_counter() - start
+
+
+def run_prepare_hooks(platform, top_fragment, sames, hooks, inject_subfragments):
+    """
+    Run the prepare hooks of a SocPlatform. Runs of consecutive FragmentVisitors are fused into a single traversal;
+    plain function hooks are called with (platform, top_fragment, sames).
+    :param inject_subfragments: a function that elaborates and injects the pending subfragments and returns the
+                                injected (fragment, name) tuples
+    :return: a dict of hook name -> seconds spent in the hook
+    """
+    timings = defaultdict(float)
+
+    i = 0
+    while i < len(hooks):
+        if not isinstance(hooks[i], FragmentVisitor):
+            hook = hooks[i]
+            print("-> running {}".format(hook.__name__))
+            start = perf_counter()
+            hook(platform, top_fragment, sames)
+            timings[hook.__name__] += perf_counter() - start
+            i += 1
+        else:
+            group = []
+            while i < len(hooks) and isinstance(hooks[i], FragmentVisitor):
+                group.append(hooks[i])
+                i += 1
+            group = order_visitors(group)
+            print("-> running {} in a single traversal".format(", ".join(visitor.__name__ for visitor in group)))
+            visit_fragments(platform, top_fragment, sames, group, timings)
+
+            start = perf_counter()
+            injected = inject_subfragments()
+            timings["inject_subfragments"] += perf_counter() - start
+            injected_visitors = [visitor for visitor in group if visitor.visit_injected]
+            for fragment, name in injected:
+                visit_fragments(platform, fragment, sames, injected_visitors, timings, name)
+
+            for visitor in group:
+                start = perf_counter()
+                visitor.done(platform, top_fragment, sames)
+                timings[visitor.__name__] += perf_counter() - start
+
+        start = perf_counter()
+        inject_subfragments()
+        timings["inject_subfragments"] += perf_counter() - start
+
+    return timings
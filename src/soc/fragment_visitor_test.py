@@ -0,0 +1,84 @@
+import unittest
+
+from nmigen import Fragment
+
+from soc.fragment_visitor import FragmentVisitor, order_visitors, run_prepare_hooks
+
+
+class RecordingVisitor(FragmentVisitor):
+    def __init__(self, log, skip=()):
+        super().__init__()
+        self.log = log
+        self.skip = skip
+
+    def enter(self, platform, fragment, name, sames):
+        self.log.append((self.__name__, "enter", name))
+        if name in self.skip:
+            return False
+
+    def leave(self, platform, fragment, name, sames):
+        self.log.append((self.__name__, "leave", name))
+
+    def done(self, platform, top_fragment, sames):
+        self.log.append((self.__name__, "done"))
+
+
+class First(RecordingVisitor):
+    pass
+
+
+class Second(RecordingVisitor):
+    after = ("First",)
+    visit_injected = True
+
+
+def make_tree():
+    top = Fragment()
+    a = Fragment()
+    a.add_subfragment(Fragment(), "a_child")
+    top.add_subfragment(a, "a")
+    top.add_subfragment(Fragment(), "b")
+    return top
+
+
+class TestFragmentVisitor(unittest.TestCase):
+    def test_order(self):
+        first, second = First([]), Second([])
+        self.assertEqual([first, second], order_visitors([second, first]))
+
+    def test_single_traversal(self):
+        log = []
+        top = make_tree()
+        to_inject = [(Fragment(), "injected")]
+
+        def inject_subfragments():
+            injected = list(to_inject)
+            for fragment, name in injected:
+                top.add_subfragment(fragment, name)
+            to_inject.clear()
+            return injected
+
+        timings = run_prepare_hooks(None, top, None, [Second(log), First(log, skip=("a",))], inject_subfragments)
+
+        self.assertEqual([
+            ("First", "enter", None), ("Second", "enter", None),
+            ("First", "enter", "a"), ("Second", "enter", "a"),
+            ("Second", "enter", "a_child"), ("Second", "leave", "a_child"),
+            ("Second", "leave", "a"),
+            ("First", "enter", "b"), ("Second", "enter", "b"),
+            ("First", "leave", "b"), ("Second", "leave", "b"),
+            ("First", "leave", None), ("Second", "leave", None),
+            ("Second", "enter", "injected"), ("Second", "leave", "injected"),
+            ("First", "done"), ("Second", "done"),
+        ], log)
+        self.assertEqual({"First", "Second", "inject_subfragments"}, set(timings))
+
+    def test_function_hooks(self):
+        log = []
+
+        def hook(platform, top_fragment, sames):
+            log.append("hook")
+
+        run_prepare_hooks(None, make_tree(), None, [First(log), hook, Second(log)], lambda: [])
+        self.assertEqual(("First", "done"), log[log.index("hook") - 1])
+        self.assertEqual(("Second", "enter", None), log[log.index("hook") + 1])
@@ -1,37 +1,48 @@
-from functools import reduce
 from warnings import warn
 
 from nmigen import *
-from nmigen.hdl.ast import SignalSet
+from soc.fragment_visitor import FragmentVisitor
 from soc.tracing_elaborate import ElaboratableSames
 
 from cores.csr_bank import CsrBank, _Csr, ControlSignal, StatusSignal, EventReg
 from soc.memorymap import MemoryMap
 
 
-def csr_hook(platform, top_fragment: Fragment, sames: ElaboratableSames):
-    already_done = []
+class CsrHook(FragmentVisitor):
+    def __init__(self):
+        """
+        Collects the CSRs of every Elaboratable into a CsrBank and makes its memorymap the one of the fragment.
+        CSRs are named after the attribute of the Elaboratable that holds them. Only the instance attributes are
+        looked at (and no properties are evaluated); CSRs that are not held by an attribute are found through the
+        drivers of the fragment and named after the signal.
 
-    def inner(fragment):
+        There is deliberately no registry that CSRs join when they are constructed: the constructing Elaboratable is
+        often not the one that holds the CSR (e.g. the current_buffer of the AxiBufferWriter aliases a CSR of a
+        RingBufferAddressStorage), and the pydriver layout that drivers rely on is the one of the holders.
+        """
+        # id(csr) -> csr of all the CSRs that were added to a CsrBank already
+        self.already_done = {}
+
+    def enter(self, platform, fragment: Fragment, name, sames: ElaboratableSames):
         elaboratable = sames.get_elaboratable(fragment)
         if elaboratable:
-            class_members = [(s, getattr(elaboratable, s)) for s in dir(elaboratable)]
-            csr_signals = [(name, member) for name, member in class_members if isinstance(member, _Csr)]
-            fragment_signals = reduce(lambda a, b: a | b, fragment.drivers.values(), SignalSet())
+            # sorted by name to get the same layout as the order of dir()
+            csr_signals = sorted(
+                (attribute, member) for attribute, member in vars(elaboratable).items() if isinstance(member, _Csr)
+            )
+            known = {id(signal) for name, signal in csr_signals}
             csr_signals += [
-                (signal.name, signal) for signal in fragment_signals
-                if isinstance(signal, _Csr)
-                   and signal.name != "$signal"
-                   and not any(signal is cmp_signal for name, cmp_signal in csr_signals)
+                (signal.name, signal) for signals in fragment.drivers.values() for signal in signals
+                if isinstance(signal, _Csr) and id(signal) not in known and signal.name != "$signal"
             ]
             for name, signal in csr_signals:
-                if any(signal is done for done in already_done):
+                if id(signal) in self.already_done:
                     warn("adding a {} ({!r}; defined at {}) to two modules (one is {!r})".format(signal.__class__.__name__, name, signal.src_loc, elaboratable))
-                already_done.append(signal)
+                self.already_done[id(signal)] = signal
             if csr_signals:
                 m = Module()
 
-                csr_bank = m.submodules.csr_bank = CsrBank()
+                csr_bank = m.submodules.csr_bank = CsrBank(packed=platform.pack_csrs)
                 for name, signal in csr_signals:
                     if isinstance(signal, ControlSignal):
                         csr_bank.reg(name, signal)
@@ -46,66 +57,67 @@ def csr_hook(platform, top_fragment: Fragment, sames: ElaboratableSames):
                 fragment.memorymap = csr_bank.memorymap
                 platform.to_inject_subfragments.append((m, "ignore"))
 
-        for subfragment, name in fragment.subfragments:
-            inner(subfragment)
-    inner(top_fragment)
 
+class AddressAssignmentHook(FragmentVisitor):
+    after = ("CsrHook",)
 
-def address_assignment_hook(platform, top_fragment: Fragment, sames: ElaboratableSames):
-    def inner(fragment):
+    def enter(self, platform, fragment: Fragment, name, sames: ElaboratableSames):
+        if name == "ignore":
+            return False
         module = sames.get_module(fragment)
         if hasattr(module, "peripheral"):  # we have the fragment of a marker module for a peripheral
             fragment.memorymap = module.peripheral.memorymap
-            return
-
-        # depth first recursion
-        for sub_fragment, sub_name in fragment.subfragments:
-            if sub_name != "ignore":
-                inner(sub_fragment)
+            return False
 
-        # add everything to the own memorymap
+    def leave(self, platform, fragment: Fragment, name, sames: ElaboratableSames):
+        # add everything to the own memorymap (our subfragments were already visited)
         if not hasattr(fragment, "memorymap"):
             fragment.memorymap = MemoryMap()
         for sub_fragment, sub_name in fragment.subfragments:
             if sub_name != "ignore":
                 assert hasattr(sub_fragment, "memorymap")
                 fragment.memorymap.allocate_subrange(sub_fragment.memorymap, sub_name)
-    inner(top_fragment)
 
-    # prepare and finalize the memorymap
-    top_memorymap: MemoryMap = top_fragment.memorymap
-    top_memorymap.top = True
+    def done(self, platform, top_fragment: Fragment, sames: ElaboratableSames):
+        # prepare and finalize the memorymap
+        top_memorymap: MemoryMap = top_fragment.memorymap
+        top_memorymap.top = True
 
-    assert platform.base_address is not None
-    top_memorymap.place_at = platform.base_address
+        assert platform.base_address is not None
+        top_memorymap.place_at = platform.base_address
 
-    print("memorymap:\n" + "\n".join(
-        "    {}: {!r}".format(k, v) for k, v in top_memorymap.flatten().items()))
-    platform.memorymap = top_memorymap
+        print("memorymap:\n" + "\n".join(
+            "    {}: {!r}".format(k, v) for k, v in top_memorymap.flatten().items()))
+        platform.memorymap = top_memorymap
 
 
-def peripherals_collect_hook(platform, top_fragment: Fragment, sames: ElaboratableSames):
-    platform.peripherals = []
+class PeripheralsCollectHook(FragmentVisitor):
+    after = ("AddressAssignmentHook",)
+    # the CsrBanks that are injected by the CsrHook contain peripherals as well
+    visit_injected = True
 
-    def collect_peripherals(platform, fragment: Fragment, sames):
+    def __init__(self):
+        """Collects all the peripherals of the design in `platform.peripherals`"""
+        self.peripherals = []
+
+    def enter(self, platform, fragment: Fragment, name, sames: ElaboratableSames):
         module = sames.get_module(fragment)
         if module:
             if hasattr(module, "peripheral"):
-                platform.peripherals.append(module.peripheral)
-        for (f, name) in fragment.subfragments:
-            collect_peripherals(platform, f, sames)
+                self.peripherals.append(module.peripheral)
 
-    collect_peripherals(platform, top_fragment, sames)
+    def done(self, platform, top_fragment: Fragment, sames: ElaboratableSames):
+        platform.peripherals = self.peripherals
 
-    ranges = [peripheral.range() for peripheral in platform.peripherals]
+        ranges = [peripheral.range() for peripheral in platform.peripherals]
 
-    def range_overlapping(x, y):
-        if x.start == x.stop or y.start == y.stop:
-            return False
-        return ((x.start < y.stop and x.stop > y.start) or
-                (x.stop > y.start and y.stop > x.start))
+        def range_overlapping(x, y):
+            if x.start == x.stop or y.start == y.stop:
+                return False
+            return ((x.start < y.stop and x.stop > y.start) or
+                    (x.stop > y.start and y.stop > x.start))
 
-    for a in ranges:
-        for b in ranges:
-            if a is not b and range_overlapping(a, b):
-                raise AssertionError("{!r} overlaps with {!r}".format(a, b))
+        for a in ranges:
+            for b in ranges:
+                if a is not b and range_overlapping(a, b):
+                    raise AssertionError("{!r} overlaps with {!r}".format(a, b))
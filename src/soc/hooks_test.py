@@ -0,0 +1,76 @@
+import unittest
+
+from nmigen import *
+
+import soc.pydriver.hardware_proxy
+from cores.axi.axi_endpoint import AxiEndpoint
+from cores.axi.buffer_writer import AxiBufferWriter
+from cores.csr_bank import ControlSignal
+from cores.ring_buffer_address_storage import RingBufferAddressStorage
+from soc.memorymap import Address
+from soc.pydriver.generate import gen_hardware_proxy_python_code
+from soc.soc_platform_test import ConcreteSocPlatform
+from util.sim import SimPlatform
+from util.stream import StreamEndpoint
+
+
+class CameraLikeTop(Elaboratable):
+    """the csr relevant parts of the camera design in experiments/camera.py"""
+    def __init__(self):
+        self.sensor_reset_n = ControlSignal(name='sensor_reset', reset=1)
+
+    def elaborate(self, platform):
+        m = Module()
+        m.d.comb += Signal().eq(self.sensor_reset_n)
+        ring_buffer = RingBufferAddressStorage(buffer_size=0x1200000, n=4)
+        stream = StreamEndpoint(64, is_sink=False, has_last=True)
+        axi = AxiEndpoint(addr_bits=32, data_bits=64, master=False, lite=False, id_bits=12)
+        m.submodules.buffer_writer = AxiBufferWriter(ring_buffer, stream, axi)
+        return m
+
+
+class CsrSocPlatform(ConcreteSocPlatform):
+    base_address = Address(0x4000_0000, 0, 0x1000 * 8)
+
+    def pack_bitstream_fatbitstream(self, builder):
+        pass
+
+
+def camera_memorymap():
+    """the memorymap of the camera like design as it is seen by the pydriver"""
+    platform = CsrSocPlatform(SimPlatform())
+    platform.prepare(CameraLikeTop())
+    return platform.memorymap
+
+
+def pydriver_field_names(proxy_class, prefix=""):
+    """the dotted names of all the fields of a generated proxy class (as they are passed to e.g. `read_many()`)"""
+    for name, member in vars(proxy_class).items():
+        if isinstance(member, property):
+            yield prefix + name
+        elif isinstance(member, type):
+            # this is how the HardwareProxy names the instances of its sub proxies
+            yield from pydriver_field_names(member, prefix + name[1:].lower() + ".")
+
+
+class TestCsrHook(unittest.TestCase):
+    def test_pydriver_layout_of_the_camera(self):
+        namespace = dict(vars(soc.pydriver.hardware_proxy))
+        exec(gen_hardware_proxy_python_code(camera_memorymap(), superclass="HardwareProxy"), namespace)
+        # the layout the pydriver (and e.g. the frame grabber) has relied on: CSRs are named after the attribute that
+        # holds them and live in the namespace of the elaboratable that has this attribute
+        self.assertEqual([
+            "sensor_reset_n",
+            "buffer_writer.buffers_written",
+            "buffer_writer.burst_position",
+            "buffer_writer.current_buffer",
+            "buffer_writer.error",
+            "buffer_writer.state",
+            "buffer_writer.words_written",
+            "buffer_writer.address_generator.current_buffer",
+            "buffer_writer.data_fifo.max_w_level",
+            "buffer_writer.data_fifo.overflow_cnt",
+            "buffer_writer.data_fifo.r_level",
+            "buffer_writer.data_fifo.underrun_cnt",
+            "buffer_writer.data_fifo.w_level",
+        ], list(pydriver_field_names(namespace["Design"])))
@@ -1,6 +1,7 @@
 # TODO: add tests (a lot of them)
 
 import re
+from bisect import bisect_right
 from dataclasses import dataclass
 from math import ceil
 from typing import List
@@ -63,10 +64,10 @@ class Address:
     def collides(self, other_address):
         if (self.bit_len is None) or (other_address.bit_len is None):
             raise ValueError("collision detection is impossible with addresses that dont have a length specified")
-        self_start = self.address * 8
+        self_start = self.address * 8 + self.bit_offset
         self_stop = self_start + self.bit_len
 
-        other_start = other_address.address * 8
+        other_start = other_address.address * 8 + other_address.bit_offset
         other_stop = other_start + other_address.bit_len
 
         if self_start <= other_start:
@@ -86,14 +87,14 @@ class Address:
         if word.collides(self):
             address_shift = word_address - self.address
             if address_shift == 0:  # we are in the start word
-                stop = max(self.bit_len - self.bit_offset, word.bit_len - self.bit_offset)
-                word_range = range(self.bit_offset, stop)
-                signal_range = range(0, stop)
+                n_bits = min(self.bit_len, self.bus_word_width - self.bit_offset)
+                word_range = range(self.bit_offset, self.bit_offset + n_bits)
+                signal_range = range(0, n_bits)
             else:  # we are in some subsequent word
-                stop = max((self.bit_len + self.bit_offset) - self.bus_word_width, self.bus_word_width)
-                word_range = range(0, stop)
                 signal_start = address_shift * 8 - self.bit_offset
-                signal_range = range(signal_start, signal_start + stop)
+                n_bits = min(self.bit_len - signal_start, self.bus_word_width)
+                word_range = range(0, n_bits)
+                signal_range = range(signal_start, signal_start + n_bits)
             return word_range, signal_range
         else:
             return None
@@ -137,13 +138,27 @@ class MemoryMap(MustUse):
         """
         assert bus_word_width % 8 == 0
         self.bus_word_width = bus_word_width
+
+        # the absolute addresses are cached and dropped whenever the location of the memorymap might change
+        self._own_offset = None
+        self._index = None
+        self._children = []
+
         self.place_at: Address = place_at
 
         self.top = top
         self._parent = parent
-        self._inlined_offset = None
+        self._offset_in_parent = None
 
         self.entries: List[MemoryMapRow] = []
+        self._names = set()
+        self._normal_resources: List[MemoryMapRow] = []
+        self._subranges: List[MemoryMapRow] = []
+        # the occupied bit ranges sorted by their start. they never overlap so the stops are sorted as well
+        self._interval_starts: List[int] = []
+        self._interval_stops: List[int] = []
+        self._real_size = 0
+        self._normal_resources_real_size = 0
         self.frozen = False
         self._MustUse__warning = UnusedMemoryMap
 
@@ -157,6 +172,26 @@ class MemoryMap(MustUse):
     @top.setter
     def top(self, val):
         self._MustUse__silence = val
+        self._invalidate()
+
+    @property
+    def place_at(self):
+        return self._place_at
+
+    @place_at.setter
+    def place_at(self, val):
+        self._place_at = val
+        self._invalidate()
+
+    def _invalidate(self):
+        """Drop the cached absolute addresses of this memorymap and all of its children"""
+        # if we have nothing cached, our children cant have anything cached either because they rely on our cache
+        if self._own_offset is None and self._index is None:
+            return
+        self._own_offset = None
+        self._index = None
+        for child in self._children:
+            child._invalidate()
 
     @property
     def bus_word_width_bytes(self):
@@ -164,35 +199,37 @@ class MemoryMap(MustUse):
 
     @property
     def subranges(self):
-        return [row for row in self.entries if isinstance(row.obj, MemoryMap)]
+        return self._subranges
 
     @property
     def normal_resources(self):
-        return [row for row in self.entries if not isinstance(row.obj, MemoryMap)]
+        return self._normal_resources
 
     @property
     def own_offset_normal_resources(self):
         own_offset = self.own_offset
-        own_offset.bit_len = self.normal_resources_byte_len * 8
-        return own_offset
+        return Address(own_offset.address, own_offset.bit_offset, self.normal_resources_byte_len * 8,
+                       own_offset.bus_word_width)
 
     @property
     def own_offset(self) -> Address:
-        if not self.top:
-            if self._parent and self._inlined_offset:
-                return self._parent.own_offset.translate(self._inlined_offset)
-            elif self._parent:
-                own_row_candidates = [row for row in self._parent.subranges if row.obj == self]
-                assert len(own_row_candidates) == 1
-                return self._parent.own_offset.translate(own_row_candidates[0].address)
-            else:
-                raise ValueError("the location of the memorymap cant be determined. "
-                                 "self is not the toplevel memorymap and is not assigned to one")
-        else:
-            if self.place_at:
-                return Address(self.place_at.address, 0, self.byte_len * 8)
+        """
+        The absolute location of the memorymap. It is computed once and cached until the tree changes,
+        so the returned address must not be modified.
+        """
+        if self._own_offset is None:
+            if not self.top:
+                if self._parent:
+                    self._own_offset = self._parent.own_offset.translate(self._offset_in_parent)
+                else:
+                    raise ValueError("the location of the memorymap cant be determined. "
+                                     "self is not the toplevel memorymap and is not assigned to one")
             else:
-                return Address(0, 0, self.byte_len * 8)
+                if self.place_at:
+                    self._own_offset = Address(self.place_at.address, 0, self.byte_len * 8)
+                else:
+                    self._own_offset = Address(0, 0, self.byte_len * 8)
+        return self._own_offset
 
     @property
     def byte_len(self) -> int:
@@ -200,14 +237,8 @@ class MemoryMap(MustUse):
         Calculate the size (based on the resource with the highest address part) of the memorymap
         :return: the size of the memorymap in bytes (aligned to the bus word width)
         """
-        if not self.entries:
-            return 0
-        real_size = max(
-            row.address.address + ceil((row.address.bit_offset + row.address.bit_len) / 8)
-            for row in self.entries
-        )
         # automatically round up to the next word with self.access_with
-        return int(ceil(real_size / self.bus_word_width_bytes) * self.bus_word_width_bytes)
+        return int(ceil(self._real_size / self.bus_word_width_bytes) * self.bus_word_width_bytes)
 
     @property
     def normal_resources_byte_len(self):
@@ -215,14 +246,7 @@ class MemoryMap(MustUse):
         Calculate the size (based on the _normal_ resource with the highest address part) of the memorymap
         :return: the size of the memorymap in bytes (aligned to the bus word width)
         """
-        if not self.entries:
-            return 0
-        real_size = max(
-            row.address.address + ceil((row.address.bit_offset + row.address.bit_len) / 8)
-            for row in self.normal_resources
-        )
-        # automatically round up to the next word with self.access_with
-        return int(ceil(real_size / self.bus_word_width_bytes) * self.bus_word_width_bytes)
+        return int(ceil(self._normal_resources_real_size / self.bus_word_width_bytes) * self.bus_word_width_bytes)
 
     def is_free(self, check_address):
         """
@@ -230,9 +254,17 @@ class MemoryMap(MustUse):
         :param check_address: the address to check.
         :return: A boolean indicating if the address is free
         """
-        for row in self.entries:
-            if check_address.collides(row.address):
-                return False
+        if check_address.bit_len is None:
+            raise ValueError("collision detection is impossible with addresses that dont have a length specified")
+        start = check_address.address * 8 + check_address.bit_offset
+        stop = start + check_address.bit_len
+
+        # only the intervals next to the insertion point can overlap with the checked address
+        i = bisect_right(self._interval_starts, start)
+        if i > 0 and self._interval_stops[i - 1] > start:
+            return False
+        if i < len(self._interval_starts) and self._interval_starts[i] < stop:
+            return False
         return True
 
     def allocate(self, name, writable, bits=None, address=None, obj=None):
@@ -247,7 +279,7 @@ class MemoryMap(MustUse):
         :return: the address of the resource
         """
         assert not self.frozen
-        assert not any(row.name == name for row in self.entries), name
+        assert name not in self._names, name
         assert bits is not None or address is not None
         if address:
             assert ((bits is None) or (
@@ -259,14 +291,61 @@ class MemoryMap(MustUse):
         assert address.bit_len
         if not self.is_free(address):
             raise ValueError("address {!r} is not free".format(address, bits))
-        self.entries.append(MemoryMapRow(name, address, writable, obj))
+        row = MemoryMapRow(name, address, writable, obj)
+        self.entries.append(row)
+        self._names.add(name)
+        self._invalidate()
+
+        start = address.address * 8 + address.bit_offset
+        i = bisect_right(self._interval_starts, start)
+        self._interval_starts.insert(i, start)
+        self._interval_stops.insert(i, start + address.bit_len)
+
+        real_size = address.address + ceil((address.bit_offset + address.bit_len) / 8)
+        self._real_size = max(self._real_size, real_size)
+        if isinstance(obj, MemoryMap):
+            self._subranges.append(row)
+        else:
+            self._normal_resources.append(row)
+            self._normal_resources_real_size = max(self._normal_resources_real_size, real_size)
         return address
 
-    def _added_to(self, parent, inlined_offset=None):
+    def allocate_packed(self, resources):
+        """
+        Allocate many resources at once and pack them densely into bus words with first-fit-decreasing bin packing.
+        Only resources of the same writability share a word. Resources that are wider than a bus word get words of
+        their own. The packed words are appended after the already allocated resources.
+        :param resources: a list of (name, writable, bits, obj) tuples
+        :return: a dict of name -> address of the allocated resources
+        """
+        addresses = {}
+        for writable in (True, False):
+            bins = []  # [word_address, used_bits] of the words that are not full yet
+            group = [resource for resource in resources if resource[1] == writable]
+            for name, _, bits, obj in sorted(group, key=lambda resource: -resource[2]):
+                if bits > self.bus_word_width:
+                    addresses[name] = self.allocate(name, writable, bits=bits, obj=obj)
+                    continue
+                word = next((word for word in bins if self.bus_word_width - word[1] >= bits), None)
+                if word is None:
+                    word = [self.byte_len, 0]
+                    bins.append(word)
+                addresses[name] = self.allocate(
+                    name, writable, address=Address(word[0], word[1], bits, self.bus_word_width), obj=obj
+                )
+                word[1] += bits
+                if word[1] == self.bus_word_width:
+                    bins.remove(word)
+        return addresses
+
+    def _added_to(self, parent, offset_in_parent=None):
         self._MustUse__used = True
         self.frozen = True
         self._parent = parent
-        self._inlined_offset = inlined_offset
+        self._offset_in_parent = offset_in_parent
+        self._invalidate()
+        if parent is not None:
+            parent._children.append(self)
         return self
 
     def allocate_subrange(self, subrange, name=None, place_at=None):
@@ -286,11 +365,13 @@ class MemoryMap(MustUse):
         assert self.place_at is None
         if name is None:  # inline the memorymap
             place_to = Address(self.byte_len, 0, subrange.byte_len * 8)
-            for row in subrange._added_to(self, inlined_offset=place_to).entries:
+            for row in subrange._added_to(self, offset_in_parent=place_to).entries:
                 self.allocate(row.name, row.writable, address=place_to.translate(row.address), obj=row.obj)
             return place_to
         else:  # add the memorymap as a regular resource. this is later interpreted as hierarchical memorymaps
-            return self.allocate(name, True, bits=subrange.byte_len * 8, address=place_at, obj=subrange._added_to(self))
+            address = self.allocate(name, True, bits=subrange.byte_len * 8, address=place_at, obj=subrange)
+            subrange._added_to(self, offset_in_parent=address)
+            return address
 
     def flatten(self, hierarchy_separator="."):
         to_return = {}
@@ -312,14 +393,19 @@ class MemoryMap(MustUse):
         :rtype: Address
         :param obj: the object to look for
         """
+        return self._address_index().get(id(obj))
 
-        for row in self.normal_resources:
-            if row.obj is obj:
-                return self.own_offset.translate(row.address)
-
-        for row in self.subranges:
-            sub_result = row.obj.find_recursive(obj)
-            if sub_result is not None:
-                return sub_result
-
-        return None
+    def _address_index(self):
+        """
+        A dict of id(obj) -> absolute address for all the objects in this memorymap and its children.
+        The objects are kept alive by our rows so their ids stay valid.
+        """
+        if self._index is None:
+            index = {}
+            for row in self.normal_resources:
+                index.setdefault(id(row.obj), self.own_offset.translate(row.address))
+            for row in self.subranges:
+                for key, address in row.obj._address_index().items():
+                    index.setdefault(key, address)
+            self._index = index
+        return self._index
@@ -0,0 +1,112 @@
+import unittest
+
+from soc.memorymap import MemoryMap, Address
+
+
+class CountingList(list):
+    lookups = 0
+
+    def __getitem__(self, item):
+        self.lookups += 1
+        return super().__getitem__(item)
+
+
+class TestMemoryMap(unittest.TestCase):
+    def test_allocate_appends(self):
+        memorymap = MemoryMap()
+        self.assertEqual(0, memorymap.byte_len)
+        self.assertEqual(0x0, memorymap.allocate("a", writable=True, bits=1).address)
+        self.assertEqual(0x4, memorymap.allocate("b", writable=True, bits=32).address)
+        self.assertEqual(0x8, memorymap.allocate("c", writable=False, bits=40).address)
+        self.assertEqual(16, memorymap.byte_len)
+        self.assertEqual(["a", "b", "c"], [row.name for row in memorymap.normal_resources])
+
+    def test_collisions(self):
+        memorymap = MemoryMap()
+        memorymap.allocate("low", writable=True, address=Address(0x0, 0, 8))
+        memorymap.allocate("high", writable=True, address=Address(0x0, 16, 16))
+        self.assertTrue(memorymap.is_free(Address(0x0, 8, 8)))
+        self.assertFalse(memorymap.is_free(Address(0x0, 7, 2)))
+        self.assertFalse(memorymap.is_free(Address(0x0, 15, 2)))
+        self.assertFalse(memorymap.is_free(Address(0x0, 0, 64)))
+        self.assertTrue(memorymap.is_free(Address(0x4, 0, 32)))
+        with self.assertRaises(ValueError):
+            memorymap.allocate("overlapping", writable=True, address=Address(0x0, 4, 8))
+        memorymap.allocate("middle", writable=True, address=Address(0x0, 8, 8))
+
+    def test_bits_of_word(self):
+        self.assertEqual((range(8, 16), range(0, 8)), Address(0x0, 8, 8).bits_of_word(0x0))
+        self.assertIsNone(Address(0x0, 8, 8).bits_of_word(0x4))
+
+        wide = Address(0x4, 24, 40)
+        self.assertIsNone(wide.bits_of_word(0x0))
+        self.assertEqual((range(24, 32), range(0, 8)), wide.bits_of_word(0x4))
+        self.assertEqual((range(0, 32), range(8, 40)), wide.bits_of_word(0x8))
+
+    def test_allocate_packed(self):
+        memorymap = MemoryMap()
+        memorymap.allocate("explicit", writable=True, address=Address(0x0, 0, 32))
+        addresses = memorymap.allocate_packed([
+            ("flag0", False, 1, None),
+            ("counter", False, 32, None),
+            ("flag1", False, 1, None),
+            ("byte", False, 8, None),
+            ("wide", False, 40, None),
+            ("enable", True, 1, None),
+            ("divider", True, 16, None),
+        ])
+        layout = {name: (address.address, address.bit_offset) for name, address in addresses.items()}
+        self.assertEqual({
+            "divider": (0x4, 0), "enable": (0x4, 16),
+            "wide": (0x8, 0), "counter": (0x10, 0), "byte": (0x14, 0), "flag0": (0x14, 8), "flag1": (0x14, 9),
+        }, layout)
+        self.assertEqual(0x18, memorymap.byte_len)
+
+    def test_subranges(self):
+        memorymap = MemoryMap()
+        memorymap.allocate("a", writable=True, bits=32)
+        sub = MemoryMap()
+        sub.allocate("flag", writable=False, bits=1)
+        memorymap.allocate_subrange(sub, "sub")
+        self.assertEqual(["sub"], [row.name for row in memorymap.subranges])
+        self.assertEqual(8, memorymap.byte_len)
+        self.assertEqual(4, memorymap.normal_resources_byte_len)
+
+    def test_find_recursive(self):
+        a, b, c = object(), object(), object()
+        memorymap = MemoryMap()
+        memorymap.allocate("a", writable=True, bits=32, obj=a)
+        sub = MemoryMap()
+        sub.allocate("pad", writable=True, bits=32)
+        sub.allocate("b", writable=False, bits=8, obj=b)
+        memorymap.allocate_subrange(sub, "sub")
+        inlined = MemoryMap()
+        inlined.allocate("c", writable=False, bits=1, obj=c)
+        memorymap.allocate_subrange(inlined)
+        memorymap.top = True
+
+        self.assertEqual(0x0, memorymap.find_recursive(a).address)
+        self.assertEqual(0x8, memorymap.find_recursive(b).address)
+        self.assertEqual(0xc, memorymap.find_recursive(c).address)
+        self.assertIsNone(memorymap.find_recursive(object()))
+        self.assertEqual(0x4, sub.own_offset.address)
+        self.assertEqual(0xc, inlined.own_offset.address)
+
+        # the cached addresses follow the placement of the top level memorymap
+        memorymap.place_at = Address(0x4000_0000, 0, 0x1000 * 8)
+        self.assertEqual(0x4000_0008, memorymap.find_recursive(b).address)
+        self.assertEqual(0x4000_0004, sub.own_offset.address)
+        self.assertEqual(0x4000_000c, inlined.own_offset.address)
+        self.assertEqual(0x4000_0008, memorymap.flatten()["sub.b"].address)
+
+    def test_allocation_scales_linearly(self, n=2000):
+        def lookups(n):
+            """the number of lookups in the sorted intervals (i.e. the comparisons) for allocating n resources"""
+            memorymap = MemoryMap()
+            memorymap._interval_starts, memorymap._interval_stops = CountingList(), CountingList()
+            for i in range(n):
+                memorymap.allocate("csr{}".format(i), writable=bool(i % 2), bits=(i % 32) + 1)
+            return memorymap._interval_starts.lookups + memorymap._interval_stops.lookups
+
+        # the collision checks are binary searches; a quadratic implementation would need 16 times as many
+        self.assertLess(lookups(4 * n), 6 * lookups(n))
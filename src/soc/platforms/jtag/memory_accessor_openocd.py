@@ -1,140 +1,311 @@
-class JTAGAccessor:
-    base = 0
+import atexit
+import os
+import socket
+import subprocess
+import threading
+import time
 
-    def __init__(self, addr="127.0.0.1", port=4444, timeout=1024, debug=False, spawn_server=False, tap_name="dut.tap",
-                 lattice_quirk=True):
-        import socket
-        import os
-        import time
-
-        self.tap_name = tap_name
 
-        if spawn_server:
-            addr = "127.0.0.1"
-            port = 4444
-            os.system('openocd -f openocd.cfg > /dev/null 2>&1 &')
-            time.sleep(0.1)
-            self.tap_name = "xc7.tap"
+class _TelnetConnection:
+    """A connection to the (line based) telnet port of an OpenOCD server."""
+    default_port = 4444
 
-        self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.s.connect((addr, port))
-        self.timeout = timeout
+    def __init__(self, sock, debug=False):
+        self.s = sock
         self.debug = debug
-        self.spawn_server = spawn_server
-        self.lattice_quirk = lattice_quirk
+        self.lock = threading.RLock()
+        self._buffer = b""
+        self._handshake()
 
+    def _handshake(self):
         # skip some strange random shit
-        self._readline(decode=False)
-
-    def __del__(self):
-        if self.spawn_server:
-            self._writeline("shutdown")
-
-    def read(self, addr):
-        # RESET jtag csr
-        self._reset()
-
-        # USER1
-        self._irscan(0x32)
+        self._receive(decode=False)
+
+    def command(self, cmd):
+        return self.pipeline([cmd])[0]
+
+    def pipeline(self, commands):
+        """Send all the commands at once and return their results afterwards."""
+        with self.lock:
+            self.s.sendall("".join(cmd + "\n" for cmd in commands).encode('utf-8'))
+            return [self._receive() for _ in commands]
+
+    def _receive(self, decode=True):
+        # read until the next prompt; everything that is received after it stays buffered for the next response
+        while True:
+            end = self._buffer.find(b'\n> ')
+            if end >= 0:
+                break
+            received = self.s.recv(4096)
+            if not received:
+                raise ConnectionError("the openocd server closed the connection")
+            self._buffer += received
+        buf, self._buffer = self._buffer[:end + 3], self._buffer[end + 3:]
 
-        # READ command
-        self._drscan(1, 0)
-
-        # ADDRESS
-        self._drscan(32, addr)
-
-        # POLL for read completion
-        timeout = self.timeout
-        while self._drscan(1, 0) != "01":
-            if timeout == 0:
-                raise Exception("read poll completion polling timeout")
+        if decode and self.debug:
+            print(buf.decode('utf-8'))
 
-            timeout -= 1
+        buf = buf.rsplit(b'\r\n', 2)[1][1:]
 
-            pass
+        if decode:
+            buf = buf.decode('utf-8')
 
-        # DATA
-        data = self._drscan(32, 0)
+        return buf
 
-        # RESP code
-        resp = int(self._drscan(1, 0))
-        if resp != 0:
-            raise TransactionNotSuccessfulException()
 
-        data = int(data, 16)
-        if self.lattice_quirk:
-            data = data >> 1
+class _TclConnection(_TelnetConnection):
+    """
+    A connection to the Tcl RPC port of an OpenOCD server. Commands and results are terminated by a 0x1a byte;
+    there is no echo and no prompt to parse.
+    """
+    default_port = 6666
+    terminator = b'\x1a'
+
+    def _handshake(self):
+        pass
+
+    def pipeline(self, commands):
+        with self.lock:
+            self.s.sendall(b"".join(cmd.encode('utf-8') + self.terminator for cmd in commands))
+            return [self._receive() for _ in commands]
+
+    def _receive(self, decode=True):
+        while True:
+            end = self._buffer.find(self.terminator)
+            if end >= 0:
+                break
+            received = self.s.recv(4096)
+            if not received:
+                raise ConnectionError("the openocd server closed the connection")
+            self._buffer += received
+        buf, self._buffer = self._buffer[:end], self._buffer[end + 1:]
+
+        if self.debug:
+            print(buf.decode('utf-8'))
 
-        return data
+        return buf.decode('utf-8').strip() if decode else buf
 
-    def write(self, addr, value):
-        # RESET jtag csr
-        self._reset()
 
-        # USER1
-        self._irscan(0x32)
+_transports = {"telnet": _TelnetConnection, "tcl": _TclConnection}
 
-        # WRITE command
-        self._drscan(1, 1)
+# connections are shared between all the accessors that talk to the same server and tap
+_connection_pool = {}
+# the openocd servers that were started by this process
+_servers = {}
 
-        # ADDRESS
-        self._drscan(32, addr)
 
-        # DATA
-        self._drscan(32, value)
+def _connect(addr, port):
+    """Connect to a tcp port or (if `addr` is a path) to a unix socket."""
+    if addr.startswith("/") or addr.startswith("./"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(addr)
+    else:
+        sock = socket.create_connection((addr, port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
 
-        # Poll for write completion
-        timeout = self.timeout
-        while self._drscan(1, 0) != "01":
-            if timeout == 0:
-                raise Exception("write poll completion polling timeout")
 
-            timeout -= 1
-            pass
+def _get_connection(addr, port, tap_name, transport, debug):
+    key = (addr, port, tap_name)
+    if key not in _connection_pool:
+        _connection_pool[key] = _transports[transport](_connect(addr, port), debug=debug)
+    return _connection_pool[key]
 
-        # RESP code
-        resp = int(self._drscan(1, 0))
-        if resp != 0:
-            raise TransactionNotSuccessfulException()
 
+def _ensure_server(config, port, startup_timeout=10, keep_server=False):
+    """
+    Start an openocd server with the given config unless one is listening on `port` already. Instead of sleeping
+    a fixed amount of time, the port is probed until the server accepts connections.
+    """
+    if config in _servers:
         return
 
-    def _writeline(self, message):
-        message += "\n"
-        self.s.send(message.encode('utf-8'))
+    def probe():
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return True
+        except OSError:
+            return False
 
-    def _readline(self, decode=True):
-        buf = b""
+    if probe():  # reuse a server that is already running (e.g. one kept alive by a previous run)
+        return
 
-        while buf[-2:] != b'> ':
-            buf += self.s.recv(1)
+    process = subprocess.Popen(
+        [os.environ.get("OPENOCD", "openocd"), "-f", config],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + startup_timeout
+    while not probe():
+        if process.poll() is not None:
+            raise ConnectionError("openocd exited with code {} during startup".format(process.returncode))
+        if time.monotonic() > deadline:
+            process.kill()
+            raise TimeoutError("openocd did not open port {} within {}s".format(port, startup_timeout))
+        time.sleep(0.01)
+    _servers[config] = (process, port)
+
+    if not keep_server:
+        atexit.register(_shutdown_server, config)
+
+
+def _shutdown_server(config):
+    if config not in _servers:
+        return
+    process, port = _servers.pop(config)
+    for (addr, connection_port, tap_name), connection in list(_connection_pool.items()):
+        if connection_port == port:
+            del _connection_pool[(addr, connection_port, tap_name)]
+            connection.s.close()
+    process.terminate()
+    try:
+        process.wait(timeout=1)
+    except subprocess.TimeoutExpired:
+        process.kill()
 
-        if decode and self.debug:
-            print(buf.decode('utf-8'))
 
-        buf = buf.rsplit(b'\r\n', 2)[1][1:]
-
-        if decode:
-            buf = buf.decode('utf-8')
+class JTAGAccessor:
+    base = 0
 
-        return buf
+    # the completion poll runs on the openocd server: it shifts poll bits until the peripheral is done, so the scans
+    # that follow it are only shifted once the connector has left its wait state and no access is ever issued twice
+    _poll = object()
+    _poll_proc = (
+        'proc jtag_accessor_poll {tap timeout} { '
+        'for {set i 0} {$i <= $timeout} {incr i} { if {[drscan $tap 1 0] == "01"} { return 01 } }; '
+        'return 00 }'
+    )
+
+    def __init__(self, addr="127.0.0.1", port=None, timeout=1024, debug=False, spawn_server=False, tap_name="dut.tap",
+                 lattice_quirk=True, words_per_command=8, transport="telnet", openocd_config="openocd.cfg",
+                 keep_server=False):
+        """
+        Access the CSRs of a design with a JTAGPeripheralConnector via an OpenOCD server.
+        Transactions are pipelined: a whole transaction (or a chunk of a burst) is sent as a single Tcl command and
+        all the chunks of a burst are sent before the responses are read. A slow peripheral is polled in place by a
+        Tcl proc on the server, so every word is accessed exactly once.
+        Connections are pooled so that multiple accessors for the same server and tap share one connection.
+        The accessor speaks the protocol with the two bit command (read/write and burst); bitstreams with a
+        JTAGPeripheralConnector that only knows the one bit command are not compatible.
+
+        :param addr: the host of the openocd server or the path of a unix socket
+        :param port: the port of the openocd server; defaults to the default port of the transport
+        :param timeout: how often the completion of a word is polled before the transaction is considered failed
+        :param transport: "telnet" for the telnet port or "tcl" for the Tcl RPC port which has no line discipline
+        :param spawn_server: start an openocd server with `openocd_config` unless one is running already
+        :param keep_server: do not shut down a spawned server when the python process exits
+                            so that the next run can reuse it
+        :param words_per_command: how many words of a burst are packed into a single Tcl command. This is limited by
+                                  the line length that the OpenOCD telnet server accepts.
+        """
+        self.tap_name = tap_name
 
-    def _writecmd(self, cmd):
-        # print(cmd)
-        self._writeline(cmd)
-        ret = self._readline()
-        # print(ret)
-        return ret
+        if port is None:
+            port = _transports[transport].default_port
 
-    def _irscan(self, instruction):
-        return self._writecmd('irscan {} {}'.format(self.tap_name, instruction))
+        if spawn_server:
+            addr = "127.0.0.1"
+            _ensure_server(openocd_config, port, keep_server=keep_server)
+            self.tap_name = "xc7.tap"
 
-    def _reset(self):
-        return self._writecmd('reset halt')
+        self.timeout = timeout
+        self.lattice_quirk = lattice_quirk
+        self.words_per_command = words_per_command
+        self._connection = _get_connection(addr, port, self.tap_name, transport, debug)
+        self._connection.command(self._poll_proc)
 
-    def _drscan(self, len, value):
-        return self._writecmd('drscan {} {} {}'.format(self.tap_name, len, value))
+    def read(self, addr):
+        return self.read_burst(addr, 1)[0]
 
+    def write(self, addr, value):
+        self.write_burst(addr, [value])
+
+    def read_burst(self, addr, n_words):
+        """
+        Read `n_words` consecutive words starting at `addr` using the burst mode of the JTAGPeripheralConnector.
+        The command and the address are only shifted once for the whole burst.
+        """
+        # the connection is shared with other accessors; the whole burst must not be interleaved with their
+        # transactions
+        with self._connection.lock:
+            # READ command, ADDRESS, then POLL for completion, DATA, RESP code for every word
+            first_word = [(2, self._cmd(write=False, burst=n_words > 1)), (32, addr)]
+            results = self._run_pipelined([
+                (first_word if i == 0 else []) + [self._poll, (32, 0), (1, 0)] for i in range(n_words)
+            ])
+            words = []
+            for result in results:
+                poll, data, resp = result[-3:]
+                if poll != "01":
+                    raise Exception("read poll completion polling timeout")
+                if int(resp) != 0:
+                    raise TransactionNotSuccessfulException()
+                words.append(self._decode_data(data))
+            return words
+
+    def write_burst(self, addr, values):
+        """
+        Write the words of `values` to consecutive addresses starting at `addr` using the burst mode of the
+        JTAGPeripheralConnector. The command and the address are only shifted once for the whole burst.
+        """
+        values = list(values)
+
+        with self._connection.lock:
+            # WRITE command, ADDRESS, then DATA, POLL for completion, RESP code for every word
+            first_word = [(2, self._cmd(write=True, burst=len(values) > 1)), (32, addr)]
+            results = self._run_pipelined([
+                (first_word if i == 0 else []) + [(32, value), self._poll, (1, 0)] for i, value in enumerate(values)
+            ])
+            for result in results:
+                poll, resp = result[-2:]
+                if poll != "01":
+                    raise Exception("write poll completion polling timeout")
+                if int(resp) != 0:
+                    raise TransactionNotSuccessfulException()
+
+    # the same interface as the bulk methods of the DevMemAccessor
+    def read_block(self, offset, n_words):
+        return self.read_burst(offset, n_words)
+
+    def write_block(self, offset, data):
+        self.write_burst(offset, data)
+
+    def _run_pipelined(self, transactions):
+        """
+        Run the drscans of the given transactions (a list of lists of (bits, value) tuples or `self._poll`) and return
+        their results grouped like the input. Only a single reset & irscan is done in the beginning.
+        """
+        def scan(scan):
+            if scan is self._poll:
+                return "[jtag_accessor_poll {} {}]".format(self.tap_name, self.timeout)
+            return "[drscan {} {} {}]".format(self.tap_name, *scan)
+
+        commands = []
+        for start in range(0, len(transactions), self.words_per_command):
+            chunk = transactions[start:start + self.words_per_command]
+            scans = " ".join(scan(s) for transaction in chunk for s in transaction)
+            prefix = "reset halt; irscan {} 0x32; ".format(self.tap_name) if start == 0 else ""
+            commands.append("{}list {}".format(prefix, scans))
+
+        # send everything before reading the first response to avoid paying the round trip time for every chunk
+        results = []
+        for response in self._connection.pipeline(commands):
+            results += response.split()
+
+        grouped = []
+        for transaction in transactions:
+            grouped.append(results[:len(transaction)])
+            results = results[len(transaction):]
+        return grouped
+
+    @staticmethod
+    def _cmd(write, burst):
+        return int(write) | (int(burst) << 1)
+
+    def _decode_data(self, data):
+        data = int(data, 16)
+        if self.lattice_quirk:
+            data = data >> 1
+        return data
 
 MemoryAccessor = JTAGAccessor
 
@@ -0,0 +1,317 @@
+# A stand-in for an OpenOCD server with a design that uses the JTAGPeripheralConnector for testing and benchmarking
+# the JTAGAccessor without hardware
+
+import socketserver
+import threading
+import time
+
+
+class RegisterModel:
+    def __init__(self, n_words=1024):
+        """
+        A trivial backend for the MockOpenOCDServer. Backends have the same interface as memory accessors so that
+        anything with `read(addr)` and `write(addr, value)` (e.g. a simulation) can be put behind the mock server.
+        Accesses that raise an exception are answered with the error status.
+        """
+        self.words = [0] * n_words
+        # every access in the order the peripheral got it, e.g. ("read", 0x10) or ("write", 0x10, 42)
+        self.accesses = []
+
+    def read(self, addr):
+        self.accesses.append(("read", addr))
+        assert addr % 4 == 0
+        return self.words[addr // 4]
+
+    def write(self, addr, value):
+        self.accesses.append(("write", addr, value))
+        assert addr % 4 == 0
+        self.words[addr // 4] = value
+
+
+class ConnectorModel:
+    def __init__(self, backend, wait_polls=0):
+        """
+        A bit level model of the protocol of the JTAGPeripheralConnector.
+
+        :param backend: the peripheral that is accessed
+        :param wait_polls: how many completion polls are answered with "not done" before a read or write completes
+        """
+        self.backend = backend
+        self.wait_polls = wait_polls
+        self.reset()
+
+    def reset(self):
+        self.state = "CMD"
+        self.bit = 0
+        self.write = False
+        self.burst = False
+        self.addr = 0
+        self.data = 0
+        self.status = 0
+        self.polls = 0
+
+    def shift(self, tdi):
+        """Shift one bit and return tdo"""
+        tdo = 0
+        if self.state == "CMD":
+            self.write = bool(tdi)
+            self.state = "CMD_BURST"
+        elif self.state == "CMD_BURST":
+            self.burst = bool(tdi)
+            self.state, self.bit, self.addr = "ADDR", 0, 0
+        elif self.state == "ADDR":
+            self.addr |= tdi << self.bit
+            self.bit += 1
+            if self.bit == 32:
+                self._next_word()
+        elif self.state in ("READ_WAIT", "WRITE_WAIT"):
+            if self.polls >= self.wait_polls:
+                self._execute()
+                tdo = 1
+                self.state, self.bit = ("WRITE_STATUS", 0) if self.write else ("READ", 0)
+            self.polls += 1
+        elif self.state == "READ":
+            tdo = (self.data >> self.bit) & 1
+            self.bit += 1
+            if self.bit == 32:
+                self.state = "READ_STATUS"
+        elif self.state == "WRITE":
+            self.data |= tdi << self.bit
+            self.bit += 1
+            if self.bit == 32:
+                self.state, self.polls = "WRITE_WAIT", 0
+        elif self.state in ("READ_STATUS", "WRITE_STATUS"):
+            tdo = self.status
+            if self.burst:
+                self.addr += 4
+                self._next_word()
+            else:
+                self.state = "CMD"
+        return tdo
+
+    def _next_word(self):
+        if self.write:
+            self.state, self.bit, self.data = "WRITE", 0, 0
+        else:
+            self.state, self.polls = "READ_WAIT", 0
+
+    def _execute(self):
+        try:
+            if self.write:
+                self.backend.write(self.addr, self.data)
+            else:
+                self.data = self.backend.read(self.addr)
+            self.status = 0
+        except Exception:
+            self.status = 1
+
+
+class _Shutdown(Exception):
+    pass
+
+
+class MockOpenOCDServer:
+    def __init__(self, backend, transport="telnet", port=0, tap_name="dut.tap", latency=0.0, scan_latency=0.0,
+                 wait_polls=0):
+        """
+        A tcp server that speaks the subset of the OpenOCD telnet and Tcl RPC protocols that the JTAGAccessor uses
+        (`reset halt`, `irscan`, `drscan`, `shutdown`, `list [...]`, `{...}` quoting and `;` separated commands).
+        The drscans are run against a ConnectorModel when USER1 (0x32) is selected. Procs are not interpreted; the
+        completion poll proc of the accessor is implemented natively once it was defined. Use it as a context manager.
+
+        :param backend: the peripheral behind the connector (e.g. a RegisterModel)
+        :param transport: "telnet" or "tcl"
+        :param port: the port to listen on. 0 selects a free port which is available as `self.port` afterwards
+        :param latency: the time in seconds every command line (i.e. every round trip) takes
+        :param scan_latency: the time in seconds every drscan takes
+        :param wait_polls: see ConnectorModel
+        """
+        self.transport = transport
+        self.tap_name = tap_name
+        self.latency = latency
+        self.scan_latency = scan_latency
+        self.connector = ConnectorModel(backend, wait_polls)
+
+        self._lock = threading.Lock()
+        self._ir = None
+        self._procs = set()
+        self.command_lines = 0
+        self.scans = 0
+
+        mock = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                mock._handle(self.request)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+    def _handle(self, sock):
+        telnet = self.transport == "telnet"
+        terminator = b"\n" if telnet else b"\x1a"
+        if telnet:
+            sock.sendall(b"Open On-Chip Debugger\r\n> ")
+
+        buffer = b""
+        while True:
+            received = sock.recv(4096)
+            if not received:
+                return
+            buffer += received
+            while terminator in buffer:
+                line, buffer = buffer.split(terminator, 1)
+                line = line.decode("utf-8").strip("\r")
+                try:
+                    result = self.evaluate(line)
+                    shutdown = False
+                except _Shutdown:
+                    result, shutdown = "shutdown command invoked", True
+
+                if telnet:
+                    # the command is echoed; the accessor drops the first character of the result line
+                    response = line + "\r\n" + (" " + result + "\r\n" if result else "") + "> "
+                    sock.sendall(response.encode("utf-8"))
+                else:
+                    sock.sendall(result.encode("utf-8") + b"\x1a")
+
+                if shutdown:
+                    threading.Thread(target=self._server.shutdown, daemon=True).start()
+                    return
+
+    def evaluate(self, script):
+        """Evaluate a line of (a very small subset of) Tcl and return the result of the last command"""
+        with self._lock:
+            self.command_lines += 1
+            if self.latency:
+                time.sleep(self.latency)
+            result = ""
+            for command in _split_commands(script):
+                result = self._evaluate_command(command)
+            return result
+
+    def _evaluate_command(self, command):
+        words = self._substitute(command)
+        if not words:
+            return ""
+        name, args = words[0], words[1:]
+        if name == "list":
+            return " ".join(arg if arg else "{}" for arg in args)
+        elif name == "reset":
+            self._ir = None
+            self.connector.reset()
+            return ""
+        elif name == "irscan":
+            self._check_tap(args[0])
+            self._ir = int(args[1], 0)
+            return ""
+        elif name == "drscan":
+            self._check_tap(args[0])
+            return self._drscan(int(args[1], 0), int(args[2], 0))
+        elif name == "proc":
+            if args[0] not in self._native_procs:
+                return 'unsupported proc "{}"'.format(args[0])
+            self._procs.add(args[0])
+            return ""
+        elif name in self._procs:
+            return self._native_procs[name](self, *args)
+        elif name == "shutdown":
+            raise _Shutdown()
+        else:
+            return 'invalid command name "{}"'.format(name)
+
+    def _check_tap(self, tap_name):
+        if tap_name != self.tap_name:
+            raise ValueError("unknown tap {}".format(tap_name))
+
+    def _drscan(self, bits, value):
+        self.scans += 1
+        if self.scan_latency:
+            time.sleep(self.scan_latency)
+        result = 0
+        if self._ir == 0x32:
+            for i in range(bits):  # openocd shifts the lsb first
+                result |= self.connector.shift((value >> i) & 1) << i
+        return "{:0{}x}".format(result, (bits + 7) // 8 * 2)
+
+    def _poll(self, tap_name, timeout):
+        """jtag_accessor_poll: shift poll bits until the connector answers with done or `timeout` polls failed"""
+        self._check_tap(tap_name)
+        for _ in range(int(timeout) + 1):
+            if self._drscan(1, 0) == "01":
+                return "01"
+        return "00"
+
+    _native_procs = {"jtag_accessor_poll": _poll}
+
+    def _substitute(self, command):
+        """Split a command into words and replace [bracketed] commands by their result"""
+        words = []
+        word = None
+        i = 0
+        while i < len(command):
+            c = command[i]
+            if c.isspace():
+                if word is not None:
+                    words.append(word)
+                    word = None
+            elif c == "[":
+                end = _matching_bracket(command, i)
+                word = (word or "") + self._evaluate_command(command[i + 1:end])
+                i = end
+            elif c == "{" and word is None:
+                end = _matching_bracket(command, i, "{", "}")
+                word = command[i + 1:end]
+                i = end
+            else:
+                word = (word or "") + c
+            i += 1
+        if word is not None:
+            words.append(word)
+        return words
+
+
+def _matching_bracket(string, start, opening="[", closing="]"):
+    depth = 0
+    for i in range(start, len(string)):
+        if string[i] == opening:
+            depth += 1
+        elif string[i] == closing:
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("unbalanced brackets in {!r}".format(string))
+
+
+def _split_commands(script):
+    commands = []
+    depth = 0
+    current = ""
+    for c in script:
+        if c in "[{":
+            depth += 1
+        elif c in "]}":
+            depth -= 1
+        if c in ";\n" and depth == 0:
+            commands.append(current)
+            current = ""
+        else:
+            current += c
+    commands.append(current)
+    return [command for command in commands if command.strip()]
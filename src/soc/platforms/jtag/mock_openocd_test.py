@@ -0,0 +1,67 @@
+import unittest
+
+from soc.platforms.jtag.memory_accessor_openocd import JTAGAccessor, TransactionNotSuccessfulException
+from soc.platforms.jtag.mock_openocd import MockOpenOCDServer, RegisterModel
+
+
+class TestMockOpenOCD(unittest.TestCase):
+    def test_read_write(self):
+        for transport in ["telnet", "tcl"]:
+            with MockOpenOCDServer(RegisterModel(), transport=transport) as server:
+                accessor = JTAGAccessor(port=server.port, transport=transport, lattice_quirk=False)
+                accessor.write(0x10, 0xdeadbeef)
+                self.assertEqual(0xdeadbeef, accessor.read(0x10))
+
+                accessor.write_burst(0x100, range(20))
+                self.assertEqual(list(range(20)), accessor.read_burst(0x100, 20))
+                self.assertEqual(19, accessor.read(0x100 + 19 * 4))
+
+    def test_slow_peripheral(self):
+        registers = RegisterModel()
+        with MockOpenOCDServer(registers, wait_polls=3) as server:
+            accessor = JTAGAccessor(port=server.port, lattice_quirk=False)
+            # the completion is polled in place, so a slow access is not issued a second time
+            accessor.write(0x8, 5)
+            self.assertEqual(5, accessor.read(0x8))
+            self.assertEqual([("write", 0x8, 5), ("read", 0x8)], registers.accesses)
+
+            # the scans of the following words must neither be shifted into a connector that still waits nor be
+            # repeated afterwards; every word is accessed exactly once at its own address
+            del registers.accesses[:]
+            accessor.write_burst(0x10, [1, 2, 3])
+            self.assertEqual([1, 2, 3], accessor.read_burst(0x10, 3))
+            self.assertEqual([
+                ("write", 0x10, 1), ("write", 0x14, 2), ("write", 0x18, 3),
+                ("read", 0x10), ("read", 0x14), ("read", 0x18),
+            ], registers.accesses)
+            self.assertEqual(0, registers.words[0x1c // 4])
+
+    def test_poll_timeout(self):
+        with MockOpenOCDServer(RegisterModel(), wait_polls=10) as server:
+            accessor = JTAGAccessor(port=server.port, lattice_quirk=False, timeout=3)
+            with self.assertRaises(Exception):
+                accessor.read(0x0)
+
+    def test_error_status(self):
+        with MockOpenOCDServer(RegisterModel(n_words=4)) as server:
+            accessor = JTAGAccessor(port=server.port, lattice_quirk=False)
+            with self.assertRaises(TransactionNotSuccessfulException):
+                accessor.read(0x100)
+
+
+class TestJTAGAccessorCommands(unittest.TestCase):
+    def test_commands_and_scans(self, n_words=64):
+        with MockOpenOCDServer(RegisterModel()) as server:
+            accessor = JTAGAccessor(port=server.port, lattice_quirk=False, words_per_command=8)
+
+            def count(fn):
+                """the number of command lines the server evaluated and drscans it did while running fn"""
+                lines, scans = server.command_lines, server.scans
+                fn()
+                return server.command_lines - lines, server.scans - scans
+
+            # a single transaction is a single command line
+            self.assertEqual((n_words, 5 * n_words), count(lambda: [accessor.read(i * 4) for i in range(n_words)]))
+            # a burst packs words_per_command words into every command line and shifts the command and address once
+            self.assertEqual((n_words // 8, 2 + 3 * n_words), count(lambda: accessor.read_burst(0, n_words)))
+            self.assertEqual((n_words // 8, 2 + 3 * n_words), count(lambda: accessor.write_burst(0, range(n_words))))
@@ -1,8 +1,14 @@
+import array
 import mmap
 import os
 import struct
 from math import ceil
 
+try:
+    import numpy
+except ImportError:  # the bulk methods fall back to memoryviews / arrays
+    numpy = None
+
 
 class DevMemAccessor:
     word = 4
@@ -25,12 +31,54 @@ class DevMemAccessor:
         os.close(self.f)
 
     def read(self, offset):
-        self.mem.seek(offset)
-        return struct.unpack('I', self.mem.read(4))[0]
+        return struct.unpack_from('I', self.mem, offset)[0]
 
     def write(self, offset, to_write):
-        self.mem.seek(offset)
-        return self.mem.write(struct.pack('I', to_write))
+        struct.pack_into('I', self.mem, offset, to_write)
+
+    def _check_block(self, offset, length):
+        if offset % self.word != 0 or length % self.word != 0:
+            raise ValueError("blocks have to be word aligned (offset 0x{:x}, length {})".format(offset, length))
+        if offset < 0 or length < 0 or offset + length > len(self.mem):
+            raise IndexError("the block 0x{:x}..0x{:x} is outside of the mapped memory (0x{:x} bytes)".format(
+                offset, offset + length, len(self.mem)))
+
+    def view(self, offset, length):
+        """
+        Get a zero-copy view of the mapped memory. Reads and writes of the view go directly to the hardware.
+        :param offset: the start of the view in bytes relative to the base address. must be word aligned.
+        :param length: the length of the view in bytes. must be a multiple of the word size.
+        :return: a numpy uint32 array if numpy is available, otherwise a memoryview of unsigned ints
+        :raises ValueError: if the view is not word aligned
+        :raises IndexError: if the view is not inside of the mapped memory
+        """
+        self._check_block(offset, length)
+        view = memoryview(self.mem)[offset:offset + length]
+        if numpy is not None:
+            return numpy.frombuffer(view, dtype=numpy.uint32)
+        return view.cast('I')
+
+    def read_block(self, offset, n_words):
+        """
+        Copy a block of words out of the mapped memory.
+        :return: a numpy uint32 array if numpy is available, otherwise an array.array of unsigned ints
+        """
+        view = self.view(offset, n_words * self.word)
+        if numpy is not None:
+            return view.copy()
+        return array.array('I', view)
+
+    def write_block(self, offset, data):
+        """
+        Write a block of words (a numpy array, an array.array or a list of ints) to the mapped memory.
+        """
+        if numpy is not None:
+            data = numpy.ascontiguousarray(data, dtype=numpy.uint32)
+        elif not isinstance(data, array.array):
+            data = array.array('I', data)
+        data = memoryview(data).cast('B')
+        self._check_block(offset, len(data))
+        self.mem[offset:offset + len(data)] = data
 
 
 MemoryAccessor = DevMemAccessor
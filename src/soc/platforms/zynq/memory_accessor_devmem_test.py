@@ -0,0 +1,47 @@
+import mmap
+import unittest
+from tempfile import NamedTemporaryFile
+
+from soc.platforms.zynq.memory_accessor_devmem import DevMemAccessor
+
+
+class TestDevMemAccessor(unittest.TestCase):
+    def setUp(self):
+        self.file = NamedTemporaryFile()
+        self.file.write(bytes(2 * mmap.PAGESIZE))
+        self.file.flush()
+        self.accessor = DevMemAccessor(base_addr=0, bytes=2 * mmap.PAGESIZE, filename=self.file.name)
+
+    def tearDown(self):
+        del self.accessor
+        self.file.close()
+
+    def test_read_write(self):
+        self.accessor.write(0x10, 0xdeadbeef)
+        self.assertEqual(0xdeadbeef, self.accessor.read(0x10))
+        self.assertEqual(0, self.accessor.read(0x14))
+
+    def test_blocks(self, n_words=1000):
+        self.accessor.write_block(0x100, list(range(n_words)))
+        self.assertEqual(list(range(n_words)), list(self.accessor.read_block(0x100, n_words)))
+        self.assertEqual(n_words - 1, self.accessor.read(0x100 + (n_words - 1) * 4))
+
+    def test_view_is_zero_copy(self):
+        view = self.accessor.view(0x40, 16)
+        self.accessor.write(0x44, 42)
+        self.assertEqual(42, view[1])
+        view[2] = 23
+        self.assertEqual(23, self.accessor.read(0x48))
+
+    def test_block_errors(self):
+        with self.assertRaises(ValueError):
+            self.accessor.view(0x2, 16)
+        with self.assertRaises(ValueError):
+            self.accessor.read_block(0x2, 1)
+        with self.assertRaises(IndexError):
+            self.accessor.view(2 * mmap.PAGESIZE - 4, 8)
+        with self.assertRaises(IndexError):
+            self.accessor.read_block(-4, 1)
+        with self.assertRaises(IndexError):
+            self.accessor.write_block(2 * mmap.PAGESIZE - 4, [1, 2])
+        self.assertEqual(0, self.accessor.read(2 * mmap.PAGESIZE - 4))
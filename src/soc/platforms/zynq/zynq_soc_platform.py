@@ -39,8 +39,9 @@ class ZynqSocPlatform(SocPlatform):
                 )
 
                 for peripheral in platform.peripherals:
-                    controller = DomainRenamer("axi_lite")(AxiLitePeripheralConnector(peripheral))
-                    m.d.comb += interconnect.get_port().connect_slave(controller.axi)
+                    # the interconnect decodes the addresses, so the connectors do not need to check them again
+                    controller = DomainRenamer("axi_lite")(AxiLitePeripheralConnector(peripheral, check_range=False))
+                    m.d.comb += interconnect.get_port(peripheral.range()).connect_slave(controller.axi)
                     m.submodules += controller
                 platform.to_inject_subfragments.append((m, "axi_lite"))
         self.prepare_hooks.append(peripherals_connect_hook)
@@ -0,0 +1,122 @@
+# Host side (pydriver) consumer for the frames that an AxiBufferWriter writes into a RingBufferAddressStorage
+
+from time import sleep
+
+import numpy
+
+
+def unpack_pixels(words, bits_per_pixel=12, pixels_per_word=4):
+    """
+    Unpack pixels that are packed into (64 bit) bus words. The pixel of the lowest bits comes first.
+    :param words: a numpy array of the raw words with an unsigned dtype of the bus word width
+    :return: a flat numpy uint16 array of pixels
+    """
+    shifts = numpy.arange(pixels_per_word, dtype=words.dtype) * words.dtype.type(bits_per_pixel)
+    mask = words.dtype.type((1 << bits_per_pixel) - 1)
+    return ((words[:, numpy.newaxis] >> shifts) & mask).astype(numpy.uint16).reshape(-1)
+
+
+class FrameGrabber:
+    def __init__(
+            self, design, memory, buffer_base_list, buffer_size, width, height,
+            current_buffer="buffer_writer.current_buffer", buffers_written="buffer_writer.buffers_written",
+            bits_per_pixel=12, pixels_per_word=4, word_bytes=8,
+    ):
+        """
+        Grabs the frames that an AxiBufferWriter writes into a ring of buffers.
+
+        :param design: the pydriver HardwareProxy of the design
+        :param memory: a memory accessor with a `view()` method that covers all the buffers
+                       (e.g. a DevMemAccessor of /dev/mem or a file backed DevMemAccessor for testing)
+        :param buffer_base_list: the (absolute) base addresses of the buffers of the RingBufferAddressStorage
+        :param buffer_size: the size of each buffer in bytes
+        :param width: the width of a frame in pixels
+        :param height: the height of a frame in pixels
+        :param current_buffer: the (dotted) name of the field holding the buffer that is currently written
+        :param buffers_written: the (dotted) name of the field counting the completely written buffers
+        """
+        self.design = design
+        self.memory = memory
+        self.buffer_base_list = list(buffer_base_list)
+        self.buffer_size = buffer_size
+        self.current_buffer = current_buffer
+        self.buffers_written = buffers_written
+
+        self.width = width
+        self.height = height
+        self.bits_per_pixel = bits_per_pixel
+        self.pixels_per_word = pixels_per_word
+        self.word_bytes = word_bytes
+
+        assert (width * height) % pixels_per_word == 0
+        self.frame_bytes = (width * height) // pixels_per_word * word_bytes
+        assert self.frame_bytes <= buffer_size
+
+        self.dropped = 0
+
+    def _state(self):
+        state = self.design.read_many([self.current_buffer, self.buffers_written])
+        return state[self.current_buffer], state[self.buffers_written]
+
+    def latest_buffer(self, current_buffer):
+        """The index of the most recently completed buffer (the one before the buffer that is currently written)"""
+        return (current_buffer - 1) % len(self.buffer_base_list)
+
+    def raw_view(self, buffer):
+        """A zero-copy uint32 view of the frame data of the given buffer"""
+        return self.memory.view(self.buffer_base_list[buffer] - self.memory.base, self.frame_bytes)
+
+    def read_frame(self, buffer):
+        """Unpack the frame of the given buffer into a (height, width) uint16 numpy array"""
+        words = self.raw_view(buffer)
+        if self.word_bytes == 8:
+            words = words.view(numpy.uint64)
+        pixels = unpack_pixels(words, self.bits_per_pixel, self.pixels_per_word)
+        return pixels.reshape(self.height, self.width)
+
+    def grab(self):
+        """Grab the most recently completed frame"""
+        current_buffer, _ = self._state()
+        return self.read_frame(self.latest_buffer(current_buffer))
+
+    def frames(self, n=None):
+        """
+        Yield the most recently completed frame every time it is requested (frames might be repeated or skipped).
+        :param n: the number of frames to yield; infinite if None
+        """
+        i = 0
+        while n is None or i < n:
+            yield self.grab()
+            i += 1
+
+    def stream(self, n=None, poll_interval=0.0005):
+        """
+        Yield every frame that is completed after calling this method exactly once in the order they were written.
+        Gaps in the `buffers_written` counter (i.e. frames that were overwritten before we could read them) are
+        counted in `self.dropped`.
+        :param n: the number of frames to yield; infinite if None
+        :param poll_interval: the time to sleep between polls of the writer state in seconds
+        :return: a generator of frames
+        """
+        _, last_written = self._state()
+        return self._stream(last_written, n, poll_interval)
+
+    def _stream(self, last_written, n, poll_interval):
+        n_buffers = len(self.buffer_base_list)
+        yielded = 0
+        while n is None or yielded < n:
+            current_buffer, written = self._state()
+            new_frames = (written - last_written) & 0xffffffff
+            if not new_frames:
+                sleep(poll_interval)
+                continue
+
+            # only the n_buffers - 1 newest frames are still intact; the remaining ones are overwritten already
+            lost = max(0, new_frames - (n_buffers - 1))
+            self.dropped += lost
+            for age in reversed(range(new_frames - lost)):
+                yield self.read_frame((current_buffer - 1 - age) % n_buffers)
+                yielded += 1
+                if n is not None and yielded >= n:
+                    break
+            last_written = written
@@ -0,0 +1,104 @@
+import mmap
+import unittest
+from tempfile import NamedTemporaryFile
+
+import numpy
+
+from soc.hooks_test import camera_memorymap
+from soc.platforms.zynq.memory_accessor_devmem import DevMemAccessor
+from soc.pydriver.frame_grabber import FrameGrabber, unpack_pixels
+from soc.pydriver.sim_accessor import SimAccessor
+from soc.pydriver.sim_accessor_test import design_class
+
+
+class FakeWriter:
+    def __init__(self):
+        self.state = {"buffer_writer.current_buffer": 0, "buffer_writer.buffers_written": 0}
+        self.polls = 0
+
+    def read_many(self, names):
+        self.polls += 1
+        return {name: self.state[name] for name in names}
+
+
+def pack_pixels(pixels, bits_per_pixel=12, pixels_per_word=4):
+    words = numpy.zeros(len(pixels) // pixels_per_word, dtype=numpy.uint64)
+    for i in range(pixels_per_word):
+        words |= pixels[i::pixels_per_word].astype(numpy.uint64) << numpy.uint64(i * bits_per_pixel)
+    return words
+
+
+class TestFrameGrabber(unittest.TestCase):
+    width, height, n_buffers = 64, 16, 4
+    buffer_size = mmap.PAGESIZE
+
+    def setUp(self):
+        self.file = NamedTemporaryFile()
+        self.file.write(bytes(self.n_buffers * self.buffer_size))
+        self.file.flush()
+        self.memory = DevMemAccessor(base_addr=0, bytes=self.n_buffers * self.buffer_size, filename=self.file.name)
+        self.writer = FakeWriter()
+        self.grabber = FrameGrabber(
+            self.writer, self.memory, [i * self.buffer_size for i in range(self.n_buffers)], self.buffer_size,
+            width=self.width, height=self.height
+        )
+
+    def tearDown(self):
+        del self.grabber, self.memory
+        self.file.close()
+
+    def write_frame(self, value_offset):
+        """emulate the AxiBufferWriter: write a frame to the current buffer and advance to the next one"""
+        pixels = (numpy.arange(self.width * self.height) + value_offset) % 4096
+        current = self.writer.state["buffer_writer.current_buffer"]
+        self.memory.write_block(current * self.buffer_size, pack_pixels(pixels).view(numpy.uint32))
+        self.writer.state["buffer_writer.current_buffer"] = (current + 1) % self.n_buffers
+        self.writer.state["buffer_writer.buffers_written"] += 1
+        return pixels.reshape(self.height, self.width)
+
+    def test_unpack(self):
+        pixels = numpy.arange(64, dtype=numpy.uint16) * 60
+        self.assertTrue(numpy.array_equal(pixels, unpack_pixels(pack_pixels(pixels))))
+
+    def test_grab_latest(self):
+        self.write_frame(0)
+        gold = self.write_frame(1000)
+        self.assertTrue(numpy.array_equal(gold, self.grabber.grab()))
+        self.assertEqual(1, self.writer.polls)
+
+    def test_generated_pydriver(self):
+        # the default field names have to be the ones of the pydriver of a design with an AxiBufferWriter
+        memorymap = camera_memorymap()
+        accessor = SimAccessor(memorymap)
+        grabber = FrameGrabber(
+            design_class(memorymap)(accessor), self.memory, [i * self.buffer_size for i in range(self.n_buffers)],
+            self.buffer_size, width=self.width, height=self.height
+        )
+        self.write_frame(0)
+        gold = self.write_frame(1000)
+        for name, value in self.writer.state.items():
+            accessor.poke(name, value)
+        self.assertTrue(numpy.array_equal(gold, grabber.grab()))
+
+    def test_stream_detects_dropped_frames(self):
+        self.write_frame(0)  # this frame is older than the stream and is not yielded
+        stream = self.grabber.stream(poll_interval=0)
+
+        golds = []
+
+        def produce(n):
+            for i in range(n):
+                golds.append(self.write_frame(len(golds) * 7 + 1))
+
+        produce(2)
+        frames = [next(stream), next(stream)]
+        for gold, frame in zip(golds, frames):
+            self.assertTrue(numpy.array_equal(gold, frame))
+        self.assertEqual(0, self.grabber.dropped)
+
+        # the writer overtakes us: only the n_buffers - 1 newest frames survive
+        produce(6)
+        frames = [next(stream) for _ in range(self.n_buffers - 1)]
+        for gold, frame in zip(golds[-(self.n_buffers - 1):], frames):
+            self.assertTrue(numpy.array_equal(gold, frame))
+        self.assertEqual(6 - (self.n_buffers - 1), self.grabber.dropped)
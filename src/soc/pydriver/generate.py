@@ -13,10 +13,12 @@ def gen_hardware_proxy_python_code(mmap: MemoryMap, name="design", superclass=""
     name = name.lower()
     class_name = ("_" if not top else "") + name.capitalize()
     to_return = "class {}({}):\n".format(class_name, superclass)
+    to_return += indent(
+        "__slots__ = ({})\n".format("".join('"{}", '.format(row.name.lower()) for row in mmap.subranges)), "    ")
     for row in mmap.normal_resources:
         address = mmap.own_offset.translate(row.address)
-        to_return += indent(
-            "{} = (0x{:02x}, {}, {})\n".format(row.name, address.address, address.bit_offset, address.bit_len), "    ")
+        to_return += indent("{} = field_property(0x{:02x}, {}, {}, writable={})\n".format(
+            row.name, address.address, address.bit_offset, address.bit_len, row.writable), "    ")
     for row in mmap.subranges:
         to_return += indent(gen_hardware_proxy_python_code(row.obj, row.name, superclass=superclass, top=False), "    ")
     return to_return
@@ -41,3 +43,4 @@ def pydriver_hook(platform: Platform, top_fragment, sames: ElaboratableSames):
         pydriver = generate_pydriver(memorymap, platform.pydriver_memory_accessor)
         fc = FatbitstreamContext.get(platform)
         fc.self_extracting_blobs["pydriver.py"] = pydriver
+        fc.self_extracting_blobs["frame_grabber.py"] = open(join(dirname(__file__), "frame_grabber.py")).read()
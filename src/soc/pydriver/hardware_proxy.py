@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from textwrap import indent
 
 
@@ -14,56 +15,175 @@ class MemoryAccessor(ABC):
         raise NotImplementedError()
 
 
-class HardwareProxy:
-    def __init__(self, memory_accessor: MemoryAccessor):
-        object.__setattr__(self, "_memory_accessor", memory_accessor)
-        for k, v in self.__class__.__dict__.items():
-            if isinstance(v, type) and issubclass(v, HardwareProxy):
-                object.__setattr__(self, k[1:].lower(), v(memory_accessor))
+class _WordCache:
+    __slots__ = ("depth", "words", "transaction_depth", "pending_writes")
 
-    def __getattribute__(self, name):
-        if name.startswith("__") or name == "print_state":
-            return object.__getattribute__(self, name)
+    def __init__(self):
+        """
+        The bus words fetched while a snapshot is active and the writes collected while a transaction is active.
+        One instance is shared by all the proxies of a design.
+        """
+        self.depth = 0
+        self.words = {}
 
-        if name in {**self.__dict__, **self.__class__.__dict__}:
-            obj = object.__getattribute__(self, name)
+        self.transaction_depth = 0
+        self.pending_writes = {}  # word address -> (value, mask of the written bits)
 
-            if not isinstance(obj, tuple):
-                return obj
-            else:
-                addr, bit_start, bit_len = obj
 
-                val = self._memory_accessor.read(addr - self._memory_accessor.base)
-                val = val >> bit_start
+def field_property(addr, bit_start, bit_len, writable=True):
+    """
+    Build the accessor property for a single CSR field. Everything that can be computed at generation time is baked
+    into the closures, so accessing a field only costs a function call and the bus access.
+    :param addr: the absolute address of the first word of the field
+    :param bit_start: the offset of the field in its first word
+    :param bit_len: the width of the field in bits
+    :param writable: if False, the field cant be assigned to
+    """
+    if bit_start + bit_len > 32:
+        def fget(self):
+            return self._read_field(addr, bit_start, bit_len)
 
-                return val & (0xffffffff >> (32 - bit_len))
-        raise AttributeError("{} has no attribute {}".format(self.__class__.__name__, name))
+        def fset(self, value):
+            self._write_field(addr, bit_start, bit_len, value)
+    else:
+        mask = (1 << bit_len) - 1
+        word_mask = mask << bit_start
 
-    def __setattr__(self, name, value):
-        if name.startswith("__"):
-            return object.__setattr__(self, name, value)
+        def fget(self):
+            cache = self._word_cache
+            if cache.depth or cache.pending_writes:
+                return (self._read_word(addr) >> bit_start) & mask
+            return (self._memory_accessor.read(addr - self._base) >> bit_start) & mask
 
-        if name in self.__class__.__dict__:
-            obj = object.__getattribute__(self, name)
+        def fset(self, value):
+            self._write_word(addr, (value << bit_start) & word_mask, word_mask)
 
-            if not isinstance(obj, tuple):
-                return obj
-            else:
-                addr, bit_start, bit_len = obj
+    return property(fget, fset if writable else None)
 
-                value = value & (0xffffffff >> (32 - bit_len))
-                value = value << bit_start
 
-                return self._memory_accessor.write(addr - self._memory_accessor.base, value)
-        raise AttributeError("{} has no attribute {}".format(self.__class__.__name__, name))
+class HardwareProxy:
+    __slots__ = ("_memory_accessor", "_base", "_word_cache")
+
+    def __init__(self, memory_accessor: MemoryAccessor, _word_cache=None):
+        self._memory_accessor = memory_accessor
+        self._base = memory_accessor.base
+        self._word_cache = _word_cache if _word_cache is not None else _WordCache()
+        for k, v in self.__class__.__dict__.items():
+            if isinstance(v, type) and issubclass(v, HardwareProxy):
+                setattr(self, k[1:].lower(), v(memory_accessor, self._word_cache))
+
+    def _fetch_word(self, addr):
+        cache = self._word_cache
+        if not cache.depth:
+            return self._memory_accessor.read(addr - self._base)
+        if addr not in cache.words:
+            cache.words[addr] = self._memory_accessor.read(addr - self._base)
+        return cache.words[addr]
+
+    def _read_word(self, addr):
+        if addr not in self._word_cache.pending_writes:
+            return self._fetch_word(addr)
+        value, mask = self._word_cache.pending_writes[addr]
+        if mask == 0xffffffff:
+            return value
+        return (self._fetch_word(addr) & ~mask) | value
+
+    def _write_word(self, addr, value, mask=0xffffffff):
+        cache = self._word_cache
+        if cache.transaction_depth:
+            old_value, old_mask = cache.pending_writes.get(addr, (0, 0))
+            cache.pending_writes[addr] = ((old_value & ~mask) | value, old_mask | mask)
+            return
+        if mask != 0xffffffff:
+            # read-modify-write to not clobber the other fields that live in the same word
+            value |= self._fetch_word(addr) & ~mask
+        self._memory_accessor.write(addr - self._base, value)
+        if addr in cache.words:
+            cache.words[addr] = value
+
+    def _read_field(self, addr, bit_start, bit_len):
+        n_words = (bit_start + bit_len + 31) // 32
+        val = 0
+        for i in range(n_words):
+            val |= self._read_word(addr + i * 4) << (i * 32)
+        return (val >> bit_start) & ((1 << bit_len) - 1)
+
+    def _write_field(self, addr, bit_start, bit_len, value):
+        n_words = (bit_start + bit_len + 31) // 32
+        mask = ((1 << bit_len) - 1) << bit_start
+        value = (value << bit_start) & mask
+        for i in range(n_words):
+            self._write_word(addr + i * 4, (value >> (i * 32)) & 0xffffffff, (mask >> (i * 32)) & 0xffffffff)
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Fetch every bus word at most once while the context is active. All fields that share a word are decoded from
+        the same (cached) read. This is shared with all parent and child proxies of the design.
+
+        usage example:
+        >>> with design.snapshot():
+        >>>     print(design.buffer_writer.words_written, design.buffer_writer.buffers_written)
+        """
+        cache = self._word_cache
+        cache.depth += 1
+        try:
+            yield self
+        finally:
+            cache.depth -= 1
+            if not cache.depth:
+                cache.words.clear()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Collect all the writes done while the context is active and merge the ones that go to the same word.
+        When leaving the context every touched word is written exactly once (partially written words are read once
+        before). If the block raises an exception, the collected writes are discarded.
+
+        usage example:
+        >>> with design.transaction():
+        >>>     design.hdmi.timing_generator.hscan = 2200
+        >>>     design.hdmi.timing_generator.vscan = 1125
+        """
+        cache = self._word_cache
+        cache.transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if cache.transaction_depth == 1:
+                cache.pending_writes.clear()
+            raise
+        finally:
+            cache.transaction_depth -= 1
+        if not cache.transaction_depth:
+            pending_writes, cache.pending_writes = cache.pending_writes, {}
+            for addr, (value, mask) in pending_writes.items():
+                self._write_word(addr, value, mask)
+
+    def read_many(self, names):
+        """
+        Read multiple fields with one bus transaction per distinct word.
+        :param names: an iterable of (dotted) field names relative to this proxy e.g. "buffer_writer.words_written"
+        :return: a dict of name -> value
+        """
+        with self.snapshot():
+            to_return = {}
+            for name in names:
+                obj = self
+                for part in name.split("."):
+                    obj = getattr(obj, part)
+                to_return[name] = obj
+            return to_return
 
     def print_state(self, indentation_level=-1, top_name=None):
-        if top_name:
-            print(indent("{}:".format(top_name), "    " * indentation_level))
-        child_names = [name for name in dir(self) if not name.startswith("_") if name != "print_state"]
-        for child_name in child_names:
-            child = getattr(self, child_name)
-            if isinstance(child, HardwareProxy):
-                child.print_state(indentation_level + 1, top_name=child_name)
-            else:
-                print(indent("{}: {}".format(child_name, child), "    " * (indentation_level + 1)))
+        with self.snapshot():
+            if top_name:
+                print(indent("{}:".format(top_name), "    " * indentation_level))
+            child_names = [name for name in dir(self) if not name.startswith("_") if name not in HardwareProxy.__dict__]
+            for child_name in child_names:
+                child = getattr(self, child_name)
+                if isinstance(child, HardwareProxy):
+                    child.print_state(indentation_level + 1, top_name=child_name)
+                else:
+                    print(indent("{}: {}".format(child_name, child), "    " * (indentation_level + 1)))
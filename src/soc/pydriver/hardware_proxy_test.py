@@ -0,0 +1,147 @@
+import unittest
+
+import soc.pydriver.hardware_proxy
+from soc.memorymap import MemoryMap, Address
+from soc.pydriver.generate import gen_hardware_proxy_python_code
+
+
+class FakeAccessor:
+    base = 0x4000_0000
+
+    def __init__(self):
+        self.memory = {}
+        self.reads = 0
+        self.writes = 0
+
+    def read(self, addr):
+        self.reads += 1
+        return self.memory.get(addr, 0)
+
+    def write(self, addr, value):
+        self.writes += 1
+        self.memory[addr] = value
+
+
+def build_design(memorymap):
+    memorymap.top = True
+    memorymap.place_at = Address(FakeAccessor.base, 0, 0x1000 * 8)
+    namespace = dict(vars(soc.pydriver.hardware_proxy))
+    exec(gen_hardware_proxy_python_code(memorymap, superclass="HardwareProxy"), namespace)
+    accessor = FakeAccessor()
+    return namespace["Design"](accessor), accessor
+
+
+class TestHardwareProxy(unittest.TestCase):
+    def packed_memorymap(self):
+        memorymap = MemoryMap()
+        memorymap.allocate("low", writable=True, address=Address(0x0, 0, 8))
+        memorymap.allocate("high", writable=True, address=Address(0x0, 8, 24))
+        memorymap.allocate("counter", writable=False, bits=32)
+        sub = MemoryMap()
+        sub.allocate("flag", writable=False, bits=1)
+        memorymap.allocate_subrange(sub, "sub")
+        return memorymap
+
+    def test_read_fields(self):
+        design, accessor = build_design(self.packed_memorymap())
+        accessor.memory = {0x0: 0x123456_78, 0x4: 42, 0x8: 1}
+        self.assertEqual(0x78, design.low)
+        self.assertEqual(0x123456, design.high)
+        self.assertEqual(42, design.counter)
+        self.assertEqual(1, design.sub.flag)
+
+    def test_snapshot_reads_each_word_once(self):
+        design, accessor = build_design(self.packed_memorymap())
+        with design.snapshot():
+            for _ in range(3):
+                design.low, design.high, design.counter, design.sub.flag
+        self.assertEqual(3, accessor.reads)
+
+        # the cache is dropped when leaving the snapshot
+        design.low
+        self.assertEqual(4, accessor.reads)
+
+    def test_read_many(self):
+        design, accessor = build_design(self.packed_memorymap())
+        accessor.memory = {0x0: 0xff_01, 0x4: 7, 0x8: 0}
+        values = design.read_many(["low", "high", "counter", "sub.flag"])
+        self.assertEqual({"low": 0x01, "high": 0xff, "counter": 7, "sub.flag": 0}, values)
+        self.assertEqual(3, accessor.reads)
+
+    def test_wide_field(self):
+        memorymap = MemoryMap()
+        memorymap.allocate("wide", writable=False, bits=40)
+        design, accessor = build_design(memorymap)
+        accessor.memory = {0x0: 0x89abcdef, 0x4: 0x1234567}
+        self.assertEqual(0x67_89abcdef, design.wide)
+
+    def test_write_keeps_neighbours(self):
+        design, accessor = build_design(self.packed_memorymap())
+        accessor.memory = {0x0: 0xabcdef_12}
+        design.low = 0x34
+        self.assertEqual(0xabcdef_34, accessor.memory[0x0])
+        design.high = 0x1
+        self.assertEqual(0x000001_34, accessor.memory[0x0])
+
+    def test_transaction_merges_writes(self):
+        design, accessor = build_design(self.packed_memorymap())
+        accessor.memory = {0x0: 0xabcdef_12}
+        with design.transaction():
+            design.low = 0x34
+            design.high = 0x56
+            design.low = 0x78
+            self.assertEqual(0x78, design.low)
+            self.assertEqual(0, accessor.writes)
+        self.assertEqual(1, accessor.writes)
+        self.assertEqual(0, accessor.reads)  # the word was written completely
+        self.assertEqual(0x000056_78, accessor.memory[0x0])
+
+    def test_transaction_partial_word(self):
+        design, accessor = build_design(self.packed_memorymap())
+        accessor.memory = {0x0: 0xabcdef_12}
+        with design.transaction():
+            design.low = 0x34
+            design.low = 0x56
+        self.assertEqual((1, 1), (accessor.reads, accessor.writes))
+        self.assertEqual(0xabcdef_56, accessor.memory[0x0])
+
+    def test_transaction_discarded_on_error(self):
+        design, accessor = build_design(self.packed_memorymap())
+        with self.assertRaises(KeyError):
+            with design.transaction():
+                design.low = 1
+                raise KeyError()
+        self.assertEqual(0, accessor.writes)
+
+    def test_status_fields_are_read_only(self):
+        design, accessor = build_design(self.packed_memorymap())
+        with self.assertRaises(AttributeError):
+            design.counter = 1
+        with self.assertRaises(AttributeError):
+            design.not_a_field = 1
+        self.assertEqual(0, accessor.writes)
+
+
+class TestHardwareProxyStructure(unittest.TestCase):
+    def test_no_per_access_overhead(self, n_fields=200):
+        memorymap = MemoryMap()
+        for i in range(n_fields):
+            memorymap.allocate("field{}".format(i), writable=True, bits=8)
+        sub = MemoryMap()
+        sub.allocate("flag", writable=False, bits=1)
+        memorymap.allocate_subrange(sub, "sub")
+        design, accessor = build_design(memorymap)
+
+        for proxy in [design, design.sub]:
+            # no instance dicts and no dynamic attribute lookup: a field is a plain property lookup on the class
+            self.assertFalse(hasattr(proxy, "__dict__"))
+            for cls in type(proxy).__mro__[:-1]:
+                self.assertIn("__slots__", vars(cls))
+                self.assertNotIn("__getattr__", vars(cls))
+                self.assertNotIn("__getattribute__", vars(cls))
+        self.assertIsInstance(vars(type(design))["field4"], property)
+
+        # and it costs exactly one bus access
+        design.field4
+        design.sub.flag
+        self.assertEqual((2, 0), (accessor.reads, accessor.writes))
@@ -0,0 +1,141 @@
+from array import array
+from collections import deque
+from math import ceil
+
+from soc.memorymap import MemoryMap
+from soc.pydriver.hardware_proxy import MemoryAccessor
+
+
+def _writable_names(memorymap: MemoryMap, hierarchy_separator=".", prefix=""):
+    for row in memorymap.normal_resources:
+        if row.writable:
+            yield prefix + row.name
+    for row in memorymap.subranges:
+        yield from _writable_names(row.obj, hierarchy_separator, prefix + row.name + hierarchy_separator)
+
+
+class TransactionNotSuccessfulException(Exception):
+    pass
+
+
+class SimAccessor(MemoryAccessor):
+    def __init__(self, memorymap: MemoryMap = None, platform=None, dut=None, timeout=10000):
+        """
+        A memory accessor for developing and profiling host software without hardware.
+
+        Without a platform, the fields of the (top level) memorymap are backed by an array based register file.
+        Only the bits of writable fields (ControlSignals) can be written by the host; the bits of StatusSignals can be
+        set with `poke()` to emulate the hardware.
+
+        With a SimPlatform that is wrapped by a ZynqSocPlatform and a dut, every access is run as a transaction on
+        the AXI-Lite master of the platform. The simulation is advanced on demand until the transaction finishes.
+
+        :param memorymap: the top level memorymap of the design (only for the register file)
+        :param platform: the soc platform that wraps a SimPlatform (only for bridging into a simulation)
+        :param dut: the elaboratable to simulate (only for bridging into a simulation)
+        :param timeout: the number of simulation steps after which a bridged access is considered failed
+        """
+        assert (memorymap is None) != (platform is None), "pass either a memorymap or a platform and a dut"
+
+        self.timeout = timeout
+        self.simulator = None
+        if platform is not None:
+            assert dut is not None
+            self._requests = deque()
+            self._responses = deque()
+            platform.add_process(self._bridge_process(platform), "axi_lite")
+            fragment = platform.prepare(dut)
+            memorymap = fragment.memorymap
+            self.base = platform.base_address.address
+            self.simulator = platform.build_simulator(fragment)
+        else:
+            assert memorymap.top
+            self.base = memorymap.own_offset.address
+
+        self.memorymap = memorymap
+        self.word_bytes = memorymap.bus_word_width_bytes
+        self.fields = memorymap.flatten()
+
+        if self.simulator is None:
+            n_words = ceil(memorymap.byte_len / self.word_bytes)
+            self.words = array('Q', bytes(8 * n_words))
+            self.writable_masks = array('Q', bytes(8 * n_words))
+            for name in _writable_names(memorymap):
+                for word, mask in self._field_masks(name):
+                    self.writable_masks[word] |= mask
+
+    def _field_masks(self, name):
+        """Yield the (word index, mask) tuples of all the words that contain the bits of the named field"""
+        address = self.fields[name]
+        word_bits = self.word_bytes * 8
+        start = (address.address - self.base) * 8 + address.bit_offset
+        stop = start + address.bit_len
+        for word in range(start // word_bits, ceil(stop / word_bits)):
+            low = max(start, word * word_bits) - word * word_bits
+            high = min(stop, (word + 1) * word_bits) - word * word_bits
+            yield word, ((1 << (high - low)) - 1) << low
+
+    def read(self, addr):
+        if self.simulator is not None:
+            return self._bridge("read", addr)
+        return self.words[addr // self.word_bytes]
+
+    def write(self, addr, value):
+        if self.simulator is not None:
+            return self._bridge("write", addr, value)
+        word = addr // self.word_bytes
+        self.words[word] ^= (self.words[word] ^ value) & self.writable_masks[word]
+
+    def poke(self, name, value):
+        """Set the value of a field in the register file regardless of it being writable (e.g. a StatusSignal)"""
+        assert self.simulator is None, "poking is only possible in the register file"
+        for word, mask in self._field_masks(name):
+            shift = (mask & -mask).bit_length() - 1
+            self.words[word] ^= (self.words[word] ^ (value << shift)) & mask
+            value >>= bin(mask).count("1")
+
+    def peek(self, name):
+        """Get the value of a field in the register file"""
+        assert self.simulator is None, "peeking is only possible in the register file"
+        value = 0
+        bits = 0
+        for word, mask in self._field_masks(name):
+            shift = (mask & -mask).bit_length() - 1
+            value |= ((self.words[word] & mask) >> shift) << bits
+            bits += bin(mask).count("1")
+        return value
+
+    def _bridge(self, kind, addr, value=None):
+        self._requests.append((kind, self.base + addr, value))
+        for _ in range(self.timeout):
+            if self._responses:
+                break
+            self.simulator.advance()
+        else:
+            raise TimeoutError("the {} of 0x{:x} did not finish within {} simulation steps".format(
+                kind, self.base + addr, self.timeout))
+
+        result, response = self._responses.popleft()
+        if response != 0:
+            raise TransactionNotSuccessfulException("{} of 0x{:x} returned {}".format(kind, self.base + addr, response))
+        return result
+
+    def _bridge_process(self, platform):
+        def process():
+            from cores.axi.sim_util import write_to_axi_channel, read_from_axi_channel
+
+            axi = platform.axi_lite_master
+            while True:
+                if not self._requests:
+                    yield
+                    continue
+                kind, addr, value = self._requests.popleft()
+                if kind == "read":
+                    yield from write_to_axi_channel(axi.read_address, addr)
+                    self._responses.append((yield from read_from_axi_channel(axi.read_data)))
+                else:
+                    yield from write_to_axi_channel(axi.write_address, addr)
+                    yield from write_to_axi_channel(axi.write_data, value)
+                    _, response = yield from read_from_axi_channel(axi.write_response)
+                    self._responses.append((None, response))
+        return process
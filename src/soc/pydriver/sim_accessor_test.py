@@ -0,0 +1,55 @@
+import unittest
+
+import soc.pydriver.hardware_proxy
+from cores.csr_bank.csr_bank import CsrBank, ControlSignal, StatusSignal
+from soc.memorymap import MemoryMap, Address
+from soc.platforms.zynq import ZynqSocPlatform
+from soc.pydriver.generate import gen_hardware_proxy_python_code
+from soc.pydriver.sim_accessor import SimAccessor
+from util.sim import SimPlatform
+
+
+def design_class(memorymap):
+    namespace = dict(vars(soc.pydriver.hardware_proxy))
+    exec(gen_hardware_proxy_python_code(memorymap, superclass="HardwareProxy"), namespace)
+    return namespace["Design"]
+
+
+class TestSimAccessor(unittest.TestCase):
+    def test_register_file(self):
+        memorymap = MemoryMap()
+        memorymap.allocate("low", writable=True, address=Address(0x0, 0, 8))
+        memorymap.allocate("status", writable=False, address=Address(0x0, 8, 8))
+        memorymap.allocate("wide", writable=True, bits=40)
+        sub = MemoryMap()
+        sub.allocate("flag", writable=False, bits=1)
+        memorymap.allocate_subrange(sub, "sub")
+        memorymap.top = True
+        memorymap.place_at = Address(0x4000_0000, 0, 0x1000 * 8)
+
+        accessor = SimAccessor(memorymap)
+        design = design_class(memorymap)(accessor)
+
+        design.low = 0x12
+        design.wide = 0x12_3456789a
+        self.assertEqual((0x12, 0x12_3456789a), (design.low, design.wide))
+
+        # the host can not change status bits but the emulated hardware can
+        accessor.write(0x0, 0xffff_ffff)
+        self.assertEqual((0xff, 0), (design.low, design.status))
+        accessor.poke("status", 0x42)
+        accessor.poke("sub.flag", 1)
+        self.assertEqual((0xff, 0x42, 1), (design.low, design.status, design.sub.flag))
+        self.assertEqual(0x12_3456789a, accessor.peek("wide"))
+
+    def test_bridge_into_simulation(self, testdata=0x12345678):
+        platform = ZynqSocPlatform(SimPlatform())
+        csr_bank = CsrBank()
+        csr_bank.reg("control", ControlSignal(32))
+        csr_bank.reg("status", StatusSignal(32, reset=42))
+
+        accessor = SimAccessor(platform=platform, dut=csr_bank)
+        design = design_class(accessor.memorymap)(accessor)
+        design.control = testdata
+        self.assertEqual(testdata, design.control)
+        self.assertEqual(42, design.status)
@@ -1,14 +1,18 @@
 from abc import ABC
+from time import perf_counter
 from types import new_class
 
 from soc.fatbitstream import FatbitstreamContext
 from soc.pydriver.generate import pydriver_hook
-from soc.hooks import csr_hook, address_assignment_hook, peripherals_collect_hook
+from soc.fragment_visitor import run_prepare_hooks
+from soc.hooks import CsrHook, AddressAssignmentHook, PeripheralsCollectHook
 from soc.tracing_elaborate import fragment_get_with_elaboratable_trace
 
 
 class SocPlatform(ABC):
     base_address = None
+    # pack the CSRs of each CsrBank densely into bus words instead of appending them one after the other
+    pack_csrs = False
     _wrapped_platform = None
 
     # we build a new type that combines the soc and the real platform class
@@ -30,6 +34,9 @@ class SocPlatform(ABC):
         # we it this way because command_templates might be a property object that cant be written to directly
         original_command_templates = self._wrapped_platform.command_templates
         self._wrapped_platform.extra_command_templates = []
+        # the property goes to a class of its own to not break all the other instances of the platform class
+        wrapped_class = self._wrapped_platform.__class__
+        self._wrapped_platform.__class__ = type(wrapped_class.__name__, (wrapped_class,), {})
         self._wrapped_platform.__class__.command_templates = property(lambda plat: [
             *original_command_templates,
             *plat.extra_command_templates
@@ -43,33 +50,44 @@ class SocPlatform(ABC):
         self.to_inject_subfragments = []
         self.final_to_inject_subfragments = []
 
-        self.prepare_hooks.append(csr_hook)
-        self.prepare_hooks.append(address_assignment_hook)
-        self.prepare_hooks.append(peripherals_collect_hook)
+        # FragmentVisitors that follow each other share a single traversal of the design
+        self.prepare_hooks.append(CsrHook())
+        self.prepare_hooks.append(AddressAssignmentHook())
+        self.prepare_hooks.append(PeripheralsCollectHook())
         self.prepare_hooks.append(pydriver_hook)
 
     # we override the prepare method of the real platform to be able to inject stuff into the design
     def prepare(self, elaboratable, name="top", *args, **kwargs):
         print("# ELABORATING MAIN DESIGN")
+        start = perf_counter()
         top_fragment, sames = fragment_get_with_elaboratable_trace(elaboratable, self)
+        elaboration_time = perf_counter() - start
 
         def inject_subfragments(top_fragment, sames, to_inject_subfragments):
+            injected = []
             for elaboratable, name in to_inject_subfragments:
                 fragment, fragment_sames = fragment_get_with_elaboratable_trace(elaboratable, self, sames)
                 print("<- injecting fragment '{}'".format(name))
                 top_fragment.add_subfragment(fragment, name)
+                injected.append((fragment, name))
             self.to_inject_subfragments = []
+            return injected
 
         print("\n# ELABORATING SOC PLATFORM ADDITIONS")
         inject_subfragments(top_fragment, sames, self.to_inject_subfragments)
-        for hook in self.prepare_hooks:
-            print("-> running {}".format(hook.__name__))
-            hook(self, top_fragment, sames)
-            inject_subfragments(top_fragment, sames, self.to_inject_subfragments)
+        self.prepare_timings = run_prepare_hooks(
+            self, top_fragment, sames, self.prepare_hooks,
+            lambda: inject_subfragments(top_fragment, sames, self.to_inject_subfragments)
+        )
 
         print("\ninjecting final fragments")
         inject_subfragments(top_fragment, sames, self.final_to_inject_subfragments)
 
+        print("\nprepare timings:")
+        print("    elaborating the main design: {:.3f}s".format(elaboration_time))
+        for hook_name, seconds in self.prepare_timings.items():
+            print("    {}: {:.3f}s".format(hook_name, seconds))
+
         print("\ninjecting fatbitstream generation code")
         fc = FatbitstreamContext.get(self)
         self._wrapped_platform.extra_command_templates.extend(fc.generate_fatbitstream_generator(name))
@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from types import MethodType
 
 from nmigen import *
@@ -7,27 +8,46 @@ from nmigen.hdl.xfrm import TransformedElaboratable
 
 class ElaboratableSames:
     def __init__(self):
-        self.sames = []
+        """
+        Tracks which objects (elaboratables, their elaboration results and transformed versions) are "the same".
+        This is a union-find structure keyed by `id()`, so that no `__eq__` overloads (e.g. of Values) are invoked
+        and inserts and lookups take amortized constant time.
+        """
+        self._parent = {}  # id -> id of the parent in the union-find forest
+        self._rows = {}  # id of a root -> all the objects of its set (this also keeps the objects and their ids alive)
+
+    def _find(self, key):
+        root = key
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[key] != root:  # path compression
+            self._parent[key], key = root, self._parent[key]
+        return root
+
+    def _add(self, obj):
+        key = id(obj)
+        if key not in self._parent:
+            self._parent[key] = key
+            self._rows[key] = [obj]
+        return self._find(key)
+
+    @property
+    def sames(self):
+        return list(self._rows.values())
 
     def insert(self, a, b):
-        for row in self.sames:
-            if a in row and b not in row:
-                row.append(b)
-                return
-            elif b in row and a not in row:
-                row.append(a)
-                return
-            elif b in row and a in row:
-                return
-        self.sames.append([a, b])
+        root_a, root_b = self._add(a), self._add(b)
+        if root_a == root_b:
+            return
+        if len(self._rows[root_a]) < len(self._rows[root_b]):  # union by size
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._rows[root_a] += self._rows.pop(root_b)
 
     def get_row(self, something):
-        candidates = list(row for row in self.sames if something in row)
-        if len(candidates) == 0:
-            raise AssertionError()
-        if len(candidates) != 1:
+        if id(something) not in self._parent:
             raise AssertionError()
-        return candidates[0]
+        return self._rows[self._find(id(something))]
 
     def get_by_filter(self, something, item_filter):
         if isinstance(something, Instance):
@@ -52,12 +72,49 @@ class ElaboratableSames:
         )
 
 
+# transform class -> subclass of it that records every transformation in the `_sames_` of the instance
+_traced_transform_classes = {}
+
+
+def _traced_transform_class(cls):
+    if cls not in _traced_transform_classes:
+        def __call__(self, value, *, src_loc_at=0):
+            output = cls.__call__(self, value, src_loc_at=src_loc_at)
+            self._sames_.insert(value, output)
+            return output
+        _traced_transform_classes[cls] = type(cls.__name__, (cls,), {"__call__": __call__})
+    return _traced_transform_classes[cls]
+
+
+@contextmanager
+def _trace_transforms(transforms, sames):
+    """
+    Record the transformations done by the given transform instances (including the recursive calls for the
+    subfragments) while the context is active. Only the instances are changed (and restored afterwards); the transform
+    classes stay untouched so that tracing does not accumulate across builds.
+    """
+    traced = [transform for transform in transforms if "_sames_" not in transform.__dict__]
+    for transform in traced:
+        transform._sames_ = sames
+        transform.__class__ = _traced_transform_class(type(transform))
+    try:
+        yield
+    finally:
+        for transform in traced:
+            transform.__class__ = type(transform).__bases__[0]
+            del transform._sames_
+
+
 def inject_elaborate_wrapper(obj, sames):
     if hasattr(obj, 'elaborate') and not isinstance(obj, Fragment):
 
         def generate_elaborate_wrapper(real_elaborate):
             def elaborate_wrapper(self, platform):
-                elaborated = real_elaborate(platform)
+                if isinstance(self, TransformedElaboratable):
+                    with _trace_transforms(self._transforms_, sames):
+                        elaborated = real_elaborate(platform)
+                else:
+                    elaborated = real_elaborate(platform)
                 # print("{} ({}) elaborated to {} ({})".format(
                 #     self.__class__.__name__, self,
                 #     elaborated.__class__.__name__, elaborated
@@ -67,7 +124,10 @@ def inject_elaborate_wrapper(obj, sames):
                 return elaborated
             return elaborate_wrapper
 
-        obj.elaborate = MethodType(generate_elaborate_wrapper(obj.elaborate), obj)
+        # wrap the original elaborate method (and not the wrapper of a previous trace) to not nest wrappers
+        if "_untraced_elaborate_" not in obj.__dict__:
+            obj._untraced_elaborate_ = obj.elaborate
+        obj.elaborate = MethodType(generate_elaborate_wrapper(obj._untraced_elaborate_), obj)
     else:
         if not isinstance(obj, (Instance, Fragment)):
             raise AssertionError()
@@ -82,20 +142,6 @@ def inject_elaborate_wrapper(obj, sames):
             inject_elaborate_wrapper(elab, sames)
     elif isinstance(obj, TransformedElaboratable):
         inject_elaborate_wrapper(obj._elaboratable_, sames)
-        for i in range(len(obj._transforms_)):
-
-            def generate_transform_wrapper(real_transform):
-                def transform_wrapper(self, value, *, src_loc_at=0):
-                    output = real_transform(self, value, src_loc_at=src_loc_at)
-                    sames.insert(value, output)
-                    # print("{} ({}) transformed to {} ({})".format(
-                    #     value.__class__.__name__, value,
-                    #     output.__class__.__name__, output
-                    # ))
-                    return output
-                return transform_wrapper
-
-            obj._transforms_[i].__class__.__call__ = generate_transform_wrapper(obj._transforms_[i].__class__.__call__)
         sames.insert(obj, obj._elaboratable_)
     else:
         if not (isinstance(obj, (Fragment, Instance)) or hasattr(obj, 'elaborate')):
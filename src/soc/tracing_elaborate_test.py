@@ -0,0 +1,85 @@
+import unittest
+
+from nmigen import *
+
+from soc.tracing_elaborate import ElaboratableSames, fragment_get_with_elaboratable_trace
+
+
+class Leaf(Elaboratable):
+    def elaborate(self, platform):
+        m = Module()
+        signal = Signal()
+        m.d.comb += signal.eq(1)
+        return m
+
+
+class Top(Elaboratable):
+    def __init__(self, n):
+        self.n = n
+
+    def elaborate(self, platform):
+        m = Module()
+        for i in range(self.n):
+            m.submodules["leaf{}".format(i)] = Leaf()
+        return m
+
+
+class Renamed(Elaboratable):
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.leaf = DomainRenamer("other")(Leaf())
+        return m
+
+
+class CountingDict(dict):
+    lookups = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+
+class TestElaboratableSames(unittest.TestCase):
+    def test_insert(self):
+        sames = ElaboratableSames()
+        a, b, c, d = Signal(), Signal(), Signal(), Signal()  # Values overload __eq__
+        sames.insert(a, b)
+        sames.insert(c, d)
+        self.assertEqual(2, len(sames.sames))
+        sames.insert(b, c)
+        self.assertEqual(1, len(sames.sames))
+        self.assertEqual({id(x) for x in [a, b, c, d]}, {id(x) for x in sames.get_row(d)})
+        with self.assertRaises(AssertionError):
+            sames.get_row(Signal())
+
+    def test_trace(self):
+        top = Top(3)
+        fragment, sames = fragment_get_with_elaboratable_trace(top, None)
+        self.assertIs(top, sames.get_elaboratable(fragment))
+        for subfragment, name in fragment.subfragments:
+            self.assertIsInstance(sames.get_elaboratable(subfragment), Leaf)
+            self.assertIsInstance(sames.get_module(subfragment), Module)
+
+    def test_trace_transforms(self):
+        call = DomainRenamer.__call__
+        for _ in range(2):  # tracing does not accumulate across builds
+            top = Renamed()
+            fragment, sames = fragment_get_with_elaboratable_trace(DomainRenamer("sync")(top), None)
+            self.assertIs(top, sames.get_elaboratable(fragment))
+            [(leaf_fragment, name)] = fragment.subfragments
+            self.assertIsInstance(sames.get_elaboratable(leaf_fragment), Leaf)
+            self.assertIs(call, DomainRenamer.__call__)
+
+    def test_scaling(self):
+        def lookups(n):
+            """the number of union-find parent lookups for tracing a design with n submodules and querying them"""
+            sames = ElaboratableSames()
+            sames._parent = CountingDict()
+            fragment, sames = fragment_get_with_elaboratable_trace(Top(n), None, sames)
+            for subfragment, name in fragment.subfragments:
+                sames.get_elaboratable(subfragment)
+                sames.get_module(subfragment)
+            return sames._parent.lookups
+
+        # 8x the design size; quadratic lookups would be 64x as many
+        self.assertLessEqual(lookups(4000), 8 * lookups(500))
@@ -48,11 +48,20 @@ class SimPlatform:
     def add_sim_clock(self, domain_name, frequency):
         self.clocks[domain_name] = frequency
 
-    def sim(self, dut, testbench=None, traces=(), filename=None):
-        dut = self.prepare(dut)
-        simulator = Simulator(dut)
+    def build_simulator(self, fragment):
+        """
+        Build a simulator with the clocks and processes of this platform for an already prepared fragment.
+        The simulator can then be run or advanced manually (e.g. by a SimAccessor).
+        """
+        simulator = Simulator(fragment)
         for name, frequency in self.clocks.items():
             simulator.add_clock(1 / frequency, domain=name)
+        for generator, domain in self.processes:
+            simulator.add_sync_process(generator, domain=domain)
+        return simulator
+
+    def sim(self, dut, testbench=None, traces=(), filename=None):
+        dut = self.prepare(dut)
 
         if not filename:
             stack = inspect.stack()
@@ -69,8 +78,7 @@ class SimPlatform:
         else:
             raise TypeError("unknown type for testbench")
 
-        for generator, domain in self.processes:
-            simulator.add_sync_process(generator, domain=domain)
+        simulator = self.build_simulator(dut)
 
         Path(".sim_results/").mkdir(exist_ok=True)
         with simulator.write_vcd(".sim_results/{}.vcd".format(filename), ".sim_results/{}.gtkw".format(filename),